@@ -1,6 +1,88 @@
-from .pdf_parser import PDFParser, TextBlock
+from .pdf_parser import (
+    PDFParser,
+    TextBlock,
+    TextBlockTable,
+    PageReport,
+    ExtractionCache,
+    PageDiff,
+    diff_page_fingerprints,
+    PROCESSING_MODES,
+    table_to_csv,
+    BatchResult,
+    WorkerError,
+    WorkerTimeoutError,
+    WorkerMemoryError,
+    WorkerCrashError,
+    ResultSink,
+    TextStreamSink,
+    JSONLSink,
+    TextDirSink,
+    ParquetSink,
+    ManifestSink,
+    FileEntry,
+    ScanResult,
+    write_scan_parquet,
+    ManifestRecord,
+    ManifestChanges,
+    DirectoryManifest,
+    scan_pdf_files,
+    SearchIndex,
+    SearchHit,
+    MinHasher,
+    DuplicateIndex,
+    DuplicateMatch,
+    TextChunk,
+    TextChunker,
+    OCREngine,
+    TesseractEngine,
+    MetricsHook,
+    ParserMetrics,
+    DocumentCache,
+    PDFSource,
+)
 
 __version__ = "0.1.0"
 __author__ = "PDF Parser Team"
 
-__all__ = ["PDFParser", "TextBlock"] 
\ No newline at end of file
+__all__ = [
+    "PDFParser",
+    "TextBlock",
+    "TextBlockTable",
+    "PageReport",
+    "ExtractionCache",
+    "PageDiff",
+    "diff_page_fingerprints",
+    "PROCESSING_MODES",
+    "table_to_csv",
+    "BatchResult",
+    "WorkerError",
+    "WorkerTimeoutError",
+    "WorkerMemoryError",
+    "WorkerCrashError",
+    "ResultSink",
+    "TextStreamSink",
+    "JSONLSink",
+    "TextDirSink",
+    "ParquetSink",
+    "ManifestSink",
+    "FileEntry",
+    "ScanResult",
+    "write_scan_parquet",
+    "ManifestRecord",
+    "ManifestChanges",
+    "DirectoryManifest",
+    "scan_pdf_files",
+    "SearchIndex",
+    "SearchHit",
+    "MinHasher",
+    "DuplicateIndex",
+    "DuplicateMatch",
+    "TextChunk",
+    "TextChunker",
+    "OCREngine",
+    "TesseractEngine",
+    "MetricsHook",
+    "ParserMetrics",
+    "DocumentCache",
+    "PDFSource",
+]
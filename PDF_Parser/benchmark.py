@@ -0,0 +1,502 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк PDF Parser.
+
+Генерирует синтетический корпус PDF-файлов с заданным количеством страниц,
+плотностью текста, шрифтами, таблицами и изображениями, замеряет все точки
+входа парсера в каждом режиме параллельной обработки и сохраняет результаты
+в JSON. При указании базового файла результаты сравниваются с ним, и при
+регрессии программа завершается с ненулевым кодом.
+
+С ключом --revised-pages дополнительно замеряется обработка новых версий
+файлов, в которых изменено несколько страниц: полное извлечение против
+повторного использования неизмененных страниц (PDFParser(page_reuse=True)).
+
+Пример:
+    python benchmark.py --pages 10,200 --fonts helv,china-s --tables --images \\
+        -o results.json --baseline baseline.json
+    python benchmark.py --pages 400 --entries text,metadata --modes single --revised-pages 2
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import tempfile
+import concurrent.futures
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import fitz
+
+from pdf_parser import PDFParser, ExtractionCache, ParserMetrics
+
+
+# Режимы обработки: однопоточный и оба режима параллельной обработки парсера
+BENCHMARK_MODES = ("single", "thread", "process")
+
+# Замеряемые точки входа
+BENCHMARK_ENTRIES = ("text", "metadata", "metadata_detailed", "batch", "tables", "chunks")
+
+# Точки входа, для которых замеряется повторное использование страниц
+REVISION_ENTRIES = ("text", "metadata", "metadata_detailed")
+
+# Допустимое ухудшение показателей относительно базового прогона (доля)
+REGRESSION_THRESHOLD = 0.2
+
+# Текст для наполнения страниц; для шрифтов base-14 используется латиница,
+# так как они не содержат кириллицы
+LATIN_TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+CYRILLIC_TEXT = "Съешь же ещё этих мягких французских булок, да выпей чаю 0123456789"
+BASE14_FONTS = ("helv", "tiro", "cour")
+
+
+def generate_pdf(output_path: str, pages: int, density: int = 40, font: str = "helv",
+                 tables: bool = False, images: bool = False) -> None:
+    """
+    Создание синтетического PDF-файла.
+    
+    Args:
+        output_path: Путь к создаваемому файлу
+        pages: Количество страниц
+        density: Количество строк текста на странице
+        font: Имя встроенного шрифта PyMuPDF
+        tables: Добавлять на каждую страницу таблицу с рамками
+        images: Добавлять на каждую страницу растровое изображение
+    """
+    text = LATIN_TEXT if font in BASE14_FONTS else CYRILLIC_TEXT
+    pixmap = None
+    if images:
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 128, 128), False)
+        pixmap.clear_with(200)
+    
+    doc = fitz.open()
+    for page_idx in range(pages):
+        page = doc.new_page()
+        y = 50
+        line_height = min(14, 520 / max(density, 1))
+        for line in range(density):
+            page.insert_text((50, y), f"{page_idx + 1}.{line + 1} {text}",
+                             fontsize=min(10, line_height * 0.8), fontname=font)
+            y += line_height
+        
+        if tables:
+            top = 600
+            for row in range(5):
+                for col in range(4):
+                    rect = fitz.Rect(50 + col * 120, top + row * 20, 170 + col * 120, top + (row + 1) * 20)
+                    page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                    page.insert_text((rect.x0 + 4, rect.y1 - 6), f"{row}:{col}", fontsize=9, fontname=font)
+        
+        if pixmap is not None:
+            page.insert_image(fitz.Rect(430, 40, 550, 160), pixmap=pixmap)
+    
+    doc.save(output_path)
+    doc.close()
+
+
+def generate_corpus(output_dir: str, page_counts: List[int], density: int = 40,
+                    fonts: List[str] = ("helv",), tables: bool = False,
+                    images: bool = False) -> List[str]:
+    """
+    Создание корпуса: по одному файлу на каждое сочетание количества страниц и шрифта.
+    
+    Returns:
+        List[str]: Пути к созданным файлам
+    """
+    paths = []
+    for pages in page_counts:
+        for font in fonts:
+            path = os.path.join(output_dir, f"bench_{pages}p_{density}l_{font}.pdf")
+            generate_pdf(path, pages, density, font, tables, images)
+            paths.append(path)
+    return paths
+
+
+def revise_pdf(source_path: str, output_path: str, changed_pages: int) -> List[int]:
+    """
+    Создание новой версии файла: на changed_pages страницах, равномерно
+    распределенных по документу, добавляется строка текста, и файл
+    перезаписывается целиком со сжатием и перенумерацией объектов, как при
+    повторном выпуске документа.
+    
+    Returns:
+        List[int]: Номера измененных страниц (с 1)
+    """
+    doc = fitz.open(source_path)
+    step = max(1, len(doc) // max(1, changed_pages))
+    changed = list(range(step // 2, len(doc), step))[:changed_pages]
+    for page_idx in changed:
+        doc[page_idx].insert_text((50, 820), f"Revision 2, page {page_idx + 1}", fontsize=8, fontname="helv")
+    doc.save(output_path, garbage=2, deflate=True)
+    doc.close()
+    return [page_idx + 1 for page_idx in changed]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль по методу ближайшего ранга (q от 0 до 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Пиковый объем резидентной памяти процесса и его дочерних процессов в МБ."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # На macOS ru_maxrss измеряется в байтах, на Linux — в килобайтах
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _make_parser(mode: str, **kwargs) -> PDFParser:
+    if mode == "single":
+        return PDFParser(use_multithreading=False, show_progress=False, **kwargs)
+    return PDFParser(mode=mode, show_progress=False, **kwargs)
+
+
+def _entry_call(parser: PDFParser, entry: str) -> Callable[[List[str], Any], Any]:
+    """Функция вызова точки входа для списка файлов и выбора страниц."""
+    if entry == "text":
+        return lambda files, pages: [parser.extract_text(path, pages=pages) for path in files]
+    if entry == "metadata":
+        return lambda files, pages: [parser.extract_text_with_metadata(path, pages=pages) for path in files]
+    if entry == "metadata_detailed":
+        return lambda files, pages: [parser.extract_text_with_metadata(path, detailed=True, pages=pages)
+                                     for path in files]
+    if entry == "batch":
+        return lambda files, pages: parser.batch_process(files, pages=pages)
+    if entry == "tables":
+        return lambda files, pages: [parser.extract_tables(path, pages=pages) for path in files]
+    if entry == "chunks":
+        # Фрагменты не накапливаются, как и при записи в JSON Lines
+        return lambda files, pages: [sum(1 for _ in parser.iter_chunks(path, pages=pages)) for path in files]
+    raise ValueError(f"Неизвестная точка входа: {entry}")
+
+
+def run_case(entry: str, mode: str, files: List[str], repeat: int = 1,
+             latency_samples: int = 10) -> Dict[str, Any]:
+    """
+    Замер одной точки входа в одном режиме.
+    
+    Время обработки корпуса — лучшее из repeat прогонов. Задержка на
+    страницу измеряется вызовами для отдельных страниц (включая открытие
+    документа) на равномерной выборке из latency_samples страниц.
+    
+    Returns:
+        Dict[str, Any]: Количество страниц, время, страниц в секунду,
+            пиковая память и перцентили задержки на страницу
+    """
+    parser = _make_parser(mode)
+    call = _entry_call(parser, entry)
+    page_counts = {}
+    for path in files:
+        with fitz.open(path) as doc:
+            page_counts[path] = len(doc)
+    total_pages = sum(page_counts.values())
+    
+    best = None
+    for _ in range(max(1, repeat)):
+        start_time = time.perf_counter()
+        call(files, None)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    
+    latencies = []
+    samples = [(path, page) for path, count in page_counts.items() for page in range(1, count + 1)]
+    step = max(1, len(samples) // max(1, latency_samples))
+    for path, page in samples[::step][:latency_samples]:
+        start_time = time.perf_counter()
+        call([path], [page])
+        latencies.append(time.perf_counter() - start_time)
+    
+    p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+    return {
+        "entry": entry,
+        "mode": mode,
+        "files": len(files),
+        "pages": total_pages,
+        "seconds": best,
+        "pages_per_sec": total_pages / best if best else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "p50_ms": p50 * 1000 if p50 is not None else None,
+        "p99_ms": p99 * 1000 if p99 is not None else None,
+    }
+
+
+def run_revision_case(entry: str, mode: str, files: List[str], revised: List[str],
+                      repeat: int = 1) -> Dict[str, Any]:
+    """
+    Замер обработки новых версий файлов с повторным использованием страниц.
+    
+    Время полного извлечения новых версий сравнивается со временем их
+    извлечения парсером с page_reuse, кэш которого заполнен извлечением
+    исходных версий (заполнение не замеряется). Для каждого прогона
+    используется новый кэш.
+    
+    Returns:
+        Dict[str, Any]: Количество страниц, время обоих вариантов, ускорение,
+            время вычисления отпечатков и количество повторно использованных страниц
+    """
+    total_pages = 0
+    for path in revised:
+        with fitz.open(path) as doc:
+            total_pages += len(doc)
+    
+    full_call = _entry_call(_make_parser(mode), entry)
+    full = reuse = None
+    pages_reused = 0
+    for _ in range(max(1, repeat)):
+        start_time = time.perf_counter()
+        full_call(revised, None)
+        elapsed = time.perf_counter() - start_time
+        full = elapsed if full is None else min(full, elapsed)
+        
+        cache_dir = tempfile.mkdtemp(prefix="pdf_parser_revision_")
+        try:
+            cache = ExtractionCache(cache_dir)
+            metrics = ParserMetrics()
+            parser = _make_parser(mode, cache=cache, page_reuse=True, metrics=metrics)
+            call = _entry_call(parser, entry)
+            call(files, None)
+            metrics.reset()
+            start_time = time.perf_counter()
+            call(revised, None)
+            elapsed = time.perf_counter() - start_time
+            reuse = elapsed if reuse is None else min(reuse, elapsed)
+            pages_reused = metrics.snapshot()["counters"].get("pages_reused", 0)
+            cache.close()
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    
+    parser = _make_parser(mode)
+    start_time = time.perf_counter()
+    for path in revised:
+        parser.page_fingerprints(path)
+    fingerprint = time.perf_counter() - start_time
+    
+    return {
+        "entry": entry,
+        "mode": mode,
+        "files": len(revised),
+        "pages": total_pages,
+        "pages_reused": pages_reused,
+        "full_seconds": full,
+        "reuse_seconds": reuse,
+        "fingerprint_seconds": fingerprint,
+        "speedup": full / reuse if reuse else None,
+    }
+
+
+def run_benchmark(files: List[str], entries: List[str] = BENCHMARK_ENTRIES,
+                  modes: List[str] = BENCHMARK_MODES, repeat: int = 1,
+                  latency_samples: int = 10, isolate: bool = True,
+                  revised: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Замер всех сочетаний точек входа и режимов.
+    
+    Args:
+        files: Файлы корпуса
+        entries: Точки входа
+        modes: Режимы обработки
+        repeat: Количество прогонов каждого замера
+        latency_samples: Количество страниц для замера задержки
+        isolate: Выполнять каждый замер в отдельном процессе, чтобы пиковая
+            память не накапливалась между замерами
+        revised: Новые версии файлов корпуса (в том же порядке) для замера
+            повторного использования страниц
+    
+    Returns:
+        Dict[str, Any]: Описание окружения, результаты по ключам "точка_входа/режим"
+            и, при указании revised, результаты для новых версий в "revisions"
+    """
+    results = {}
+    for entry in entries:
+        for mode in modes:
+            key = f"{entry}/{mode}"
+            if isolate:
+                context = multiprocessing.get_context("spawn")
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    results[key] = executor.submit(run_case, entry, mode, files, repeat,
+                                                   latency_samples).result()
+            else:
+                results[key] = run_case(entry, mode, files, repeat, latency_samples)
+            print(format_result(key, results[key]), file=sys.stderr)
+    
+    revisions = {}
+    for entry in entries if revised else ():
+        if entry not in REVISION_ENTRIES:
+            continue
+        for mode in modes:
+            key = f"{entry}/{mode}"
+            revisions[key] = run_revision_case(entry, mode, files, revised, repeat)
+            print(format_revision(key, revisions[key]), file=sys.stderr)
+    
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "corpus": [os.path.basename(path) for path in files],
+        "results": results,
+    }
+    if revised:
+        report["revisions"] = revisions
+    return report
+
+
+def format_result(key: str, result: Dict[str, Any]) -> str:
+    """Строка отчета для одного замера."""
+    def fmt(value, spec):
+        return "n/a" if value is None else format(value, spec)
+    return (f"{key:<28} {result['pages']:>6} стр. {fmt(result['seconds'], '.3f'):>8} с "
+            f"{fmt(result['pages_per_sec'], '.1f'):>9} стр/с  RSS {fmt(result['peak_rss_mb'], '.1f')} МБ  "
+            f"p50 {fmt(result['p50_ms'], '.1f')} мс  p99 {fmt(result['p99_ms'], '.1f')} мс")
+
+
+def format_revision(key: str, result: Dict[str, Any]) -> str:
+    """Строка отчета для замера новых версий файлов."""
+    speedup = "n/a" if result["speedup"] is None else f"{result['speedup']:.1f}x"
+    return (f"{'revision ' + key:<36} {result['pages']:>6} стр. из кэша {result['pages_reused']:>6}  "
+            f"полностью {result['full_seconds']:.3f} с  повторно {result['reuse_seconds']:.3f} с  "
+            f"({speedup}, отпечатки {result['fingerprint_seconds']:.3f} с)")
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """
+    Сравнение результатов с базовым прогоном.
+    
+    Регрессией считается снижение pages_per_sec или рост peak_rss_mb,
+    p50_ms, p99_ms больше чем на threshold. Замеры, отсутствующие в одном
+    из прогонов, не сравниваются.
+    
+    Returns:
+        List[str]: Описания обнаруженных регрессий
+    
+    Raises:
+        ValueError: Если прогоны выполнены на разных корпусах
+    """
+    if current.get("corpus") != baseline.get("corpus"):
+        raise ValueError("Базовый прогон выполнен на другом корпусе")
+    
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        
+        for metric, higher_is_better in (("pages_per_sec", True), ("peak_rss_mb", False),
+                                         ("p50_ms", False), ("p99_ms", False)):
+            value, base_value = result.get(metric), base.get(metric)
+            if not value or not base_value:
+                continue
+            change = (base_value - value) / base_value if higher_is_better else (value - base_value) / base_value
+            if change > threshold:
+                regressions.append(f"{key}: {metric} {base_value:.2f} -> {value:.2f} "
+                                   f"({change * 100:.0f}% хуже)")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    """Разбор аргументов командной строки."""
+    parser = argparse.ArgumentParser(description='Бенчмарк PDF Parser на синтетическом корпусе')
+    
+    parser.add_argument('--pages', type=str, default='10,200',
+                        help='Количество страниц файлов корпуса через запятую')
+    parser.add_argument('--density', type=int, default=40,
+                        help='Количество строк текста на странице')
+    parser.add_argument('--fonts', type=str, default='helv',
+                        help='Встроенные шрифты PyMuPDF через запятую, например "helv,china-s"')
+    parser.add_argument('--tables', action='store_true',
+                        help='Добавлять таблицы на страницы')
+    parser.add_argument('--images', action='store_true',
+                        help='Добавлять изображения на страницы')
+    parser.add_argument('--corpus-dir', type=str, default=None,
+                        help='Директория для корпуса (по умолчанию временная)')
+    parser.add_argument('--entries', type=str, default=','.join(BENCHMARK_ENTRIES),
+                        help='Замеряемые точки входа через запятую')
+    parser.add_argument('--modes', type=str, default=','.join(BENCHMARK_MODES),
+                        help='Режимы обработки через запятую')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Количество прогонов каждого замера (берется лучший)')
+    parser.add_argument('--latency-samples', type=int, default=10,
+                        help='Количество страниц для замера задержки на страницу')
+    parser.add_argument('--revised-pages', type=int, default=0,
+                        help='Замерить обработку новых версий файлов с указанным количеством '
+                             'измененных страниц (0 = не замерять)')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Файл для сохранения результатов в JSON')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='JSON базового прогона для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Допустимое ухудшение показателей (доля, по умолчанию 0.2)')
+    
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция бенчмарка."""
+    args = parse_args()
+    
+    entries = args.entries.split(',')
+    modes = args.modes.split(',')
+    for name, values, allowed in (("точка входа", entries, BENCHMARK_ENTRIES),
+                                  ("режим", modes, BENCHMARK_MODES)):
+        unknown = set(values) - set(allowed)
+        if unknown:
+            print(f"Ошибка: неизвестный {name}: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus_dir or temp_dir
+        os.makedirs(corpus_dir, exist_ok=True)
+        files = generate_corpus(corpus_dir, [int(count) for count in args.pages.split(',')],
+                                args.density, args.fonts.split(','), args.tables, args.images)
+        revised = None
+        if args.revised_pages > 0:
+            revised = []
+            for path in files:
+                revised_path = path[:-len(".pdf")] + "_rev.pdf"
+                revise_pdf(path, revised_path, args.revised_pages)
+                revised.append(revised_path)
+        report = run_benchmark(files, entries, modes, args.repeat, args.latency_samples,
+                               revised=revised)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare_results(report, baseline, args.threshold)
+        except ValueError as e:
+            print(f"Ошибка: {e}")
+            sys.exit(1)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("Регрессий относительно базового прогона не обнаружено")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,32 @@
 
 import os
 import sys
+import json
 import argparse
 import time
-from typing import List, Dict
+import logging
+from dataclasses import asdict
+from typing import List, Dict, Optional
 
-from pdf_parser import PDFParser
+from pdf_parser import (
+    PDFParser, ExtractionCache, PROCESSING_MODES, table_to_csv,
+    TextStreamSink, JSONLSink, TextDirSink, ParquetSink, ParserMetrics, BatchResult,
+    DirectoryManifest, ManifestSink, FileEntry, scan_pdf_files, SearchIndex, TesseractEngine,
+    DuplicateIndex, TextChunker, write_scan_parquet,
+)
+import pdf_daemon
+
+# Форматы вывода результатов пакетной обработки
+OUTPUT_FORMATS = ("text", "jsonl", "parquet", "dir")
 
 
 def parse_args() -> argparse.Namespace:
     """Разбор аргументов командной строки."""
-    parser = argparse.ArgumentParser(description='PDF Parser - быстрое и точное извлечение текста из PDF')
+    parser = argparse.ArgumentParser(description='PDF Parser - быстрое и точное извлечение текста из PDF',
+                                     epilog='Фоновый сервер: pdf_parser serve --help; '
+                                            'поиск по индексу: pdf_parser search --help; '
+                                            'сравнение версий: pdf_parser diff --help; '
+                                            'быстрое сканирование: pdf_parser scan --help')
     
     parser.add_argument('pdf_file', type=str, nargs='*',
                         help='Путь к PDF-файлу или директории с PDF-файлами')
@@ -26,16 +42,114 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('-d', '--detailed', action='store_true',
                         help='Использовать более детальное извлечение (медленнее, но точнее)')
     
+    parser.add_argument('--laparams', type=str, default=None,
+                        help='Параметры анализа разметки PDFMiner в формате JSON, '
+                             'например \'{"line_margin": 0.3}\' (с --detailed и --hybrid)')
+    
+    parser.add_argument('--hybrid', action='store_true',
+                        help='Гибридное извлечение метаданных: PDFMiner только для проблемных страниц')
+    
+    parser.add_argument('-r', '--reading-order', action='store_true',
+                        help='Восстановить порядок чтения (колонки, колонтитулы) и тип блоков')
+    
     parser.add_argument('-t', '--tables', action='store_true',
-                        help='Извлекать таблицы (экспериментальная функция)')
+                        help='Извлекать таблицы в формате CSV (экспериментальная функция)')
     
     parser.add_argument('-s', '--single-thread', action='store_true',
                         help='Запретить многопоточность')
     
+    parser.add_argument('--mode', choices=PROCESSING_MODES, default='thread',
+                        help='Режим параллельной обработки: пул потоков, пул процессов или '
+                             'наблюдаемые процессы с ограничениями времени и памяти (isolated)')
+    
+    parser.add_argument('--file-timeout', type=float, default=None,
+                        help='Ограничение времени обработки файла в секундах (включает --mode isolated)')
+    
+    parser.add_argument('--max-worker-memory', type=int, default=None,
+                        help='Ограничение памяти процесса обработки в МБ (включает --mode isolated)')
+    
+    parser.add_argument('--max-files-per-worker', type=int, default=None,
+                        help='Перезапускать процесс обработки после указанного количества задач '
+                             '(включает --mode isolated)')
+    
+    parser.add_argument('--retries', type=int, default=1,
+                        help='Количество повторов файла после остановки процесса (по умолчанию 1)')
+    
+    parser.add_argument('--quarantine', type=str, default=None,
+                        help='Файл, в который дописываются пути файлов, помещенных в карантин')
+    
+    parser.add_argument('--pages', type=str, default=None,
+                        help='Извлекаемые страницы, например "1-3,10,20-" (по умолчанию все)')
+    
+    parser.add_argument('--head', type=int, default=None, metavar='N',
+                        help='Извлечь только первые N символов текста каждого файла')
+    
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                        help='Формат вывода при обработке нескольких файлов: текст, JSON Lines, '
+                             'Parquet или отдельный .txt на каждый файл в директории --output')
+    
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Директория постоянного кэша результатов извлечения')
+    
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='Максимальный размер кэша в МБ (по умолчанию 1024)')
+    
+    parser.add_argument('--page-reuse', action='store_true',
+                        help='Извлекать заново только измененные страницы новой версии документа, '
+                             'остальные брать из кэша (с --cache-dir)')
+    
+    parser.add_argument('--metrics', choices=('json', 'prometheus'), default=None,
+                        help='Вывести в stderr метрики этапов обработки и счетчики')
+    
+    parser.add_argument('--profile', choices=('cpu', 'memory'), default=None,
+                        help='Профилирование: cProfile (cpu) или tracemalloc (memory)')
+    
+    parser.add_argument('--incremental', type=str, default=None, metavar='MANIFEST',
+                        help='Обрабатывать только новые и измененные файлы; состояние хранится '
+                             'в указанном файле манифеста, удаленные файлы из него исключаются')
+    
+    parser.add_argument('--index', type=str, default=None, metavar='INDEX',
+                        help='Добавить извлеченный текст в полнотекстовый индекс (см. pdf_parser search)')
+    
+    parser.add_argument('--chunk', action='store_true',
+                        help='Разбить текст на перекрывающиеся фрагменты с номерами страниц и '
+                             'прямоугольниками блоков и вывести их в JSON Lines')
+    
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='Максимальный размер фрагмента (по умолчанию 1000)')
+    
+    parser.add_argument('--chunk-overlap', type=int, default=200,
+                        help='Размер перекрытия соседних фрагментов (по умолчанию 200)')
+    
+    parser.add_argument('--chunk-unit', choices=('chars', 'words'), default='chars',
+                        help='Единица размера фрагмента: символы или слова')
+    
+    parser.add_argument('--dedup', type=str, default=None, metavar='DEDUP',
+                        help='Искать почти одинаковые документы (MinHash/LSH); индекс хранится в '
+                             'указанном файле, группа и исходный документ выводятся с результатами')
+    
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help='Не выводить дубликаты; побайтно одинаковые файлы не извлекаются (с --dedup)')
+    
+    parser.add_argument('--ocr', action='store_true',
+                        help='Распознавать страницы без текстового слоя с помощью Tesseract')
+    
+    parser.add_argument('--ocr-lang', type=str, default='rus+eng',
+                        help='Языки распознавания Tesseract (по умолчанию rus+eng)')
+    
+    parser.add_argument('--ocr-dpi', type=int, default=300,
+                        help='Разрешение отрисовки страниц для распознавания (по умолчанию 300)')
+    
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='Не использовать запущенный сервер pdf_parser serve')
+    
+    parser.add_argument('--profile-output', type=str, default=None,
+                        help='Файл для сохранения профиля cProfile (формат pstats)')
+    
     return parser.parse_args()
 
 
-def get_pdf_files(paths: List[str]) -> List[str]:
+def get_pdf_files(paths: List[str]) -> List[FileEntry]:
     """
     Получение списка PDF-файлов из указанных путей.
     
@@ -43,105 +157,595 @@ def get_pdf_files(paths: List[str]) -> List[str]:
         paths: Список путей к файлам или директориям
         
     Returns:
-        List[str]: Список путей к PDF-файлам
+        List[FileEntry]: PDF-файлы с размером и временем модификации
     """
-    pdf_files = []
+    valid_paths = []
     
     for path in paths:
-        if os.path.isdir(path):
-            # Если путь указывает на директорию, добавляем все PDF-файлы из неё
-            for root, _, files in os.walk(path):
-                for file in files:
-                    if file.lower().endswith('.pdf'):
-                        pdf_files.append(os.path.join(root, file))
-        elif os.path.isfile(path) and path.lower().endswith('.pdf'):
-            # Если путь указывает на PDF-файл, добавляем его
-            pdf_files.append(path)
+        if os.path.isdir(path) or (os.path.isfile(path) and path.lower().endswith('.pdf')):
+            valid_paths.append(path)
         else:
             print(f"Предупреждение: {path} не является PDF-файлом или директорией с PDF-файлами")
     
-    return pdf_files
+    # Директории обходятся параллельно
+    return scan_pdf_files(valid_paths)
 
 
-def main():
-    """Основная функция программы."""
-    args = parse_args()
+def select_changed_files(args: argparse.Namespace, manifest: DirectoryManifest,
+                         entries: List[FileEntry], status_stream,
+                         index: Optional[SearchIndex] = None,
+                         dedup: Optional[DuplicateIndex] = None) -> List[str]:
+    """
+    Сверка найденных файлов с манифестом и выбор файлов для обработки.
     
-    if not args.pdf_file:
-        print("Ошибка: не указан PDF-файл или директория")
-        sys.exit(1)
+    Для формата dir результаты удаленных файлов удаляются из выходной директории,
+    удаленные файлы также исключаются из полнотекстового индекса и индекса дубликатов.
     
-    # Получаем список PDF-файлов для обработки
-    pdf_files = get_pdf_files(args.pdf_file)
+    Args:
+        args: Аргументы командной строки
+        manifest: Манифест директории
+        entries: Найденные PDF-файлы
+        status_stream: Поток для служебных сообщений
+        index: Полнотекстовый индекс
+        dedup: Индекс дубликатов
+        
+    Returns:
+        List[str]: Новые, измененные и ранее не обработанные файлы
+    """
+    changes = manifest.sync(entries)
     
-    if not pdf_files:
-        print("Ошибка: не найдено ни одного PDF-файла")
+    for record in changes.deleted:
+        if args.format == 'dir' and record.output and os.path.isfile(record.output):
+            os.remove(record.output)
+        if index is not None:
+            index.remove(record.path)
+        if dedup is not None:
+            dedup.remove(record.path)
+    
+    pending = manifest.pending()
+    quarantined = manifest.stats().get("quarantined", 0)
+    print(f"Манифест: новых {len(changes.added)}, измененных {len(changes.modified)}, "
+          f"удаленных {len(changes.deleted)}, к обработке {len(pending)}"
+          + (f", в карантине {quarantined}" if quarantined else ""), file=status_stream)
+    return pending
+
+
+def create_sink(args: argparse.Namespace, manifest: Optional[DirectoryManifest] = None):
+    """
+    Создание приемника результатов пакетной обработки.
+    
+    Args:
+        args: Аргументы командной строки
+        manifest: Манифест, в котором отмечаются обработанные файлы
+        
+    Returns:
+        ResultSink: Приемник результатов
+    """
+    sink = _create_format_sink(args)
+    return ManifestSink(sink, manifest) if manifest is not None else sink
+
+
+def _create_format_sink(args: argparse.Namespace):
+    """Создание приемника результатов для формата --format."""
+    if args.format == 'text':
+        if args.output:
+            return TextStreamSink(open(args.output, 'w', encoding='utf-8'), close_stream=True)
+        return TextStreamSink(sys.stdout, preview_chars=1000)
+    
+    if args.format == 'jsonl':
+        return JSONLSink(args.output) if args.output else JSONLSink(sys.stdout)
+    
+    if not args.output:
+        print(f"Ошибка: для формата {args.format} необходимо указать --output")
         sys.exit(1)
     
-    # Инициализируем парсер
-    parser = PDFParser(use_multithreading=not args.single_thread)
+    if args.format == 'parquet':
+        return ParquetSink(args.output)
+    return TextDirSink(args.output)
+
+
+def process_files(args: argparse.Namespace, parser: PDFParser, pdf_files: List[str],
+                  manifest: Optional[DirectoryManifest] = None,
+                  index: Optional[SearchIndex] = None,
+                  dedup: Optional[DuplicateIndex] = None) -> None:
+    """
+    Обработка файлов и вывод результатов.
     
-    start_time = time.time()
+    Args:
+        args: Аргументы командной строки
+        parser: Парсер
+        pdf_files: Список PDF-файлов
+        manifest: Манифест инкрементальной обработки
+        index: Полнотекстовый индекс, в который добавляется извлеченный текст
+        dedup: Индекс дубликатов
+    """
+    if args.chunk:
+        write_chunks(args, parser, pdf_files)
+        return
     
-    # Обрабатываем файлы
-    if len(pdf_files) == 1:
+    if len(pdf_files) == 1 and manifest is None and index is None and dedup is None:
         # Если только один файл
         pdf_path = pdf_files[0]
         
         if args.metadata:
             # Извлечение текста с метаданными
-            result = parser.extract_text_with_metadata(pdf_path, detailed=args.detailed)
+            if args.hybrid:
+                blocks, reports = parser.extract_text_hybrid(pdf_path, pages=args.pages)
+                pages = [(None, blocks)]
+                for report in reports:
+                    if report.issues:
+                        print(f"Страница {report.page_num}: {', '.join(report.issues)} -> {report.backend} "
+                              f"(PyMuPDF {report.pymupdf_time:.3f} с, PDFMiner {report.pdfminer_time:.3f} с)",
+                              file=sys.stderr)
+            elif args.detailed or args.head is not None or args.reading_order or parser.page_reuse:
+                blocks = parser.extract_text_with_metadata(
+                    pdf_path, detailed=args.detailed, pages=args.pages, max_chars=args.head,
+                    reading_order=args.reading_order)
+                pages = [(None, blocks)]
+            else:
+                # Блоки выводятся постранично по мере готовности
+                pages = parser.iter_pages(pdf_path, with_metadata=True, pages=args.pages)
             
-            # Форматируем вывод
             if args.output:
                 with open(args.output, 'w', encoding='utf-8') as f:
-                    for block in result:
-                        f.write(f"Страница {block.page_num}, ({block.x0}, {block.y0})-({block.x1}, {block.y1}): {block.text}\n")
+                    for _, blocks in pages:
+                        for block in blocks:
+                            block_type = f" [{block.block_type}]" if args.reading_order else ""
+                            f.write(f"Страница {block.page_num}, ({block.x0}, {block.y0})-({block.x1}, {block.y1})"
+                                    f"{block_type}: {block.text}\n")
             else:
-                for block in result:
-                    print(f"Страница {block.page_num}, ({block.x0:.1f}, {block.y0:.1f})-({block.x1:.1f}, {block.y1:.1f}): {block.text}")
+                for _, blocks in pages:
+                    for block in blocks:
+                        block_type = f" [{block.block_type}]" if args.reading_order else ""
+                        print(f"Страница {block.page_num}, ({block.x0:.1f}, {block.y0:.1f})-({block.x1:.1f}, {block.y1:.1f})"
+                              f"{block_type}: {block.text}")
         
         elif args.tables:
             # Извлечение таблиц
-            tables = parser.extract_tables(pdf_path)
+            tables = parser.extract_tables(pdf_path, pages=args.pages)
             
             if args.output:
                 with open(args.output, 'w', encoding='utf-8') as f:
                     for i, table in enumerate(tables):
-                        f.write(f"Таблица {i+1}:\n{table}\n\n")
+                        f.write(f"Таблица {i+1} (страница {table['page_num']}):\n{table_to_csv(table)}\n")
             else:
                 for i, table in enumerate(tables):
-                    print(f"Таблица {i+1}:")
-                    print(table)
-                    print()
+                    print(f"Таблица {i+1} (страница {table['page_num']}):")
+                    print(table_to_csv(table))
         
         else:
             # Простое извлечение текста
-            text = parser.extract_text(pdf_path)
+            if parser.cache is not None or args.head is not None or args.reading_order:
+                # Кэш заполняется только при извлечении документа целиком
+                pages = [(None, parser.extract_text(pdf_path, pages=args.pages, max_chars=args.head,
+                                                    reading_order=args.reading_order))]
+            else:
+                # Страницы записываются по мере готовности, весь документ в памяти не хранится
+                pages = parser.iter_pages(pdf_path, pages=args.pages)
             
             if args.output:
                 with open(args.output, 'w', encoding='utf-8') as f:
-                    f.write(text)
+                    for _, text in pages:
+                        f.write(text)
             else:
-                print(text)
+                for _, text in pages:
+                    sys.stdout.write(text)
+                sys.stdout.write("\n")
     else:
-        # Если несколько файлов, используем пакетную обработку
-        results = parser.batch_process(pdf_files)
-        
+        # Если несколько файлов, используем пакетную обработку;
+        # результаты записываются по мере готовности файлов
+        sink = create_sink(args, manifest)
+        with sink:
+            parser.batch_process(pdf_files, pages=args.pages, max_chars=args.head, sink=sink, index=index,
+                                 reading_order=args.reading_order, dedup=dedup,
+                                 skip_duplicates=args.skip_duplicates)
+        if sink.failed:
+            print(f"Не удалось обработать файлов: {sink.failed} из {sink.written}", file=sys.stderr)
+        if sink.quarantined:
+            print(f"В карантине файлов: {len(sink.quarantined)}", file=sys.stderr)
+            if args.quarantine:
+                with open(args.quarantine, 'a', encoding='utf-8') as f:
+                    f.writelines(path + "\n" for path in sink.quarantined)
+
+
+def write_chunks(args: argparse.Namespace, parser: PDFParser, pdf_files: List[str]) -> None:
+    """
+    Разбиение файлов на фрагменты и запись фрагментов в JSON Lines по мере готовности.
+    
+    Args:
+        args: Аргументы командной строки
+        parser: Парсер
+        pdf_files: Список PDF-файлов
+    """
+    length = (lambda text: len(text.split())) if args.chunk_unit == 'words' else None
+    chunker = TextChunker(args.chunk_size, args.chunk_overlap, length)
+    stream = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failed = 0
+    try:
+        for pdf_path in pdf_files:
+            try:
+                for chunk in parser.iter_chunks(pdf_path, chunker, pages=args.pages):
+                    stream.write(json.dumps(chunk.to_dict(), ensure_ascii=False) + "\n")
+            except Exception as e:
+                failed += 1
+                logging.getLogger('pdf_parser').error(f"Ошибка при обработке {pdf_path}: {e}")
+                stream.write(json.dumps({"path": pdf_path, "error": str(e), "error_type": type(e).__name__},
+                                        ensure_ascii=False) + "\n")
+            stream.flush()
+    finally:
+        if args.output:
+            stream.close()
+    if failed:
+        print(f"Не удалось обработать файлов: {failed} из {len(pdf_files)}", file=sys.stderr)
+
+
+def process_with_daemon(args: argparse.Namespace, client: pdf_daemon.DaemonClient,
+                        pdf_files: List[str], manifest: Optional[DirectoryManifest] = None) -> None:
+    """
+    Извлечение текста на запущенном сервере с выводом результатов по мере готовности.
+    
+    Args:
+        args: Аргументы командной строки
+        client: Клиент сервера
+        pdf_files: Список PDF-файлов
+        manifest: Манифест инкрементальной обработки
+    """
+    results = client.extract(pdf_files, pages=args.pages, max_chars=args.head)
+    
+    if len(pdf_files) == 1 and manifest is None:
+        result = next(results)
+        if result["error"] is not None:
+            print(f"Ошибка: {result['error']}", file=sys.stderr)
+            sys.exit(1)
         if args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
-                for file, content in results.items():
-                    f.write(f"=== {file} ===\n")
-                    f.write(content)
-                    f.write("\n\n")
+                f.write(result["text"])
         else:
-            for file, content in results.items():
-                print(f"=== {file} ===")
-                print(content[:1000] + "..." if len(content) > 1000 else content)
-                print("\n")
+            sys.stdout.write(result["text"])
+            sys.stdout.write("\n")
+        return
+    
+    sink = create_sink(args, manifest)
+    with sink:
+        for result in results:
+            sink.write(BatchResult(**result))
+    if sink.failed:
+        print(f"Не удалось обработать файлов: {sink.failed} из {sink.written}", file=sys.stderr)
+
+
+def search_main(argv: List[str]) -> None:
+    """
+    Поиск по полнотекстовому индексу (pdf_parser search).
+    
+    Args:
+        argv: Аргументы командной строки после имени подкоманды
+    """
+    parser = argparse.ArgumentParser(prog='pdf_parser search',
+                                     description='Поиск фразы в индексе, построенном ключом --index')
+    parser.add_argument('index', type=str, help='Путь к файлу индекса')
+    parser.add_argument('query', type=str, nargs='+',
+                        help='Слова фразы; слово с "*" на конце ищется как префикс')
+    parser.add_argument('-n', '--limit', type=int, default=20,
+                        help='Максимальное количество вхождений (по умолчанию 20)')
+    parser.add_argument('--format', choices=('text', 'jsonl'), default='text',
+                        help='Формат вывода вхождений')
+    args = parser.parse_args(argv)
+    
+    try:
+        index = SearchIndex(args.index, readonly=True)
+    except FileNotFoundError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    
+    start_time = time.perf_counter()
+    hits = index.search(" ".join(args.query), limit=args.limit)
+    elapsed = time.perf_counter() - start_time
+    index.close()
+    
+    for hit in hits:
+        if args.format == 'jsonl':
+            print(json.dumps(asdict(hit), ensure_ascii=False))
+        elif hit.bbox is not None:
+            x0, y0, x1, y1 = hit.bbox
+            print(f"{hit.path}: страница {hit.page_num}, слово {hit.position + 1}, "
+                  f"({x0:.1f}, {y0:.1f})-({x1:.1f}, {y1:.1f})")
+        else:
+            print(f"{hit.path}: страница {hit.page_num}, слово {hit.position + 1}")
+    print(f"Найдено вхождений: {len(hits)} за {elapsed * 1000:.1f} мс", file=sys.stderr)
+
+
+def format_page_list(pages: List[int]) -> str:
+    """Номера страниц в виде диапазонов: 1-3, 7, 10-12."""
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ", ".join(str(start) if start == stop else f"{start}-{stop}" for start, stop in ranges) or "-"
+
+
+def diff_main(argv: List[str]) -> None:
+    """
+    Постраничное сравнение версий документа (pdf_parser diff).
+    
+    Args:
+        argv: Аргументы командной строки после имени подкоманды
+    """
+    parser = argparse.ArgumentParser(prog='pdf_parser diff',
+                                     description='Сравнение страниц новой версии PDF с предыдущей '
+                                                 'по отпечаткам страниц (без извлечения текста)')
+    parser.add_argument('pdf_file', type=str, help='Новая версия документа')
+    parser.add_argument('previous', type=str, nargs='?', default=None,
+                        help='Предыдущая версия; если не указана, используются отпечатки, '
+                             'сохраненные в кэше --cache-dir при обработке с --page-reuse')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Директория постоянного кэша результатов извлечения')
+    parser.add_argument('--format', choices=('text', 'json'), default='text',
+                        help='Формат отчета')
+    args = parser.parse_args(argv)
+    
+    if args.previous is None and args.cache_dir is None:
+        print("Ошибка: укажите предыдущую версию документа или --cache-dir")
+        sys.exit(1)
+    
+    cache = ExtractionCache(args.cache_dir) if args.cache_dir else None
+    try:
+        diff = PDFParser(cache=cache, show_progress=False).page_diff(args.pdf_file, args.previous)
+    except (ValueError, RuntimeError, FileNotFoundError) as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+    
+    if args.format == 'json':
+        print(json.dumps(asdict(diff), ensure_ascii=False))
+        return
+    print(f"Страниц: было {diff.old_pages}, стало {diff.new_pages}, без изменений {len(diff.unchanged)}")
+    print(f"Изменены: {format_page_list(diff.changed)}")
+    print(f"Вставлены: {format_page_list(diff.added)}")
+    print(f"Удалены (номера в предыдущей версии): {format_page_list(diff.removed)}")
+    moved = [(old, new) for old, new in diff.unchanged if old != new]
+    if moved:
+        print(f"Сдвинуты без изменений: {len(moved)} (первая: {moved[0][0]} -> {moved[0][1]})")
+
+
+def scan_main(argv: List[str]) -> None:
+    """
+    Быстрое сканирование файлов без извлечения текста (pdf_parser scan).
+    
+    Args:
+        argv: Аргументы командной строки после имени подкоманды
+    """
+    parser = argparse.ArgumentParser(prog='pdf_parser scan',
+                                     description='Количество страниц, метаданные, шифрование, оглавление и '
+                                                 'наличие текстового слоя без извлечения текста')
+    parser.add_argument('paths', type=str, nargs='+', help='PDF-файлы или директории')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Файл сводки (по умолчанию JSON Lines в stdout)')
+    parser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl',
+                        help='Формат сводки: JSON Lines или Parquet (колоночный, требуется pyarrow)')
+    parser.add_argument('--sample-pages', type=int, default=1,
+                        help='Количество страниц, на которых проверяется наличие текстового слоя')
+    parser.add_argument('-s', '--single-thread', action='store_true',
+                        help='Сканировать в текущем процессе')
+    parser.add_argument('--mode', choices=PROCESSING_MODES, default='thread',
+                        help='Режим параллельной обработки (сканирование выполняется в процессах)')
+    parser.add_argument('--file-timeout', type=float, default=None,
+                        help='Ограничение времени сканирования пачки файлов в секундах '
+                             '(включает --mode isolated)')
+    args = parser.parse_args(argv)
+    
+    if args.format == 'parquet' and not args.output:
+        print("Ошибка: для формата parquet необходимо указать --output")
+        sys.exit(1)
+    if args.sample_pages < 1:
+        print("Ошибка: --sample-pages должен быть положительным")
+        sys.exit(1)
+    
+    scanner = PDFParser(use_multithreading=not args.single_thread,
+                        mode='isolated' if args.file_timeout else args.mode,
+                        file_timeout=args.file_timeout, show_progress=False)
+    stats = {"files": 0, "no_text": 0, "encrypted": 0, "errors": 0}
+    
+    def counted(results):
+        for result in results:
+            stats["files"] += 1
+            stats["errors"] += result.error is not None
+            stats["encrypted"] += bool(result.encrypted)
+            stats["no_text"] += result.has_text is False
+            yield result
+    
+    start_time = time.perf_counter()
+    results = counted(scanner.iter_scan(args.paths, sample_pages=args.sample_pages))
+    if args.format == 'parquet':
+        try:
+            write_scan_parquet(results, args.output)
+        except ImportError as e:
+            print(f"Ошибка: {e}")
+            sys.exit(1)
+    else:
+        stream = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for result in results:
+                stream.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        finally:
+            if args.output:
+                stream.close()
+    elapsed = time.perf_counter() - start_time
+    
+    print(f"Просканировано файлов: {stats['files']} за {elapsed:.2f} с "
+          f"({stats['files'] / elapsed if elapsed else 0:.0f} файлов/с); без текстового слоя "
+          f"{stats['no_text']}, зашифровано {stats['encrypted']}, ошибок {stats['errors']}", file=sys.stderr)
+
+
+def main():
+    """Основная функция программы."""
+    # Библиотека не настраивает логирование сама, это делает приложение
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        pdf_daemon.main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'search':
+        search_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'diff':
+        diff_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'scan':
+        scan_main(sys.argv[2:])
+        return
+    
+    args = parse_args()
+    
+    if not args.pdf_file:
+        print("Ошибка: не указан PDF-файл или директория")
+        sys.exit(1)
+    
+    # Получаем список PDF-файлов для обработки
+    entries = get_pdf_files(args.pdf_file)
+    
+    if not entries and not args.incremental:
+        print("Ошибка: не найдено ни одного PDF-файла")
+        sys.exit(1)
+    
+    # Служебные сообщения не должны попадать в JSON Lines, выводимые в stdout
+    status_stream = sys.stderr if (args.format == 'jsonl' or args.chunk) and not args.output else sys.stdout
+    
+    if args.chunk and (args.metadata or args.tables or args.incremental or args.index or args.dedup):
+        print("Ошибка: --chunk не совместим с --metadata, --tables, --incremental, --index и --dedup")
+        sys.exit(1)
+    try:
+        TextChunker(args.chunk_size, args.chunk_overlap)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    
+    if (args.incremental or args.index or args.dedup) and (args.metadata or args.tables):
+        print("Ошибка: --incremental, --index и --dedup поддерживаются только для извлечения текста")
+        sys.exit(1)
+    
+    if args.page_reuse and not args.cache_dir:
+        print("Ошибка: --page-reuse требует --cache-dir")
+        sys.exit(1)
+    
+    laparams = None
+    if args.laparams:
+        try:
+            laparams = json.loads(args.laparams)
+        except json.JSONDecodeError as e:
+            print(f"Ошибка: некорректный JSON в --laparams: {e}")
+            sys.exit(1)
+        if not isinstance(laparams, dict):
+            print("Ошибка: --laparams должен быть JSON-объектом")
+            sys.exit(1)
+        from pdfminer.layout import LAParams
+        try:
+            LAParams(**laparams)
+        except TypeError as e:
+            print(f"Ошибка: некорректные параметры --laparams: {e}")
+            sys.exit(1)
+    
+    index = SearchIndex(args.index) if args.index else None
+    dedup = DuplicateIndex(args.dedup) if args.dedup else None
+    manifest = None
+    if args.incremental:
+        manifest = DirectoryManifest(args.incremental)
+        pdf_files = select_changed_files(args, manifest, entries, status_stream, index, dedup)
+        if not pdf_files:
+            manifest.close()
+            if index is not None:
+                index.close()
+            if dedup is not None:
+                dedup.close()
+            return
+    else:
+        pdf_files = [entry.path for entry in entries]
+    
+    # Простое извлечение текста выполняет запущенный сервер, если он доступен
+    uses_parser = (args.metadata or args.tables or args.profile or args.metrics or args.cache_dir
+                   or args.single_thread or args.index or args.reading_order or args.ocr
+                   or args.dedup or args.chunk or args.mode == 'isolated' or args.file_timeout
+                   or args.max_worker_memory or args.max_files_per_worker or args.page_reuse)
+    client = None if uses_parser or args.no_daemon else pdf_daemon.find_daemon()
+    if client is not None:
+        start_time = time.time()
+        process_with_daemon(args, client, pdf_files, manifest)
+        if manifest is not None:
+            manifest.close()
+        print(f"Обработка завершена за {time.time() - start_time:.2f} секунд (сервер {client.address})",
+              file=status_stream)
+        return
+    
+    # Инициализируем парсер
+    cache = None
+    if args.cache_dir:
+        cache = ExtractionCache(args.cache_dir, max_size=args.cache_size * 1024 * 1024)
+    
+    metrics = ParserMetrics() if args.metrics else None
+    ocr = TesseractEngine(language=args.ocr_lang) if args.ocr else None
+    isolated = args.file_timeout or args.max_worker_memory or args.max_files_per_worker
+    parser = PDFParser(use_multithreading=not args.single_thread, mode='isolated' if isolated else args.mode,
+                       cache=cache, metrics=metrics, ocr=ocr, ocr_dpi=args.ocr_dpi, laparams=laparams,
+                       file_timeout=args.file_timeout,
+                       max_worker_memory=args.max_worker_memory and args.max_worker_memory * 1024 * 1024,
+                       max_files_per_worker=args.max_files_per_worker, retries=args.retries,
+                       page_reuse=args.page_reuse)
+    
+    start_time = time.time()
+    
+    # Обрабатываем файлы
+    if args.profile == 'cpu':
+        import cProfile
+        import pstats
+        
+        profiler = cProfile.Profile()
+        profiler.runcall(process_files, args, parser, pdf_files, manifest, index, dedup)
+        if args.profile_output:
+            profiler.dump_stats(args.profile_output)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(30)
+    elif args.profile == 'memory':
+        import tracemalloc
+        
+        tracemalloc.start()
+        try:
+            process_files(args, parser, pdf_files, manifest, index, dedup)
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print(f"Пиковый объем выделенной памяти: {peak / 1024 / 1024:.1f} МБ", file=sys.stderr)
+        for stat in snapshot.statistics('lineno')[:20]:
+            print(stat, file=sys.stderr)
+    else:
+        process_files(args, parser, pdf_files, manifest, index, dedup)
+    parser.close()
+    
+    if manifest is not None:
+        manifest.close()
+    if index is not None:
+        index.close()
+    if dedup is not None:
+        stats = dedup.stats()
+        print(f"Дубликаты: документов {stats['docs']}, групп {stats['clusters']}, "
+              f"дубликатов {stats['duplicates']}", file=status_stream)
+        dedup.close()
     
     elapsed = time.time() - start_time
-    print(f"Обработка завершена за {elapsed:.2f} секунд")
+    print(f"Обработка завершена за {elapsed:.2f} секунд", file=status_stream)
+    
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Кэш: попаданий {stats['hits']}, промахов {stats['misses']}, "
+              f"записей {stats['entries']}, размер {stats['size'] / 1024 / 1024:.1f} МБ",
+              file=status_stream)
+        cache.close()
+    
+    if metrics is not None:
+        print(metrics.to_json() if args.metrics == 'json' else metrics.to_prometheus(),
+              file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Фоновый сервер извлечения текста и клиент к нему.
+
+Сервер держит прогретый пул процессов (или потоков) и принимает задания по
+Unix-сокету или TCP на localhost. Протокол — JSON Lines: клиент отправляет
+одну строку-запрос, сервер возвращает результаты по каждому файлу по мере
+готовности и завершающую строку {"done": true, ...}.
+
+Аутентификации в протоколе нет: Unix-сокет доступен только владельцу, а
+TCP-порт — любому локальному пользователю, который может через сервер читать
+файлы, доступные владельцу сервера, и остановить его.
+
+Запросы:
+    {"op": "ping"}
+    {"op": "stats"}
+    {"op": "extract", "files": [...], "pages": "1-3", "max_chars": 1000}
+    {"op": "shutdown"}
+
+Клиентская часть модуля не импортирует pdf_parser, PyMuPDF и PDFMiner,
+поэтому обращение к запущенному серверу не требует их загрузки.
+
+Пример:
+    pdf_parser serve --workers 4
+    pdf_parser file1.pdf file2.pdf   # использует запущенный сервер
+    pdf_parser serve --stop
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import socketserver
+import concurrent.futures
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+
+# Переменная окружения с адресом сервера: путь к Unix-сокету или "host:port"
+DAEMON_ADDRESS_ENV = "PDF_PARSER_DAEMON"
+
+# Максимальное количество файлов одного клиента, обрабатываемых одновременно
+DAEMON_CLIENT_LIMIT = 4
+
+# Время ожидания ответа на ping при поиске запущенного сервера (секунды)
+DAEMON_PING_TIMEOUT = 0.5
+
+# Адреса, на которых сервер принимает TCP-соединения
+DAEMON_LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def default_address() -> str:
+    """
+    Адрес сервера по умолчанию: значение PDF_PARSER_DAEMON, иначе Unix-сокет
+    во временной директории (или localhost:8765, если Unix-сокеты недоступны).
+    """
+    address = os.environ.get(DAEMON_ADDRESS_ENV)
+    if address:
+        return address
+    if hasattr(socket, "AF_UNIX"):
+        user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+        return os.path.join(tempfile.gettempdir(), f"pdf_parser-{user}.sock")
+    return "127.0.0.1:8765"
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """Разбор адреса: "host:port" или "[::1]:port" для TCP, иначе путь к Unix-сокету."""
+    match = re.fullmatch(r"([\w.\-]+|\[[0-9A-Fa-f:]+\]):(\d+)", address)
+    if match:
+        return match.group(1).strip("[]"), int(match.group(2))
+    return address
+
+
+class DaemonError(Exception):
+    """Ошибка, возвращенная сервером или возникшая при обмене с ним."""
+
+
+class DaemonClient:
+    """
+    Клиент сервера извлечения.
+    
+    Каждый запрос выполняется в отдельном соединении, поэтому один клиент
+    можно использовать из нескольких потоков.
+    """
+    
+    def __init__(self, address: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            address: Адрес сервера (None = default_address())
+            timeout: Время ожидания ответа сервера в секундах (None = без ограничения)
+        """
+        self.address = address or default_address()
+        self.timeout = timeout
+    
+    def _connect(self) -> socket.socket:
+        target = parse_address(self.address)
+        if isinstance(target, tuple):
+            sock = socket.create_connection(target, timeout=self.timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(target)
+            except OSError:
+                sock.close()
+                raise
+        return sock
+    
+    def request(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Отправка запроса и чтение ответов до завершающей строки.
+        
+        Yields:
+            Dict[str, Any]: Строки ответа сервера, включая завершающую {"done": true}
+        
+        Raises:
+            DaemonError: Если сервер вернул ошибку запроса или закрыл соединение
+        """
+        with self._connect() as sock:
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("r", encoding="utf-8") as stream:
+                for line in stream:
+                    message = json.loads(line)
+                    if message.get("done") and message.get("error"):
+                        raise DaemonError(message["error"])
+                    yield message
+                    if message.get("done"):
+                        return
+        raise DaemonError("Сервер закрыл соединение, не завершив ответ")
+    
+    def ping(self) -> Dict[str, Any]:
+        """Проверка сервера: pid, режим и количество исполнителей."""
+        return next(self.request({"op": "ping"}))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики сервера и статистика кэша."""
+        return next(self.request({"op": "stats"}))
+    
+    def extract(self, files: List[str], pages: Any = None,
+                max_chars: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Извлечение текста файлов на сервере.
+        
+        Пути передаются серверу абсолютными, а в результатах возвращаются
+        в том виде, в котором были переданы.
+        
+        Args:
+            files: Пути к PDF-файлам
+            pages: Извлекаемые страницы: номер, строка вида "1-3,10" или их список
+            max_chars: Ограничение на объем текста каждого файла
+        
+        Yields:
+            Dict[str, Any]: {"path", "text", "error", "error_type"} по мере готовности файлов
+        """
+        originals = {os.path.abspath(path): path for path in files}
+        request = {"op": "extract", "files": list(originals), "pages": pages, "max_chars": max_chars}
+        for message in self.request(request):
+            if message.get("done"):
+                return
+            message["path"] = originals.get(message["path"], message["path"])
+            yield message
+    
+    def shutdown(self) -> None:
+        """Остановка сервера."""
+        for _ in self.request({"op": "shutdown"}):
+            pass
+
+
+def find_daemon(address: Optional[str] = None) -> Optional[DaemonClient]:
+    """
+    Поиск запущенного сервера.
+    
+    Returns:
+        Optional[DaemonClient]: Клиент, если сервер отвечает на ping, иначе None
+    """
+    client = DaemonClient(address, timeout=DAEMON_PING_TIMEOUT)
+    try:
+        client.ping()
+    except (OSError, ValueError, DaemonError, StopIteration):
+        return None
+    client.timeout = None
+    return client
+
+
+def _warm_up() -> int:
+    """Загрузка модулей парсера в рабочем процессе."""
+    import pdf_parser  # noqa: F401
+    return os.getpid()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Обработчик соединения: запросы JSON Lines, по одному на строку."""
+    
+    def handle(self) -> None:
+        daemon = self.server.extraction_daemon
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                daemon.handle_request(request, self._write)
+            except (BrokenPipeError, ConnectionResetError):
+                # Клиент отключился, не дождавшись ответа
+                return
+            except Exception as e:
+                self._write({"done": True, "error": str(e), "error_type": type(e).__name__})
+    
+    def _write(self, message: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _ThreadingTCP6Server(_ThreadingTCPServer):
+    address_family = socket.AF_INET6
+
+
+class ExtractionDaemon:
+    """
+    Сервер извлечения текста с прогретым пулом исполнителей.
+    
+    Пул создается один раз при запуске, и все его процессы заранее
+    загружают PyMuPDF, поэтому задания не тратят время на запуск
+    интерпретатора и импорт модулей. Каждое соединение обрабатывается
+    в своем потоке; одновременно в пуле находится не больше client_limit
+    файлов одного клиента, результаты отправляются по мере готовности.
+    """
+    
+    def __init__(self, address: Optional[str] = None, mode: str = "process",
+                 max_workers: Optional[int] = None, client_limit: int = DAEMON_CLIENT_LIMIT,
+                 cache_dir: Optional[str] = None, cache_size: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            address: Адрес для приема соединений (None = default_address())
+            mode: "process" (пул процессов), "thread" (пул потоков) или "isolated"
+                (наблюдаемые процессы: процесс, аварийно завершившийся на файле,
+                заменяется новым, а файл повторяется один раз)
+            max_workers: Количество исполнителей (None = количество ядер)
+            client_limit: Максимальное количество файлов одного клиента в работе
+            cache_dir: Директория постоянного кэша результатов (None = без кэша)
+            cache_size: Максимальный размер кэша в байтах
+        """
+        from pdf_parser import PROCESSING_MODES, ExtractionCache, ParserMetrics
+        
+        if mode not in PROCESSING_MODES:
+            raise ValueError(f"Неизвестный режим обработки: {mode}. "
+                             f"Допустимые значения: {', '.join(PROCESSING_MODES)}")
+        
+        self.address = address or default_address()
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.client_limit = max(1, client_limit)
+        self.cache = ExtractionCache(cache_dir, max_size=cache_size) if cache_dir else None
+        self.metrics = ParserMetrics()
+        self.started = time.time()
+        self._server = None
+        
+        if mode == "isolated":
+            # Аварийное завершение процесса на одном файле не останавливает пул
+            from pdf_parser import _SupervisedExecutor
+            self.executor = _SupervisedExecutor(self.max_workers)
+        else:
+            executor_cls = (concurrent.futures.ProcessPoolExecutor if mode == "process"
+                            else concurrent.futures.ThreadPoolExecutor)
+            self.executor = executor_cls(max_workers=self.max_workers)
+    
+    def warm_up(self) -> None:
+        """Запуск всех исполнителей пула и загрузка в них модулей парсера."""
+        futures = [self.executor.submit(_warm_up) for _ in range(self.max_workers)]
+        concurrent.futures.wait(futures)
+    
+    def bind(self) -> None:
+        """
+        Создание сокета для приема соединений.
+        
+        Raises:
+            ValueError: Если TCP-адрес не относится к localhost
+            RuntimeError: Если на Unix-сокете уже запущен сервер
+        """
+        target = parse_address(self.address)
+        if isinstance(target, tuple):
+            if target[0] not in DAEMON_LOOPBACK_HOSTS:
+                raise ValueError(f"Сервер принимает TCP-соединения только на localhost "
+                                 f"({', '.join(DAEMON_LOOPBACK_HOSTS)}), указан адрес {target[0]}")
+            server_cls = _ThreadingTCP6Server if ":" in target[0] else _ThreadingTCPServer
+            self._server = server_cls(target, _RequestHandler)
+        else:
+            if os.path.exists(target):
+                if find_daemon(target) is not None:
+                    raise RuntimeError(f"Сервер уже запущен: {target}")
+                # Сокет остался от аварийно завершенного сервера
+                os.unlink(target)
+            self._server = _ThreadingUnixServer(target, _RequestHandler)
+            os.chmod(target, 0o600)
+        self._server.extraction_daemon = self
+    
+    def serve_forever(self) -> None:
+        """Прием соединений до вызова shutdown()."""
+        if self._server is None:
+            self.bind()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+    
+    def shutdown(self) -> None:
+        """Остановка приема соединений (можно вызывать из любого потока)."""
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+    
+    def close(self) -> None:
+        """Освобождение сокета, пула и кэша."""
+        if self._server is not None:
+            self._server.server_close()
+            target = parse_address(self.address)
+            if not isinstance(target, tuple) and os.path.exists(target):
+                os.unlink(target)
+            self._server = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+    
+    def handle_request(self, request: Dict[str, Any], write) -> None:
+        """
+        Выполнение одного запроса.
+        
+        Args:
+            request: Разобранная строка запроса
+            write: Функция отправки строки ответа
+        """
+        op = request.get("op")
+        self.metrics.incr("requests")
+        
+        if op == "ping":
+            write({"done": True, "pid": os.getpid(), "mode": self.mode,
+                   "workers": self.max_workers, "client_limit": self.client_limit,
+                   "uptime": time.time() - self.started})
+        elif op == "stats":
+            stats = self.metrics.snapshot()
+            if self.cache is not None:
+                stats["cache"] = self.cache.stats()
+            write(dict(stats, done=True))
+        elif op == "extract":
+            self._extract(request, write)
+        elif op == "shutdown":
+            write({"done": True})
+            self.shutdown()
+        else:
+            raise ValueError(f"Неизвестная операция: {op}")
+    
+    def _extract(self, request: Dict[str, Any], write) -> None:
+        """Извлечение текста файлов запроса с отправкой результатов по мере готовности."""
+        from pdf_parser import _extract_file_text, _limit_chars, _resolve_pages
+        
+        pages = request.get("pages")
+        max_chars = request.get("max_chars")
+        limit = min(request.get("concurrency") or self.client_limit, self.client_limit)
+        pending = deque(request.get("files") or [])
+        in_flight = {}
+        failed = total = 0
+        
+        def send(path: str, text: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+            nonlocal failed, total
+            total += 1
+            self.metrics.incr("files")
+            if error is not None:
+                failed += 1
+                self.metrics.incr("errors")
+            write({"path": path, "text": text,
+                   "error": None if error is None else str(error),
+                   "error_type": None if error is None else type(error).__name__})
+        
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < limit:
+                    path = pending.popleft()
+                    cached = None
+                    if self.cache is not None:
+                        try:
+                            cached = self.cache.get(path, "text", "pymupdf")
+                        except OSError as e:
+                            send(path, error=e)
+                            continue
+                    if cached is not None:
+                        indices = _resolve_pages(pages, len(cached))
+                        send(path, "".join(_limit_chars((cached[idx] for idx in indices), max_chars)))
+                        continue
+                    in_flight[self.executor.submit(_extract_file_text, path, pages, max_chars)] = path
+                
+                if not in_flight:
+                    continue
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    try:
+                        page_texts = future.result()
+                    except Exception as e:
+                        send(path, error=e)
+                        continue
+                    if self.cache is not None and pages is None and max_chars is None:
+                        self.cache.put(path, "text", "pymupdf", page_texts)
+                    send(path, "".join(page_texts))
+        finally:
+            # При отключении клиента его оставшиеся задачи не выполняются
+            for future in in_flight:
+                future.cancel()
+        
+        write({"done": True, "files": total, "failed": failed})
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбор аргументов командной строки сервера."""
+    parser = argparse.ArgumentParser(prog='pdf_parser serve',
+                                     description='Фоновый сервер извлечения текста из PDF')
+    
+    parser.add_argument('--address', type=str, default=None,
+                        help='Путь к Unix-сокету или "127.0.0.1:порт" (только localhost) '
+                             f'(по умолчанию ${DAEMON_ADDRESS_ENV} или {default_address()})')
+    parser.add_argument('--mode', choices=('process', 'thread', 'isolated'), default='process',
+                        help='Пул процессов, пул потоков или наблюдаемые процессы '
+                             '(аварийное завершение на одном файле не останавливает пул)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Количество исполнителей (по умолчанию количество ядер)')
+    parser.add_argument('--client-limit', type=int, default=DAEMON_CLIENT_LIMIT,
+                        help='Максимальное количество файлов одного клиента в работе')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Директория постоянного кэша результатов извлечения')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='Максимальный размер кэша в МБ (по умолчанию 1024)')
+    parser.add_argument('--status', action='store_true',
+                        help='Показать состояние запущенного сервера')
+    parser.add_argument('--stop', action='store_true',
+                        help='Остановить запущенный сервер')
+    
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Запуск, остановка или проверка сервера."""
+    args = parse_args(argv)
+    address = args.address or default_address()
+    
+    if args.status or args.stop:
+        client = find_daemon(address)
+        if client is None:
+            print(f"Сервер не запущен: {address}")
+            sys.exit(1)
+        if args.stop:
+            client.shutdown()
+            print("Сервер остановлен")
+        else:
+            status = dict(client.ping(), **client.stats())
+            status.pop("done")
+            print(json.dumps(status, ensure_ascii=False, indent=2))
+        return
+    
+    daemon = ExtractionDaemon(address, mode=args.mode, max_workers=args.workers,
+                              client_limit=args.client_limit, cache_dir=args.cache_dir,
+                              cache_size=args.cache_size * 1024 * 1024)
+    try:
+        daemon.bind()
+    except (ValueError, RuntimeError) as e:
+        daemon.close()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    daemon.warm_up()
+    print(f"Сервер запущен: {address} (режим: {daemon.mode}, исполнителей: {daemon.max_workers})",
+          file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
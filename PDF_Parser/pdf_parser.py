@@ -1,27 +1,155 @@
 #!python
 # -*- coding: utf-8 -*-
 
+from __future__ import annotations
+
+import io
 import os
+import re
+import sys
+import csv
+import math
+import mmap
 import time
+import json
+import zlib
+import bisect
+import random
+import sqlite3
+import difflib
+import hashlib
+import threading
+import importlib
 import concurrent.futures
-from typing import Dict, List, Tuple, Union, Optional, Any
-from dataclasses import dataclass
+from array import array
+from collections import Counter, deque, OrderedDict
+from contextlib import contextmanager, ExitStack
+from typing import (
+    TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple, Union,
+)
+from dataclasses import dataclass, asdict, astuple, field
 import logging
-from tqdm import tqdm
 
-# PyMuPDF для быстрого извлечения текста
-import fitz
+if TYPE_CHECKING:
+    from pdfminer.layout import LTPage
 
-# PDFMiner для более точного извлечения в сложных случаях
-from pdfminer.high_level import extract_pages, extract_text as pdfminer_extract_text
-from pdfminer.layout import LTTextContainer, LTPage, LTFigure, LTTextBox, LTTextLine
 
-# Настройка логгера
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+class _LazyModule:
+    """
+    Модуль, который импортируется при первом обращении к его атрибуту.
+    
+    Полученные атрибуты сохраняются в самом объекте, поэтому повторные
+    обращения не дороже обычного доступа к атрибуту модуля.
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+    
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(importlib.import_module(self._name), attr)
+        setattr(self, attr, value)
+        return value
+
+
+# PyMuPDF для быстрого извлечения текста. Импорт PyMuPDF, PDFMiner, tqdm и
+# asyncio занимает большую часть времени запуска, поэтому они загружаются
+# при первом использовании; PDFMiner импортируется только в детальном режиме
+fitz = _LazyModule("fitz")
+asyncio = _LazyModule("asyncio")
+
+# Библиотека не настраивает журналирование сама: это делает приложение
+# (например, example.py)
 logger = logging.getLogger('pdf_parser')
+logger.addHandler(logging.NullHandler())
+
+# Поддерживаемые режимы параллельной обработки
+PROCESSING_MODES = ("thread", "process", "isolated")
+
+# Время обращения к записям кэша извлечения записывается пачками: при записи
+# в кэш, при закрытии или после этого количества попаданий
+CACHE_ACCESS_BATCH = 1024
+
+# Наблюдаемые процессы пакетной обработки (режим "isolated")
+WORKER_POLL_INTERVAL = 0.1  # период проверки памяти занятых процессов, секунды
+WORKER_STOP_TIMEOUT = 5.0  # ожидание штатного завершения процесса при остановке пула, секунды
+WORKER_QUEUE_DEPTH = 2  # количество задач, переданных процессу (следующая ждет в канале)
+# Заранее передаются только небольшие задачи: запись большой задачи в канал занятого
+# процесса заблокировала бы поток наблюдения
+WORKER_PREFETCH_BYTES = 16 * 1024
+
+# Количество страниц в одной задаче при потоковом параллельном извлечении
+STREAM_CHUNK_PAGES = 8
+
+# Параллельное извлечение PDFMiner
+PDFMINER_SHARD_PAGES = 16  # количество страниц в одной задаче пула
+PDFMINER_WORKER_DOCS = 2  # количество разобранных документов, которые хранит процесс пула
+
+# Параметры планировщика пакетной обработки
+SCHEDULER_SPLIT_PAGES = 64  # максимальное количество страниц одного файла в задаче
+SCHEDULER_SMALL_FILE = 1024 * 1024  # файлы меньше этого размера не открываются при планировании
+SCHEDULER_BATCH_BYTES = 4 * 1024 * 1024  # суммарный размер пакета мелких файлов
+SCHEDULER_BATCH_FILES = 32  # максимальное количество файлов в пакете
+
+# Быстрое сканирование: файлы передаются процессам пачками, чтобы накладные
+# расходы на передачу задачи не превышали время обработки файла
+SCAN_BATCH_FILES = 64
+
+# Параметры геометрического поиска таблиц
+TABLE_CELL_GAP = 0.8  # минимальный разрыв между ячейками строки (в размерах шрифта)
+TABLE_ROW_GAP = 1.5  # максимальный разрыв между строками таблицы (в высотах строки)
+TABLE_RULING_WIDTH = 2.0  # максимальная толщина линии разметки в пунктах
+
+# Пороги оценки качества страницы в гибридном режиме
+HYBRID_BAD_CHAR_RATIO = 0.02  # доля нераспознанных символов (U+FFFD, PUA, управляющие)
+HYBRID_OVERLAP_RATIO = 0.2  # доля span'ов, перекрывающих соседний
+
+# Параметры восстановления порядка чтения
+LAYOUT_MARGIN_ZONE = 0.1  # доля высоты страницы сверху и снизу, где ищутся колонтитулы
+LAYOUT_REPEAT_RATIO = 0.3  # минимальная доля страниц, на которых повторяется колонтитул
+LAYOUT_COLUMN_GAP = 1.0  # минимальный промежуток между колонками (в размерах основного шрифта)
+LAYOUT_COLUMN_BLOCKS = 3  # минимальное количество блоков в колонке
+LAYOUT_HEADING_RATIO = 1.2  # минимальное отношение размера шрифта заголовка к основному
+
+# Подпись к рисунку или таблице: "Рис. 1", "Таблица 2", "Figure 3" и т.п.
+_CAPTION_RE = re.compile(r"^(рис\.?|рисунок|табл\.?|таблица|схема|fig\.?|figure|table)\s*\d", re.IGNORECASE)
+_DIGITS_RE = re.compile(r"\d+")
+
+# Дата в формате PDF: D:ГГГГММДДччммсс+чч'мм' (все части после года необязательны)
+_PDF_DATE_RE = re.compile(
+    r"^(?:D:)?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?(?:([Zz])|([+-])(\d{2})'?(\d{2})?'?)?")
+
+# Количество записей манифеста между фиксациями транзакции
+MANIFEST_COMMIT_EVERY = 100
+
+# Отпечатки страниц: ссылки на родительские объекты (дерево страниц,
+# страница аннотации) не входят в отпечаток, иначе он зависел бы от всего документа
+_PDF_REF_RE = re.compile(r"(\d+) (\d+) R\b")
+_PDF_BACKREF_RE = re.compile(r"/(?:Parent|P) \d+ \d+ R\b")
+_PDF_CONTENTS_RE = re.compile(r"/Contents\s*(?:\d+ \d+ R|\[[^\]]*\])")
+# Ключи способа сжатия потока: после перезаписи файла с другим сжатием поток тот же
+_PDF_STREAM_KEYS_RE = re.compile(r"/(?:Length|DL) \d+|/Filter\s*(?:/\w+|\[[^\]]*\])|/DecodeParms\s*<<[^>]*>>")
+# Потоки в форматах изображений при перезаписи файла не пережимаются и не декодируются
+_PDF_IMAGE_FILTER_RE = re.compile(r"/(?:DCT|JPX|JBIG2|CCITTFax)Decode\b")
+_PAGE_INHERITED_KEYS = ("Resources", "MediaBox", "CropBox", "Rotate")
+
+# Параметры полнотекстового индекса
+SEARCH_COMMIT_PAGES = 1000  # количество страниц между фиксациями транзакции
+SEARCH_PREFIX_EXPANSIONS = 1024  # максимальное количество слов для одного префикса
+SEARCH_MMAP_SIZE = 1024 * 1024 * 1024  # объем файла индекса, отображаемый в память
+
+# Слово для полнотекстового индекса: последовательность букв и цифр
+_TOKEN_RE = re.compile(r"\w+")
+
+# Параметры поиска почти одинаковых документов (MinHash/LSH)
+DEDUP_NUM_PERM = 128  # длина сигнатуры MinHash
+DEDUP_SHINGLE_SIZE = 5  # количество слов в шингле
+DEDUP_THRESHOLD = 0.8  # минимальное сходство (оценка коэффициента Жаккара) дубликатов
+DEDUP_COMMIT_EVERY = 100  # количество документов между фиксациями транзакции
+_MINHASH_PRIME = (1 << 61) - 1  # модуль хеш-функций вида (a * x + b) mod p
+
+# Параметры разбиения текста на фрагменты для эмбеддингов
+CHUNK_SIZE = 1000  # максимальный размер фрагмента (в единицах функции длины)
+CHUNK_OVERLAP = 200  # размер перекрытия соседних фрагментов
 
 
 @dataclass
@@ -38,55 +166,4583 @@ class TextBlock:
     block_type: str = "text"  # тип блока (text, heading, etc.)
 
 
-class PDFParser:
+@dataclass
+class PageReport:
+    """Отчет об извлечении страницы в гибридном режиме."""
+    page_num: int
+    backend: str  # бэкенд, результат которого использован (pymupdf, pdfminer)
+    pymupdf_time: float
+    pdfminer_time: Optional[float] = None
+    issues: List[str] = field(default_factory=list)  # причины повторного извлечения
+
+
+class WorkerError(RuntimeError):
     """
-    Быстрый и точный парсер PDF-файлов с поддержкой обработки больших документов.
+    Процесс пакетной обработки остановлен при обработке файла (режим "isolated").
     
-    Использует комбинацию PyMuPDF (быстрый) и PDFMiner (более точный) для
-    обеспечения оптимального баланса скорости и точности.
+    Attributes:
+        attempts: Количество попыток обработки файла
+    """
+    
+    def __init__(self, message: str, attempts: int = 1):
+        super().__init__(message)
+        self.attempts = attempts
+    
+    def __str__(self) -> str:
+        message = super().__str__()
+        return message if self.attempts == 1 else f"{message}, попыток: {self.attempts}"
+
+
+class WorkerTimeoutError(WorkerError):
+    """Обработка файла превысила ограничение времени; процесс остановлен."""
+
+
+class WorkerMemoryError(WorkerError):
+    """Процесс превысил ограничение памяти при обработке файла и остановлен."""
+
+
+class WorkerCrashError(WorkerError):
+    """Процесс аварийно завершился при обработке файла."""
+
+
+@dataclass
+class BatchResult:
+    """Результат обработки одного файла в пакетном режиме."""
+    path: str
+    text: Optional[str] = None
+    error: Optional[str] = None  # сообщение об ошибке, если файл не обработан
+    error_type: Optional[str] = None  # имя класса исключения
+    pages: Optional[List[Tuple[int, str]]] = None  # текст по страницам (только для индексирования)
+    cluster: Optional[int] = None  # группа почти одинаковых документов (при поиске дубликатов)
+    duplicate_of: Optional[str] = None  # ранее обработанный почти одинаковый документ
+    # Файл приводит к зависанию, превышению памяти или аварийному завершению
+    # процесса обработки (режим "isolated", все попытки исчерпаны)
+    quarantined: bool = False
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+    
+    @classmethod
+    def from_exception(cls, path: str, error: BaseException) -> "BatchResult":
+        return cls(path=path, error=str(error), error_type=type(error).__name__,
+                   quarantined=isinstance(error, WorkerError))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"path": self.path, "text": self.text, "error": self.error, "error_type": self.error_type}
+        if self.cluster is not None:
+            data["cluster"] = self.cluster
+            data["duplicate_of"] = self.duplicate_of
+        if self.quarantined:
+            data["quarantined"] = True
+        return data
+
+
+@dataclass
+class SearchHit:
+    """Вхождение фразы, найденное в полнотекстовом индексе."""
+    path: str
+    page_num: int
+    position: int  # номер первого слова фразы на странице
+    length: int  # количество слов фразы
+    bbox: Optional[Tuple[float, float, float, float]] = None  # блок, содержащий начало фразы
+
+
+@dataclass
+class DuplicateMatch:
+    """Результат добавления документа в индекс дубликатов."""
+    path: str
+    cluster: int  # идентификатор группы почти одинаковых документов
+    duplicate_of: Optional[str] = None  # наиболее похожий ранее добавленный документ
+    similarity: float = 0.0  # оценка коэффициента Жаккара с duplicate_of
+    exact: bool = False  # содержимое файла совпадает с duplicate_of побайтно
+
+
+@dataclass
+class TextChunk:
+    """Фрагмент текста документа ограниченного размера с привязкой к страницам."""
+    text: str
+    page_start: int
+    page_end: int
+    # Номер страницы и прямоугольник (x0, y0, x1, y1) каждого блока фрагмента
+    anchors: List[Tuple[int, float, float, float, float]] = field(default_factory=list)
+    index: int = 0  # порядковый номер фрагмента в документе
+    path: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"path": self.path, "index": self.index, "page_start": self.page_start,
+                "page_end": self.page_end, "text": self.text, "anchors": [list(a) for a in self.anchors]}
+
+
+@dataclass
+class FileEntry:
+    """PDF-файл, найденный при сканировании директории."""
+    path: str
+    size: int
+    mtime_ns: int
+
+
+@dataclass
+class ManifestRecord:
+    """Запись манифеста директории о состоянии обработки одного файла."""
+    path: str
+    size: int
+    mtime_ns: int
+    digest: str
+    status: str  # pending, ok, error, quarantined
+    output: Optional[str] = None  # куда записан результат
+    error: Optional[str] = None
+
+
+@dataclass
+class ManifestChanges:
+    """Изменения в наборе файлов по сравнению с манифестом."""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[ManifestRecord] = field(default_factory=list)
+
+
+@dataclass
+class PageDiff:
+    """Постраничное сравнение двух версий документа (номера страниц с 1)."""
+    old_pages: int
+    new_pages: int
+    unchanged: List[Tuple[int, int]] = field(default_factory=list)  # (страница старой версии, новой)
+    changed: List[int] = field(default_factory=list)  # страницы новой версии, измененные на месте
+    added: List[int] = field(default_factory=list)  # вставленные страницы новой версии
+    removed: List[int] = field(default_factory=list)  # удаленные страницы старой версии
+
+
+@dataclass
+class ScanResult:
+    """Сводка о PDF-файле, полученная быстрым сканированием без извлечения текста."""
+    path: str
+    size: int
+    pages: Optional[int] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    creation_date: Optional[str] = None  # ISO 8601, если дата в формате PDF
+    encrypted: Optional[bool] = None
+    # Оглавление: (уровень, заголовок, страница); None, если документ защищен паролем
+    toc: Optional[List[Tuple[int, str, int]]] = None
+    has_text: Optional[bool] = None  # есть ли текстовый слой на проверенных страницах
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        if self.toc is not None:
+            data["toc"] = [list(item) for item in self.toc]
+        return data
+
+
+class TextBlockTable:
+    """
+    Колоночное хранилище текстовых блоков.
+    
+    Вместо отдельного объекта TextBlock на каждый span координаты, номера страниц
+    и размеры шрифтов хранятся в типизированных массивах, имена шрифтов и типы
+    блоков — в виде идентификаторов в таблицах интернирования, а весь текст —
+    в одной строке со смещениями. При итерации выдаются объекты TextBlock,
+    поэтому таблицу можно использовать вместо списка блоков.
+    """
+    
+    def __init__(self):
+        self.page_num = array('i')
+        self.x0 = array('d')
+        self.y0 = array('d')
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.font_size = array('d')  # NaN, если размер неизвестен
+        self.font_id = array('i')  # -1, если шрифт неизвестен
+        self.type_id = array('i')
+        self.fonts: List[str] = []
+        self.block_types: List[str] = []
+        self._font_ids: Dict[str, int] = {}
+        self._type_ids: Dict[str, int] = {}
+        self._offsets = array('q', [0])
+        self._buffer = io.StringIO()
+        self._text: Optional[str] = ""
+    
+    def __len__(self) -> int:
+        return len(self.page_num)
+    
+    def __iter__(self) -> Iterator[TextBlock]:
+        for idx in range(len(self)):
+            yield self[idx]
+    
+    def __getitem__(self, idx: int) -> TextBlock:
+        if idx < 0:
+            idx += len(self)
+        font_id = self.font_id[idx]
+        font_size = self.font_size[idx]
+        return TextBlock(
+            text=self.text(idx),
+            page_num=self.page_num[idx],
+            x0=self.x0[idx],
+            y0=self.y0[idx],
+            x1=self.x1[idx],
+            y1=self.y1[idx],
+            font=self.fonts[font_id] if font_id >= 0 else None,
+            font_size=None if math.isnan(font_size) else font_size,
+            block_type=self.block_types[self.type_id[idx]]
+        )
+    
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (TextBlockTable, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_text"] = self.full_text
+        del state["_buffer"]
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._buffer = io.StringIO()
+        self._buffer.write(self._text)
+    
+    @staticmethod
+    def _intern(value: str, ids: Dict[str, int], values: List[str]) -> int:
+        """Получение идентификатора строки в таблице интернирования."""
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(values)
+            values.append(value)
+        return value_id
+    
+    def append(self, text: str, page_num: int, x0: float, y0: float, x1: float, y1: float,
+               font: Optional[str] = None, font_size: Optional[float] = None,
+               block_type: str = "text") -> None:
+        """Добавление блока текста (аргументы совпадают с полями TextBlock)."""
+        self.page_num.append(page_num)
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.font_size.append(math.nan if font_size is None else font_size)
+        self.font_id.append(-1 if font is None else self._intern(font, self._font_ids, self.fonts))
+        self.type_id.append(self._intern(block_type, self._type_ids, self.block_types))
+        self._buffer.write(text)
+        self._offsets.append(self._offsets[-1] + len(text))
+        self._text = None
+    
+    def extend(self, other: "TextBlockTable") -> None:
+        """Добавление всех блоков другой таблицы в конец текущей."""
+        font_map = [self._intern(font, self._font_ids, self.fonts) for font in other.fonts]
+        type_map = [self._intern(block_type, self._type_ids, self.block_types)
+                    for block_type in other.block_types]
+        
+        self.page_num.extend(other.page_num)
+        self.x0.extend(other.x0)
+        self.y0.extend(other.y0)
+        self.x1.extend(other.x1)
+        self.y1.extend(other.y1)
+        self.font_size.extend(other.font_size)
+        self.font_id.extend(array('i', (font_map[i] if i >= 0 else -1 for i in other.font_id)))
+        self.type_id.extend(array('i', (type_map[i] for i in other.type_id)))
+        
+        base = self._offsets[-1]
+        self._offsets.extend(array('q', (base + offset for offset in other._offsets[1:])))
+        self._buffer.write(other.full_text)
+        self._text = None
+    
+    @property
+    def char_count(self) -> int:
+        """Суммарная длина текста всех блоков."""
+        return self._offsets[-1]
+    
+    @property
+    def full_text(self) -> str:
+        """Текст всех блоков одной строкой (без разделителей)."""
+        if self._text is None:
+            self._text = self._buffer.getvalue()
+        return self._text
+    
+    def text(self, idx: int) -> str:
+        """Текст блока с индексом idx."""
+        return self.full_text[self._offsets[idx]:self._offsets[idx + 1]]
+    
+    def rows(self) -> Iterator[Tuple]:
+        """Блоки в виде кортежей в порядке полей TextBlock (для сериализации)."""
+        for block in self:
+            yield astuple(block)
+    
+    def to_blocks(self) -> List[TextBlock]:
+        """Преобразование в список TextBlock."""
+        return list(self)
+    
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[Union[TextBlock, Tuple]]) -> "TextBlockTable":
+        """Построение таблицы из объектов TextBlock или кортежей их полей."""
+        table = cls()
+        for block in blocks:
+            if isinstance(block, TextBlock):
+                block = astuple(block)
+            table.append(*block)
+        return table
+    
+    def take(self, indices: Iterable[int]) -> "TextBlockTable":
+        """Новая таблица из блоков с указанными индексами."""
+        table = TextBlockTable()
+        table.fonts = list(self.fonts)
+        table._font_ids = dict(self._font_ids)
+        table.block_types = list(self.block_types)
+        table._type_ids = dict(self._type_ids)
+        
+        indices = list(indices)
+        for column in ("page_num", "x0", "y0", "x1", "y1", "font_size", "font_id", "type_id"):
+            source = getattr(self, column)
+            setattr(table, column, array(source.typecode, [source[i] for i in indices]))
+        
+        full_text = self.full_text
+        offsets = self._offsets
+        for i in indices:
+            text = full_text[offsets[i]:offsets[i + 1]]
+            table._buffer.write(text)
+            table._offsets.append(table._offsets[-1] + len(text))
+        table._text = None
+        return table
+    
+    def filter(self, pages: Optional[Union[int, Tuple[int, int]]] = None,
+               bbox: Optional[Tuple[float, float, float, float]] = None,
+               min_font_size: Optional[float] = None,
+               max_font_size: Optional[float] = None) -> "TextBlockTable":
+        """
+        Отбор блоков по странице, области и размеру шрифта.
+        
+        Условия проверяются по колонкам целиком, без создания объектов TextBlock.
+        
+        Args:
+            pages: Номер страницы или диапазон (первая, последняя) включительно
+            bbox: Область (x0, y0, x1, y1); отбираются блоки, пересекающие ее
+            min_font_size: Минимальный размер шрифта
+            max_font_size: Максимальный размер шрифта
+            
+        Returns:
+            TextBlockTable: Новая таблица с отобранными блоками
+        """
+        mask = [True] * len(self)
+        
+        if pages is not None:
+            first, last = (pages, pages) if isinstance(pages, int) else pages
+            mask = [m and first <= p <= last for m, p in zip(mask, self.page_num)]
+        if bbox is not None:
+            bx0, by0, bx1, by1 = bbox
+            mask = [
+                m and x0 <= bx1 and x1 >= bx0 and y0 <= by1 and y1 >= by0
+                for m, x0, y0, x1, y1 in zip(mask, self.x0, self.y0, self.x1, self.y1)
+            ]
+        if min_font_size is not None:
+            # Сравнение с NaN всегда ложно, поэтому блоки без размера шрифта отбрасываются
+            mask = [m and size >= min_font_size for m, size in zip(mask, self.font_size)]
+        if max_font_size is not None:
+            mask = [m and size <= max_font_size for m, size in zip(mask, self.font_size)]
+        
+        return self.take(i for i, m in enumerate(mask) if m)
+
+
+class ExtractionCache:
+    """
+    Постоянный кэш результатов извлечения на основе SQLite.
+    
+    Ключ записи строится из хеша содержимого PDF, вида результата (text, blocks,
+    tables), бэкенда (pymupdf, pdfminer), номера страницы и опций парсера.
+    Чтобы не хешировать неизмененные файлы повторно, для каждого пути
+    запоминаются размер и время модификации. При превышении max_size
+    удаляются давно не использовавшиеся записи (LRU). Время обращения при
+    попадании запоминается в памяти и записывается в базу пачками, поэтому
+    чтение из кэша не требует синхронной записи на диск.
+    
+    Результаты отдельных страниц хранятся по отпечаткам страниц (get_pages,
+    put_pages) и используются повторно в новых версиях документа. Для каждого
+    пути запоминается набор отпечатков последней обработанной версии.
+    """
+    
+    DB_NAME = "extraction_cache.sqlite3"
+    
+    def __init__(self, cache_dir: str, max_size: int = 1024 * 1024 * 1024):
+        """
+        Инициализация кэша.
+        
+        Args:
+            cache_dir: Директория для файла базы данных кэша
+            max_size: Максимальный суммарный размер записей в байтах
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, self.DB_NAME)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}  # ключ -> время обращения, еще не записанное в базу
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+            CREATE TABLE IF NOT EXISTS page_fingerprints (
+                path TEXT PRIMARY KEY,
+                fingerprints TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+    
+    def file_digest(self, pdf_path: Union[str, bytes, memoryview]) -> str:
+        """
+        Хеш содержимого файла. Если размер и время модификации не изменились
+        с прошлого раза, используется сохраненное значение без чтения файла.
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое (bytes, memoryview)
+            
+        Returns:
+            str: Шестнадцатеричный хеш содержимого
+        """
+        if not isinstance(pdf_path, str):
+            # Содержимое в памяти хешируется каждый раз: для буфера нет признаков изменения
+            return hashlib.blake2b(pdf_path, digest_size=20).hexdigest()
+        
+        path = os.path.abspath(pdf_path)
+        stat = os.stat(path)
+        
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, digest FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        
+        digest = _file_digest(path)
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, digest)
+            )
+            self._conn.commit()
+        return digest
+    
+    def make_key(self, pdf_path: str, kind: str, backend: str,
+                 page: Optional[int] = None, options: Optional[Dict] = None) -> str:
+        """Построение ключа записи кэша."""
+        options_key = json.dumps(options or {}, sort_keys=True, ensure_ascii=False)
+        page_key = "all" if page is None else str(page)
+        return f"{self.file_digest(pdf_path)}:{kind}:{backend}:{page_key}:{options_key}"
+    
+    @staticmethod
+    def make_page_key(fingerprint: str, kind: str, backend: str, options: Optional[Dict] = None) -> str:
+        """Построение ключа записи для страницы с указанным отпечатком."""
+        options_key = json.dumps(options or {}, sort_keys=True, ensure_ascii=False)
+        return f"page:{fingerprint}:{kind}:{backend}:{options_key}"
+    
+    def get(self, pdf_path: str, kind: str, backend: str,
+            page: Optional[int] = None, options: Optional[Dict] = None) -> Any:
+        """
+        Получение результата из кэша.
+        
+        Returns:
+            Any: Сохраненное значение или None, если записи нет
+        """
+        return self._load([self.make_key(pdf_path, kind, backend, page, options)])[0]
+    
+    def put(self, pdf_path: str, kind: str, backend: str, value: Any,
+            page: Optional[int] = None, options: Optional[Dict] = None) -> None:
+        """
+        Сохранение результата в кэш. Значение должно сериализоваться в JSON.
+        """
+        self._store([(self.make_key(pdf_path, kind, backend, page, options), value)])
+    
+    def get_pages(self, fingerprints: List[str], kind: str, backend: str,
+                  options: Optional[Dict] = None) -> List[Any]:
+        """
+        Получение результатов страниц по их отпечаткам (см. PDFParser.page_fingerprints).
+        
+        Returns:
+            List[Any]: Значения в порядке отпечатков; None для отсутствующих страниц
+        """
+        return self._load([self.make_page_key(fingerprint, kind, backend, options)
+                           for fingerprint in fingerprints])
+    
+    def put_pages(self, fingerprints: List[str], kind: str, backend: str, values: List[Any],
+                  options: Optional[Dict] = None) -> None:
+        """Сохранение результатов страниц по их отпечаткам одной транзакцией."""
+        self._store([(self.make_page_key(fingerprint, kind, backend, options), value)
+                     for fingerprint, value in zip(fingerprints, values)])
+    
+    def get_page_fingerprints(self, pdf_path: str) -> Optional[List[str]]:
+        """
+        Отпечатки страниц версии файла, обработанной последней.
+        
+        Returns:
+            Optional[List[str]]: Отпечатки или None, если файл не обрабатывался
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprints FROM page_fingerprints WHERE path = ?", (os.path.abspath(pdf_path),)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def put_page_fingerprints(self, pdf_path: str, fingerprints: List[str]) -> None:
+        """Сохранение отпечатков страниц обработанной версии файла."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_fingerprints (path, fingerprints) VALUES (?, ?)",
+                (os.path.abspath(pdf_path), json.dumps(fingerprints))
+            )
+            self._conn.commit()
+    
+    def _load(self, keys: List[str]) -> List[Any]:
+        """Чтение значений по ключам с учетом попаданий и промахов."""
+        values = []
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT value FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                values.append(row)
+                if row is not None:
+                    self.hits += 1
+                    self._accessed[key] = now
+                else:
+                    self.misses += 1
+            if len(self._accessed) >= CACHE_ACCESS_BATCH:
+                self._flush_accessed()
+                self._conn.commit()
+        
+        return [None if row is None else json.loads(zlib.decompress(row[0]).decode('utf-8'))
+                for row in values]
+    
+    def _store(self, items: List[Tuple[str, Any]]) -> None:
+        """Запись пар (ключ, значение) одной транзакцией."""
+        now = time.time()
+        rows = []
+        for key, value in items:
+            data = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+            rows.append((key, data, len(data), now))
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            # Вытеснение учитывает все обращения, в том числе еще не записанные
+            self._flush_accessed()
+            self._evict()
+            self._conn.commit()
+    
+    def _flush_accessed(self) -> None:
+        """Запись накопленного времени обращения к записям (под блокировкой, без фиксации)."""
+        if self._accessed:
+            self._conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+    
+    def _evict(self) -> None:
+        """Удаление давно не использовавшихся записей сверх max_size (под блокировкой)."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+        
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if total <= self.max_size:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+        logger.info(f"Из кэша удалено {len(stale)} записей")
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Статистика использования кэша.
+        
+        Returns:
+            Dict[str, int]: Попадания, промахи, количество записей и их размер в байтах
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "size": size}
+    
+    def clear(self) -> None:
+        """Удаление всех записей кэша."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM page_fingerprints")
+            self._accessed.clear()
+            self._conn.commit()
+    
+    def close(self) -> None:
+        """Запись накопленного времени обращения и закрытие соединения с базой данных."""
+        with self._lock:
+            if self._accessed:
+                self._flush_accessed()
+                self._conn.commit()
+            self._conn.close()
+
+
+def _file_digest(path: str) -> str:
+    """Хеш содержимого файла, читаемого блоками по 1 МБ."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _PageFingerprinter:
+    """
+    Отпечатки страниц документа без извлечения текста и отрисовки.
+    
+    Отпечаток страницы — хеш объекта страницы, ее содержимого, ресурсов
+    (шрифты, изображения, формы) и аннотаций со всеми вложенными объектами.
+    Ссылки заменяются хешами объектов, на которые они указывают, поэтому
+    перенумерация объектов при полной перезаписи файла не меняет отпечатки,
+    а общие ресурсы хешируются один раз на документ. Потоки хешируются
+    в декодированном виде, чтобы не зависеть от сжатия, кроме сжатых
+    форматами изображений (JPEG, JPEG 2000, JBIG2, CCITT).
+    """
+    
+    def __init__(self, doc: fitz.Document):
+        self.doc = doc
+        self._digests: Dict[int, str] = {}
+        self._page_xrefs = {doc.page_xref(idx) for idx in range(len(doc))}
+    
+    def _resolve(self, source: str) -> str:
+        """Замена ссылок в описании объекта хешами объектов."""
+        return _PDF_REF_RE.sub(self._ref_digest, _PDF_BACKREF_RE.sub("", source))
+    
+    def _ref_digest(self, match: re.Match) -> str:
+        xref = int(match.group(1))
+        # Назначения ссылок на другие страницы не зависят от содержимого этих страниц
+        return "page" if xref in self._page_xrefs else self._digest(xref)
+    
+    def _digest(self, xref: int) -> str:
+        digest = self._digests.get(xref)
+        if digest is not None:
+            return digest
+        # Циклические ссылки заменяются заглушкой
+        self._digests[xref] = "cycle"
+        source = self.doc.xref_object(xref, compressed=True)
+        data = None
+        if self.doc.xref_is_stream(xref):
+            if _PDF_IMAGE_FILTER_RE.search(source):
+                data = self.doc.xref_stream_raw(xref)
+            else:
+                source = _PDF_STREAM_KEYS_RE.sub("", source)
+                data = self.doc.xref_stream(xref)
+        hasher = hashlib.blake2b(self._resolve(source).encode('utf-8'), digest_size=16)
+        hasher.update(data or b"")
+        digest = self._digests[xref] = hasher.hexdigest()
+        return digest
+    
+    def _inherited(self, xref: int, key: str) -> str:
+        """Значение наследуемого атрибута страницы из ближайшего узла дерева страниц."""
+        seen = set()
+        while xref not in seen:
+            seen.add(xref)
+            kind, value = self.doc.xref_get_key(xref, key)
+            if kind != "null":
+                return value
+            kind, parent = self.doc.xref_get_key(xref, "Parent")
+            if kind != "xref":
+                break
+            xref = int(parent.split()[0])
+        return "null"
+    
+    def fingerprint(self, page_idx: int) -> str:
+        """Отпечаток страницы с индексом page_idx."""
+        page = self.doc.load_page(page_idx)
+        xref = page.xref
+        # Потоки содержимого читаются одним вызовом: их количество и разбиение на
+        # потоки при перезаписи файла могут измениться, а результат — нет
+        source = _PDF_CONTENTS_RE.sub("", self.doc.xref_object(xref, compressed=True))
+        hasher = hashlib.blake2b(self._resolve(source).encode('utf-8'), digest_size=16)
+        hasher.update(page.read_contents())
+        for key in _PAGE_INHERITED_KEYS:
+            if f"/{key}" not in source:
+                hasher.update(f"/{key} {self._resolve(self._inherited(xref, key))}".encode('utf-8'))
+        return hasher.hexdigest()
+
+
+def diff_page_fingerprints(old: List[str], new: List[str]) -> PageDiff:
     """
+    Постраничное сравнение двух версий документа по отпечаткам страниц.
+    
+    Совпадающие страницы сопоставляются с учетом вставок и удалений, поэтому
+    страница, сдвинутая вставленной страницей, считается неизмененной.
+    
+    Args:
+        old: Отпечатки страниц старой версии
+        new: Отпечатки страниц новой версии
+        
+    Returns:
+        PageDiff: Неизмененные, измененные, вставленные и удаленные страницы
+    """
+    diff = PageDiff(old_pages=len(old), new_pages=len(new))
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            diff.unchanged.extend(zip(range(i1 + 1, i2 + 1), range(j1 + 1, j2 + 1)))
+            continue
+        # В замененном участке страницы сопоставляются попарно, остаток — вставка или удаление
+        common = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        diff.changed.extend(range(j1 + 1, j1 + common + 1))
+        diff.added.extend(range(j1 + common + 1, j2 + 1))
+        diff.removed.extend(range(i1 + common + 1, i2 + 1))
+    return diff
+
+
+def _scan_directory(path: str) -> Tuple[List[FileEntry], List[str]]:
+    """
+    Чтение одной директории без рекурсии.
+    
+    Returns:
+        Tuple[List[FileEntry], List[str]]: PDF-файлы директории и ее поддиректории
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    # Символические ссылки на директории не обходятся, как и в os.walk
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith('.pdf') and entry.is_file():
+                        stat = entry.stat()
+                        files.append(FileEntry(entry.path, stat.st_size, stat.st_mtime_ns))
+                except OSError as e:
+                    logger.warning(f"Не удалось прочитать {entry.path}: {e}")
+    except OSError as e:
+        logger.warning(f"Не удалось прочитать директорию {path}: {e}")
+    return files, subdirs
+
+
+def scan_pdf_files(paths: Union[str, Iterable[str]], max_workers: Optional[int] = None) -> List[FileEntry]:
+    """
+    Поиск PDF-файлов в директориях.
+    
+    Каждая директория читается отдельной задачей через os.scandir, найденные
+    поддиректории сразу ставятся в очередь пула потоков, поэтому обход дерева
+    не ждет задержек файловой системы по одной директории. Размер и время
+    модификации берутся из результатов scandir.
+    
+    Args:
+        paths: Пути к директориям или PDF-файлам
+        max_workers: Количество потоков (None = автоматически)
+        
+    Returns:
+        List[FileEntry]: Найденные файлы, отсортированные по пути
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    
+    found = []
+    roots = []
+    for path in paths:
+        if os.path.isdir(path):
+            roots.append(path)
+        elif os.path.isfile(path) and path.lower().endswith('.pdf'):
+            stat = os.stat(path)
+            found.append(FileEntry(path, stat.st_size, stat.st_mtime_ns))
+        else:
+            logger.warning(f"{path} не является PDF-файлом или директорией")
+    
+    if roots:
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(_scan_directory, root) for root in roots}
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    found.extend(files)
+                    pending.update(executor.submit(_scan_directory, subdir) for subdir in subdirs)
+    
+    found.sort(key=lambda entry: entry.path)
+    return found
+
+
+class DirectoryManifest:
+    """
+    Постоянный манифест обработанных файлов на основе SQLite.
+    
+    Для каждого файла хранятся размер, время модификации, хеш содержимого,
+    статус обработки (pending, ok, error, quarantined), место записи
+    результата и ошибка.
+    При синхронизации с результатами сканирования хешируются только файлы
+    с измененными размером или временем модификации; файл, содержимое
+    которого не изменилось, не требует повторной обработки.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Инициализация манифеста.
+        
+        Args:
+            path: Путь к файлу базы данных манифеста
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output TEXT,
+                error TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_status ON files (status);
+        """)
+        self._conn.commit()
+    
+    def sync(self, entries: Iterable[FileEntry], prune: bool = True,
+             max_workers: Optional[int] = None) -> ManifestChanges:
+        """
+        Обновление манифеста по результатам сканирования.
+        
+        Новые и измененные файлы получают статус pending. Файл, у которого
+        изменилось только время модификации, а хеш остался прежним, считается
+        неизмененным.
+        
+        Args:
+            entries: Файлы, найденные сканированием (см. scan_pdf_files)
+            prune: Удалить из манифеста файлы, которых больше нет
+            max_workers: Количество потоков для хеширования (None = автоматически)
+            
+        Returns:
+            ManifestChanges: Добавленные, измененные, неизмененные и удаленные файлы
+        """
+        with self._lock:
+            known = {row[0]: row for row in self._conn.execute(
+                "SELECT path, size, mtime_ns, digest, status, output, error FROM files")}
+        
+        changes = ManifestChanges()
+        seen = set()
+        candidates = []
+        for entry in entries:
+            path = os.path.abspath(entry.path)
+            seen.add(path)
+            row = known.get(path)
+            if row is not None and row[1] == entry.size and row[2] == entry.mtime_ns:
+                changes.unchanged.append(path)
+            else:
+                candidates.append((path, entry, row))
+        
+        def digest(candidate):
+            try:
+                return _file_digest(candidate[0])
+            except OSError as e:
+                logger.warning(f"Не удалось прочитать {candidate[0]}: {e}")
+                return None
+        
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            digests = list(executor.map(digest, candidates))
+        
+        now = time.time()
+        with self._lock:
+            for (path, entry, row), file_digest in zip(candidates, digests):
+                if file_digest is None:
+                    continue
+                if row is not None and row[3] == file_digest:
+                    # Изменилось только время модификации: статус и результат сохраняются
+                    changes.unchanged.append(path)
+                    self._conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                                       (entry.size, entry.mtime_ns, path))
+                    continue
+                (changes.added if row is None else changes.modified).append(path)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime_ns, digest, status, output, error, updated) "
+                    "VALUES (?, ?, ?, ?, 'pending', ?, NULL, ?)",
+                    (path, entry.size, entry.mtime_ns, file_digest, None if row is None else row[5], now)
+                )
+            
+            if prune:
+                changes.deleted = [ManifestRecord(*row) for path, row in known.items() if path not in seen]
+                self._conn.executemany("DELETE FROM files WHERE path = ?",
+                                       [(record.path,) for record in changes.deleted])
+            self._conn.commit()
+        
+        return changes
+    
+    def pending(self) -> List[str]:
+        """
+        Файлы, ожидающие обработки.
+        
+        Returns:
+            List[str]: Абсолютные пути файлов со статусом pending
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT path FROM files WHERE status = 'pending' ORDER BY path")]
+    
+    def quarantined(self) -> List[ManifestRecord]:
+        """
+        Файлы в карантине: обработка останавливала процесс (зависание,
+        превышение памяти, аварийное завершение). Файл снова обрабатывается,
+        только если его содержимое изменится.
+        
+        Returns:
+            List[ManifestRecord]: Записи файлов со статусом quarantined
+        """
+        with self._lock:
+            return [ManifestRecord(*row) for row in self._conn.execute(
+                "SELECT path, size, mtime_ns, digest, status, output, error FROM files "
+                "WHERE status = 'quarantined' ORDER BY path")]
+    
+    def get(self, path: str) -> Optional[ManifestRecord]:
+        """Запись манифеста о файле или None, если файла нет в манифесте."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, mtime_ns, digest, status, output, error FROM files WHERE path = ?",
+                (os.path.abspath(path),)
+            ).fetchone()
+        return ManifestRecord(*row) if row is not None else None
+    
+    def record(self, result: BatchResult, output: Optional[str] = None) -> None:
+        """
+        Сохранение результата обработки файла.
+        
+        Изменения фиксируются пакетами по MANIFEST_COMMIT_EVERY записей
+        и при вызове flush() или close().
+        
+        Args:
+            result: Результат обработки
+            output: Место записи результата (файл, директория и т.п.)
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET status = ?, output = ?, error = ?, updated = ? WHERE path = ?",
+                ("ok" if result.ok else "quarantined" if result.quarantined else "error",
+                 output, result.error, time.time(),
+                 os.path.abspath(result.path))
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= MANIFEST_COMMIT_EVERY:
+                self._conn.commit()
+                self._uncommitted = 0
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Количество файлов в манифесте по статусам.
+        
+        Returns:
+            Dict[str, int]: Статус -> количество файлов
+        """
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status"))
+    
+    def flush(self) -> None:
+        """Фиксация несохраненных записей."""
+        with self._lock:
+            self._conn.commit()
+            self._uncommitted = 0
+    
+    def close(self) -> None:
+        """Фиксация изменений и закрытие соединения с базой данных."""
+        self.flush()
+        self._conn.close()
+
+
+def _tokenize(text: str) -> List[str]:
+    """Разбиение текста на слова в нижнем регистре."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _encode_positions(positions: List[int]) -> bytes:
+    """Кодирование возрастающих позиций разностями в формате varint."""
+    data = bytearray()
+    previous = 0
+    for position in positions:
+        delta = position - previous
+        previous = position
+        while delta >= 0x80:
+            data.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+
+def _decode_positions(data: bytes) -> List[int]:
+    """Декодирование позиций, закодированных _encode_positions."""
+    positions = []
+    previous = value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            positions.append(previous)
+            value = shift = 0
+    return positions
+
+
+class SearchIndex:
+    """
+    Полнотекстовый инвертированный индекс извлеченного текста на основе SQLite.
+    
+    Для каждой пары (слово, страница) хранится одна запись с позициями слова
+    на странице, закодированными разностями в формате varint; слова и страницы
+    заменены целочисленными идентификаторами, а таблица записей упорядочена по
+    (слово, страница), поэтому запрос читает только нужные диапазоны B-дерева.
+    При индексировании блоков текста для страницы дополнительно сохраняются
+    прямоугольники блоков, по которым для вхождений определяется bbox.
+    Файл индекса отображается в память (PRAGMA mmap_size).
+    
+    Запрос — фраза из слов, идущих подряд; слово, оканчивающееся на "*",
+    ищется как префикс.
+    """
+    
+    def __init__(self, path: str, readonly: bool = False):
+        """
+        Открытие или создание индекса.
+        
+        Args:
+            path: Путь к файлу индекса
+            readonly: Открыть существующий индекс только для поиска
+            
+        Raises:
+            FileNotFoundError: Если readonly и файла индекса нет
+        """
+        if readonly:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Индекс не найден: {path}")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._term_ids: Dict[str, int] = {}
+        self._df_delta: Dict[int, int] = {}
+        self._postings: List[Tuple[int, int, bytes]] = []
+        self._uncommitted = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size = {SEARCH_MMAP_SIZE}")
+        if not readonly:
+            # Идентификаторы страниц не переиспользуются: записи слов удаленных
+            # страниц остаются в индексе до optimize() и не должны относиться к новым
+            legacy = self._conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'pages'").fetchone()
+            legacy = legacy is not None and "AUTOINCREMENT" not in legacy[0].upper()
+            if legacy:
+                self._conn.executescript("""
+                    DROP INDEX IF EXISTS pages_doc;
+                    ALTER TABLE pages RENAME TO pages_legacy;
+                """)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS pages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id INTEGER NOT NULL,
+                    page_num INTEGER NOT NULL,
+                    boxes BLOB
+                );
+                CREATE INDEX IF NOT EXISTS pages_doc ON pages (doc_id);
+                CREATE TABLE IF NOT EXISTS terms (
+                    id INTEGER PRIMARY KEY,
+                    token TEXT UNIQUE NOT NULL,
+                    df INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term_id INTEGER NOT NULL,
+                    page_id INTEGER NOT NULL,
+                    positions BLOB NOT NULL,
+                    PRIMARY KEY (term_id, page_id)
+                ) WITHOUT ROWID;
+            """)
+            if legacy:
+                # В индексе старого формата записи удаленных страниц могли
+                # совпасть с новыми страницами, поэтому они удаляются сразу
+                self._conn.executescript("""
+                    INSERT INTO pages (id, doc_id, page_num, boxes)
+                        SELECT id, doc_id, page_num, boxes FROM pages_legacy;
+                    DROP TABLE pages_legacy;
+                    DELETE FROM postings WHERE page_id NOT IN (SELECT id FROM pages);
+                    UPDATE terms SET df = (SELECT COUNT(*) FROM postings WHERE term_id = terms.id);
+                """)
+            self._conn.commit()
+    
+    def _term_id(self, token: str) -> int:
+        """Идентификатор слова; новое слово добавляется в словарь (под блокировкой)."""
+        term_id = self._term_ids.get(token)
+        if term_id is None:
+            row = self._conn.execute("SELECT id FROM terms WHERE token = ?", (token,)).fetchone()
+            if row is None:
+                term_id = self._conn.execute("INSERT INTO terms (token) VALUES (?)", (token,)).lastrowid
+            else:
+                term_id = row[0]
+            self._term_ids[token] = term_id
+        return term_id
+    
+    def add(self, path: str, pages: Iterable[Tuple[int, Union[str, List[TextBlock]]]]) -> int:
+        """
+        Индексирование документа. Ранее проиндексированный документ с тем же
+        путем заменяется.
+        
+        Args:
+            path: Путь к PDF-файлу
+            pages: Пары (номер страницы, текст) или (номер страницы, блоки текста),
+                например результат PDFParser.iter_pages
+                
+        Returns:
+            int: Количество проиндексированных страниц
+        """
+        path = os.path.abspath(path)
+        count = 0
+        with self._lock:
+            self._remove(path)
+            doc_id = self._conn.execute("INSERT INTO docs (path) VALUES (?)", (path,)).lastrowid
+            
+            for page_num, content in pages:
+                if isinstance(content, str):
+                    tokens = _tokenize(content)
+                    boxes = None
+                else:
+                    tokens = []
+                    box_values = array('f')
+                    for block in content:
+                        box_values.extend((len(tokens), block.x0, block.y0, block.x1, block.y1))
+                        tokens.extend(_tokenize(block.text))
+                    boxes = box_values.tobytes()
+                
+                page_id = self._conn.execute(
+                    "INSERT INTO pages (doc_id, page_num, boxes) VALUES (?, ?, ?)", (doc_id, page_num, boxes)
+                ).lastrowid
+                
+                occurrences: Dict[str, List[int]] = {}
+                for position, token in enumerate(tokens):
+                    occurrences.setdefault(token, []).append(position)
+                for token, positions in occurrences.items():
+                    term_id = self._term_id(token)
+                    self._df_delta[term_id] = self._df_delta.get(term_id, 0) + 1
+                    self._postings.append((term_id, page_id, _encode_positions(positions)))
+                
+                count += 1
+                self._uncommitted += 1
+                if self._uncommitted >= SEARCH_COMMIT_PAGES:
+                    self._commit()
+        return count
+    
+    def remove(self, path: str) -> None:
+        """Удаление документа из индекса."""
+        with self._lock:
+            self._remove(os.path.abspath(path))
+    
+    def _remove(self, path: str) -> None:
+        """
+        Удаление документа и его страниц (под блокировкой). Записи слов
+        удаленных страниц при поиске пропускаются и удаляются в optimize();
+        идентификаторы удаленных страниц новым страницам не выдаются.
+        """
+        row = self._conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM pages WHERE doc_id = ?", row)
+            self._conn.execute("DELETE FROM docs WHERE id = ?", row)
+    
+    def _commit(self) -> None:
+        """Запись накопленных записей и частот слов и фиксация транзакции (под блокировкой)."""
+        if self._postings:
+            # Вставка в порядке ключа заполняет B-дерево последовательно, а не вразброс
+            self._postings.sort()
+            self._conn.executemany(
+                "INSERT INTO postings (term_id, page_id, positions) VALUES (?, ?, ?)", self._postings)
+            self._postings.clear()
+        if self._df_delta:
+            self._conn.executemany("UPDATE terms SET df = df + ? WHERE id = ?",
+                                   [(delta, term_id) for term_id, delta in self._df_delta.items()])
+            self._df_delta.clear()
+        self._conn.commit()
+        self._uncommitted = 0
+    
+    def flush(self) -> None:
+        """Фиксация проиндексированных страниц."""
+        with self._lock:
+            self._commit()
+    
+    def optimize(self) -> None:
+        """Удаление записей удаленных страниц, пересчет частот слов и сжатие файла."""
+        with self._lock:
+            self._commit()
+            self._conn.execute("DELETE FROM postings WHERE page_id NOT IN (SELECT id FROM pages)")
+            self._conn.execute(
+                "UPDATE terms SET df = (SELECT COUNT(*) FROM postings WHERE term_id = terms.id)")
+            self._conn.execute("DELETE FROM terms WHERE df = 0")
+            self._conn.commit()
+            self._term_ids.clear()
+            self._conn.execute("VACUUM")
+    
+    def _resolve_term(self, token: str, prefix: bool) -> Tuple[List[int], int]:
+        """Идентификаторы слов запроса и их суммарная документная частота."""
+        if prefix:
+            rows = self._conn.execute(
+                "SELECT id, df FROM terms WHERE token >= ? AND token < ? LIMIT ?",
+                (token, token + "\U0010ffff", SEARCH_PREFIX_EXPANSIONS)
+            ).fetchall()
+        else:
+            rows = self._conn.execute("SELECT id, df FROM terms WHERE token = ?", (token,)).fetchall()
+        return [row[0] for row in rows], sum(row[1] for row in rows)
+    
+    def _positions(self, term_ids: List[int], page_id: int) -> set:
+        """Позиции слов с указанными идентификаторами на странице."""
+        positions = set()
+        for term_id in term_ids:
+            row = self._conn.execute(
+                "SELECT positions FROM postings WHERE term_id = ? AND page_id = ?", (term_id, page_id)
+            ).fetchone()
+            if row is not None:
+                positions.update(_decode_positions(row[0]))
+        return positions
+    
+    def search(self, query: str, limit: int = 100) -> List[SearchHit]:
+        """
+        Поиск фразы.
+        
+        Просматриваются только страницы, содержащие самое редкое слово фразы;
+        остальные слова проверяются точечными запросами к этим страницам.
+        
+        Args:
+            query: Слова фразы через пробел; "слово*" — поиск по префиксу
+            limit: Максимальное количество вхождений
+            
+        Returns:
+            List[SearchHit]: Вхождения, упорядоченные по файлу, странице и позиции
+        """
+        terms = []
+        for part in query.split():
+            tokens = _tokenize(part)
+            terms.extend((token, part.endswith("*") and i == len(tokens) - 1)
+                         for i, token in enumerate(tokens))
+        if not terms:
+            return []
+        
+        hits = []
+        pages: Dict[int, Optional[Tuple[str, int, Optional[bytes]]]] = {}
+        with self._lock:
+            if self._postings:
+                # Добавленные, но еще не записанные страницы должны находиться
+                self._commit()
+            resolved = [self._resolve_term(token, prefix) for token, prefix in terms]
+            if any(not term_ids for term_ids, _ in resolved):
+                return []
+            anchor = min(range(len(resolved)), key=lambda i: resolved[i][1])
+            
+            for term_id in resolved[anchor][0]:
+                cursor = self._conn.execute(
+                    "SELECT page_id, positions FROM postings WHERE term_id = ?", (term_id,))
+                for page_id, data in cursor:
+                    starts = {position - anchor for position in _decode_positions(data) if position >= anchor}
+                    for offset, (term_ids, _) in enumerate(resolved):
+                        if offset == anchor or not starts:
+                            continue
+                        positions = self._positions(term_ids, page_id)
+                        starts = {start for start in starts if start + offset in positions}
+                    if not starts:
+                        continue
+                    
+                    if page_id not in pages:
+                        pages[page_id] = self._conn.execute(
+                            "SELECT docs.path, pages.page_num, pages.boxes FROM pages "
+                            "JOIN docs ON docs.id = pages.doc_id WHERE pages.id = ?", (page_id,)
+                        ).fetchone()
+                    page = pages[page_id]
+                    if page is None:
+                        # Страница удаленного документа
+                        continue
+                    
+                    path, page_num, boxes = page
+                    boxes = array('f', boxes) if boxes else None
+                    for start in sorted(starts):
+                        bbox = None
+                        if boxes:
+                            block = bisect.bisect_right(boxes[::5], start) - 1
+                            bbox = tuple(boxes[block * 5 + 1:block * 5 + 5]) if block >= 0 else None
+                        hits.append(SearchHit(path, page_num, start, len(terms), bbox))
+                    if len(hits) >= limit:
+                        break
+                cursor.close()
+                if len(hits) >= limit:
+                    break
+        
+        hits.sort(key=lambda hit: (hit.path, hit.page_num, hit.position))
+        return hits[:limit]
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Размер индекса.
+        
+        Returns:
+            Dict[str, int]: Количество документов, страниц, слов и записей
+        """
+        with self._lock:
+            return {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("docs", "pages", "terms", "postings")}
+    
+    def close(self) -> None:
+        """Фиксация изменений и закрытие соединения с базой данных."""
+        if not self.readonly:
+            self.flush()
+        self._conn.close()
+
+
+class MinHasher:
+    """
+    Вычисление сигнатур MinHash по шинглам — последовательностям из
+    shingle_size слов текста.
+    
+    Используется MinHash с одной хеш-функцией (one permutation hashing):
+    хеш шингла определяет ячейку сигнатуры, в ячейке хранится минимальный
+    хеш. Поэтому сигнатура вычисляется за один проход по шинглам, а не
+    num_perm проходов. Сигнатура объединения текстов равна поэлементному
+    минимуму их сигнатур, поэтому сигнатура документа собирается из
+    сигнатур страниц без хранения всего текста. Перед сравнением пустые
+    ячейки заполняются значениями ближайших непустых (densify).
+    """
+    
+    EMPTY = (1 << 64) - 1  # значение пустой ячейки сигнатуры
+    
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle_size: int = DEDUP_SHINGLE_SIZE):
+        """
+        Args:
+            num_perm: Длина сигнатуры (количество ячеек)
+            shingle_size: Количество слов в шингле
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+    
+    def shingles(self, text: str) -> set:
+        """Множество 64-битных хешей шинглов текста (текст короче шингла — один шингл)."""
+        tokens = _tokenize(text)
+        if not tokens:
+            return set()
+        size = min(self.shingle_size, len(tokens))
+        return {
+            int.from_bytes(hashlib.blake2b(" ".join(tokens[i:i + size]).encode('utf-8'),
+                                           digest_size=8).digest(), 'little')
+            for i in range(len(tokens) - size + 1)
+        }
+    
+    def signature(self, text: str) -> Optional[array]:
+        """
+        Сигнатура MinHash текста (без заполнения пустых ячеек).
+        
+        Returns:
+            Optional[array]: Сигнатура (array('Q')) или None, если в тексте нет слов
+        """
+        hashes = self.shingles(text)
+        if not hashes:
+            return None
+        num_perm = self.num_perm
+        signature = array('Q', [self.EMPTY]) * num_perm
+        for h in hashes:
+            cell, value = h % num_perm, h // num_perm
+            if value < signature[cell]:
+                signature[cell] = value
+        return signature
+    
+    @staticmethod
+    def merge(signature: Optional[array], other: Optional[array]) -> Optional[array]:
+        """Сигнатура объединения двух текстов (поэлементный минимум)."""
+        if signature is None:
+            return other
+        if other is None:
+            return signature
+        return array('Q', map(min, signature, other))
+    
+    @classmethod
+    def densify(cls, signature: array) -> array:
+        """
+        Заполнение пустых ячеек значением ближайшей непустой ячейки справа
+        (по кругу) со сдвигом на расстояние до нее, чтобы заполненные ячейки
+        двух сигнатур совпадали, только если совпадает их источник.
+        """
+        size = len(signature)
+        if cls.EMPTY not in signature:
+            return signature
+        result = array('Q', signature)
+        for cell in range(size):
+            if signature[cell] != cls.EMPTY:
+                continue
+            for distance in range(1, size):
+                value = signature[(cell + distance) % size]
+                if value != cls.EMPTY:
+                    result[cell] = (value + distance * _MINHASH_PRIME) & cls.EMPTY
+                    break
+        return result
+    
+    @staticmethod
+    def similarity(signature: array, other: array) -> float:
+        """Оценка коэффициента Жаккара по доле совпадающих ячеек заполненных сигнатур."""
+        return sum(a == b for a, b in zip(signature, other)) / len(signature)
+
+
+def _lsh_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Выбор разбиения сигнатуры на полосы для LSH.
+    
+    Документы со сходством s становятся кандидатами с вероятностью
+    1 - (1 - s^rows)^bands; выбирается разбиение с минимальной суммой
+    площадей ложных срабатываний (s < threshold) и пропусков (s >= threshold).
+    
+    Returns:
+        Tuple[int, int]: Количество полос и количество элементов в полосе
+    """
+    steps = 100
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = 0.0
+        for i in range(steps):
+            similarity = (i + 0.5) / steps
+            probability = 1 - (1 - similarity ** rows) ** bands
+            error += probability if similarity < threshold else 1 - probability
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class DuplicateIndex:
+    """
+    Индекс почти одинаковых документов на основе MinHash и LSH в SQLite.
+    
+    Для каждого документа и каждой его страницы хранится сигнатура MinHash
+    (заполненная, см. MinHasher.densify), полосы сигнатур хешируются в корзины
+    LSH. Документ, у которого с одним из документов общей корзины сходство не
+    меньше threshold, попадает в группу этого документа; иначе он открывает
+    новую группу. Побайтно одинаковые файлы находятся по хешу содержимого без
+    извлечения текста.
+    """
+    
+    def __init__(self, path: str = ":memory:", threshold: float = DEDUP_THRESHOLD,
+                 num_perm: int = DEDUP_NUM_PERM, shingle_size: int = DEDUP_SHINGLE_SIZE):
+        """
+        Открытие или создание индекса.
+        
+        Args:
+            path: Путь к файлу индекса (":memory:" = индекс в памяти)
+            threshold: Минимальное сходство документов одной группы
+            num_perm: Длина сигнатуры MinHash
+            shingle_size: Количество слов в шингле
+            
+        Raises:
+            ValueError: Если существующий индекс создан с другими num_perm или shingle_size
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = _lsh_bands(threshold, num_perm)
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                digest TEXT,
+                cluster INTEGER NOT NULL,
+                duplicate_of TEXT,
+                similarity REAL NOT NULL DEFAULT 0,
+                signature BLOB
+            );
+            CREATE INDEX IF NOT EXISTS docs_digest ON docs (digest);
+            CREATE INDEX IF NOT EXISTS docs_cluster ON docs (cluster);
+            CREATE TABLE IF NOT EXISTS pages (
+                doc_id INTEGER NOT NULL,
+                page_num INTEGER NOT NULL,
+                signature BLOB NOT NULL,
+                PRIMARY KEY (doc_id, page_num)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                hash INTEGER NOT NULL,
+                doc_id INTEGER NOT NULL,
+                page_num INTEGER NOT NULL,  -- 0 для сигнатуры документа
+                PRIMARY KEY (band, hash, doc_id, page_num)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS buckets_doc ON buckets (doc_id);
+        """)
+        params = {"num_perm": num_perm, "shingle_size": shingle_size}
+        stored = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if stored and stored != params:
+            self._conn.close()
+            raise ValueError(f"Индекс {path} создан с параметрами {stored}, а не {params}")
+        self._conn.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", params.items())
+        self._conn.commit()
+    
+    def _band_hashes(self, signature: array) -> List[Tuple[int, int]]:
+        """Пары (номер полосы, хеш полосы) сигнатуры."""
+        rows = self.rows
+        return [(band, int.from_bytes(hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(),
+                                                      digest_size=8).digest(), 'little', signed=True))
+                for band in range(self.bands)]
+    
+    def _candidates(self, signature: array, page: bool) -> Dict[Tuple[int, int], array]:
+        """Сигнатуры документов (или страниц), попавших с сигнатурой в одну корзину."""
+        candidates = {}
+        for band, band_hash in self._band_hashes(signature):
+            rows = self._conn.execute(
+                "SELECT doc_id, page_num FROM buckets WHERE band = ? AND hash = ? AND page_num "
+                + ("> 0" if page else "= 0"), (band, band_hash)).fetchall()
+            for key in rows:
+                if key in candidates:
+                    continue
+                if page:
+                    row = self._conn.execute("SELECT signature FROM pages WHERE doc_id = ? AND page_num = ?",
+                                             key).fetchone()
+                else:
+                    row = self._conn.execute("SELECT signature FROM docs WHERE id = ?", key[:1]).fetchone()
+                candidates[key] = array('Q', row[0])
+        return candidates
+    
+    def lookup(self, path: str, digest: str) -> Optional[DuplicateMatch]:
+        """
+        Группа файла, известная без извлечения текста: сохраненная для того же
+        файла с тем же содержимым или группа побайтно совпадающего файла.
+        
+        Args:
+            path: Путь к PDF-файлу
+            digest: Хеш содержимого файла
+            
+        Returns:
+            Optional[DuplicateMatch]: Совпадение или None, если нужен текст файла
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            return self._stored(path, digest) or self._exact(path, digest)
+    
+    def _stored(self, path: str, digest: str) -> Optional[DuplicateMatch]:
+        """Сохраненная группа файла, если его содержимое не изменилось (под блокировкой)."""
+        row = self._conn.execute(
+            "SELECT cluster, duplicate_of, similarity, signature IS NULL FROM docs WHERE path = ? AND digest = ?",
+            (path, digest)).fetchone()
+        if row is None:
+            return None
+        return DuplicateMatch(path, row[0], row[1], row[2], bool(row[3]) and row[1] is not None)
+    
+    def _exact(self, path: str, digest: str) -> Optional[DuplicateMatch]:
+        """Группа другого файла с тем же содержимым (под блокировкой)."""
+        row = self._conn.execute(
+            "SELECT path, cluster FROM docs WHERE digest = ? AND path != ? ORDER BY id LIMIT 1",
+            (digest, path)).fetchone()
+        if row is None:
+            return None
+        return DuplicateMatch(path, row[1], row[0], 1.0, True)
+    
+    def add(self, path: str, pages: Iterable[Tuple[int, str]],
+            digest: Optional[str] = None) -> DuplicateMatch:
+        """
+        Добавление документа. Ранее добавленный документ с тем же путем заменяется.
+        
+        Сигнатуры вычисляются по страницам по мере чтения pages, поэтому
+        текст документа целиком в памяти не хранится. Если файл с тем же
+        хешем содержимого уже есть в индексе (см. lookup), текст не используется.
+        
+        Args:
+            path: Путь к PDF-файлу
+            pages: Пары (номер страницы, текст), например BatchResult.pages
+                или результат PDFParser.iter_pages
+            digest: Хеш содержимого файла (None = вычислить по файлу, если он существует)
+            
+        Returns:
+            DuplicateMatch: Группа документа и наиболее похожий ранее добавленный документ
+        """
+        path = os.path.abspath(path)
+        if digest is None and os.path.isfile(path):
+            digest = _file_digest(path)
+        
+        with self._lock:
+            if digest is not None:
+                stored = self._stored(path, digest)
+                if stored is not None:
+                    # Файл не изменился с прошлого добавления
+                    return stored
+            self._remove(path)
+            
+            exact = self._exact(path, digest) if digest is not None else None
+            if exact is not None:
+                # Сигнатуры не нужны: документ всегда находится через исходный файл
+                self._conn.execute(
+                    "INSERT INTO docs (path, digest, cluster, duplicate_of, similarity) VALUES (?, ?, ?, ?, 1)",
+                    (path, digest, exact.cluster, exact.duplicate_of))
+                self._committed()
+                return exact
+            
+            doc_id = self._conn.execute("INSERT INTO docs (path, digest, cluster) VALUES (?, ?, 0)",
+                                        (path, digest)).lastrowid
+            signature = None
+            buckets = []
+            for page_num, text in pages:
+                page_signature = self.hasher.signature(text)
+                if page_signature is None:
+                    continue
+                signature = MinHasher.merge(signature, page_signature)
+                page_signature = MinHasher.densify(page_signature)
+                self._conn.execute("INSERT INTO pages (doc_id, page_num, signature) VALUES (?, ?, ?)",
+                                   (doc_id, page_num, page_signature.tobytes()))
+                buckets.extend((band, band_hash, doc_id, page_num)
+                               for band, band_hash in self._band_hashes(page_signature))
+            
+            match = DuplicateMatch(path, doc_id)
+            if signature is not None:
+                signature = MinHasher.densify(signature)
+                # Документы без текста (например, сканы без распознавания) не группируются
+                for (candidate_id, _), candidate in self._candidates(signature, page=False).items():
+                    similarity = MinHasher.similarity(signature, candidate)
+                    if similarity >= self.threshold and similarity > match.similarity:
+                        row = self._conn.execute("SELECT path, cluster FROM docs WHERE id = ?",
+                                                 (candidate_id,)).fetchone()
+                        match = DuplicateMatch(path, row[1], row[0], similarity)
+                buckets.extend((band, band_hash, doc_id, 0) for band, band_hash in self._band_hashes(signature))
+            
+            self._conn.execute(
+                "UPDATE docs SET cluster = ?, duplicate_of = ?, similarity = ?, signature = ? WHERE id = ?",
+                (match.cluster, match.duplicate_of, match.similarity,
+                 signature.tobytes() if signature is not None else None, doc_id))
+            self._conn.executemany("INSERT OR IGNORE INTO buckets (band, hash, doc_id, page_num) VALUES (?, ?, ?, ?)",
+                                   buckets)
+            self._committed()
+        return match
+    
+    def _committed(self) -> None:
+        """Учет добавленного документа и периодическая фиксация транзакции (под блокировкой)."""
+        self._uncommitted += 1
+        if self._uncommitted >= DEDUP_COMMIT_EVERY:
+            self._conn.commit()
+            self._uncommitted = 0
+    
+    def remove(self, path: str) -> None:
+        """Удаление документа из индекса."""
+        with self._lock:
+            self._remove(os.path.abspath(path))
+    
+    def _remove(self, path: str) -> None:
+        """Удаление документа, его страниц и корзин (под блокировкой)."""
+        row = self._conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM buckets WHERE doc_id = ?", row)
+            self._conn.execute("DELETE FROM pages WHERE doc_id = ?", row)
+            self._conn.execute("DELETE FROM docs WHERE id = ?", row)
+    
+    def cluster(self, path: str) -> Optional[int]:
+        """Идентификатор группы документа или None, если документа нет в индексе."""
+        with self._lock:
+            row = self._conn.execute("SELECT cluster FROM docs WHERE path = ?",
+                                     (os.path.abspath(path),)).fetchone()
+        return row[0] if row is not None else None
+    
+    def clusters(self, min_size: int = 2) -> Dict[int, List[str]]:
+        """
+        Группы почти одинаковых документов.
+        
+        Args:
+            min_size: Минимальное количество документов в группе
+            
+        Returns:
+            Dict[int, List[str]]: {идентификатор группы: пути документов в порядке добавления}
+        """
+        groups: Dict[int, List[str]] = {}
+        with self._lock:
+            for cluster, path in self._conn.execute("SELECT cluster, path FROM docs ORDER BY id"):
+                groups.setdefault(cluster, []).append(path)
+        return {cluster: paths for cluster, paths in groups.items() if len(paths) >= min_size}
+    
+    def similar_pages(self, path: str, page_num: int,
+                      threshold: Optional[float] = None) -> List[Tuple[str, int, float]]:
+        """
+        Поиск страниц других документов, почти совпадающих со страницей документа.
+        
+        Args:
+            path: Путь к документу в индексе
+            page_num: Номер страницы (с единицы)
+            threshold: Минимальное сходство (None = порог индекса)
+            
+        Returns:
+            List[Tuple[str, int, float]]: (путь, номер страницы, сходство) по убыванию сходства
+        """
+        threshold = self.threshold if threshold is None else threshold
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT docs.id, pages.signature FROM pages JOIN docs ON docs.id = pages.doc_id "
+                "WHERE docs.path = ? AND pages.page_num = ?", (path, page_num)).fetchone()
+            if row is None:
+                return []
+            doc_id, signature = row[0], array('Q', row[1])
+            matches = []
+            for (candidate_id, candidate_page), candidate in self._candidates(signature, page=True).items():
+                if candidate_id == doc_id:
+                    continue
+                similarity = MinHasher.similarity(signature, candidate)
+                if similarity >= threshold:
+                    candidate_path = self._conn.execute("SELECT path FROM docs WHERE id = ?",
+                                                        (candidate_id,)).fetchone()[0]
+                    matches.append((candidate_path, candidate_page, similarity))
+        matches.sort(key=lambda match: (-match[2], match[0], match[1]))
+        return matches
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Размер индекса.
+        
+        Returns:
+            Dict[str, int]: Количество документов, страниц, групп и документов-дубликатов
+        """
+        with self._lock:
+            docs, clusters = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT cluster) FROM docs").fetchone()
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {"docs": docs, "pages": pages, "clusters": clusters, "duplicates": docs - clusters}
+    
+    def flush(self) -> None:
+        """Фиксация добавленных документов."""
+        with self._lock:
+            self._conn.commit()
+            self._uncommitted = 0
+    
+    def close(self) -> None:
+        """Фиксация изменений и закрытие соединения с базой данных."""
+        self.flush()
+        self._conn.close()
+
+
+class TextChunker:
+    """
+    Разбиение потока страниц на перекрывающиеся фрагменты ограниченного размера.
+    
+    Единица разбиения — блок текста (абзац): фрагмент собирается из целых
+    блоков, и только блок больше chunk_size делится на строки, а строка
+    больше chunk_size — по границам слов. Размер
+    измеряется функцией length — по умолчанию в символах, для бюджета в
+    токенах передается функция подсчета токенов. Конец каждого фрагмента
+    (целые блоки общим размером не больше overlap) повторяется в начале
+    следующего. В памяти хранятся только блоки текущего фрагмента.
+    """
+    
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                 length: Optional[Callable[[str], int]] = None):
+        """
+        Args:
+            chunk_size: Максимальный размер фрагмента
+            overlap: Максимальный размер перекрытия соседних фрагментов
+            length: Функция размера текста, например
+                lambda text: len(tokenizer.encode(text)) (None = количество символов)
+                
+        Raises:
+            ValueError: Если chunk_size не положителен или overlap не меньше chunk_size
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"Размер фрагмента должен быть положительным: {chunk_size}")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError(f"Перекрытие должно быть в диапазоне [0, {chunk_size}): {overlap}")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.length = length or len
+        self._separator_size = self.length("\n")
+    
+    def _split(self, text: str, size: int) -> Iterator[Tuple[str, int]]:
+        """Деление блока больше chunk_size на строки, а длинных строк — по границам слов."""
+        if size <= self.chunk_size:
+            yield text, size
+            return
+        for line in text.split("\n"):
+            line = line.strip()
+            if line:
+                yield from self._split_words(line, self.length(line))
+    
+    def _split_words(self, text: str, size: int) -> Iterator[Tuple[str, int]]:
+        """Деление строки больше chunk_size на части по границам слов."""
+        if size <= self.chunk_size:
+            yield text, size
+            return
+        words = text.split()
+        part: List[str] = []
+        part_size = 0
+        for word in words:
+            word_size = self.length(word)
+            while word_size > self.chunk_size:
+                # Слово длиннее фрагмента (например, base64) делится по символам
+                cut = max(1, len(word) * self.chunk_size // word_size)
+                if part:
+                    yield " ".join(part), part_size
+                    part, part_size = [], 0
+                yield word[:cut], self.length(word[:cut])
+                word = word[cut:]
+                word_size = self.length(word)
+            if part and part_size + 1 + word_size > self.chunk_size:
+                yield " ".join(part), part_size
+                part, part_size = [], 0
+            part_size += word_size + (1 if part else 0)
+            part.append(word)
+        if part:
+            yield " ".join(part), part_size
+    
+    def chunks(self, pages: Iterable[Tuple[int, List[TextBlock]]],
+               path: Optional[str] = None) -> Iterator[TextChunk]:
+        """
+        Разбиение страниц на фрагменты.
+        
+        Args:
+            pages: Пары (номер страницы, блоки текста), например
+                результат PDFParser.iter_pages(path, with_metadata=True)
+            path: Путь к документу (записывается во фрагменты)
+            
+        Yields:
+            TextChunk: Фрагменты в порядке следования текста
+        """
+        current: deque = deque()  # (текст, размер, якорь)
+        current_size = 0
+        index = 0
+        separator = self._separator_size
+        
+        def make_chunk() -> TextChunk:
+            anchors = []
+            for _, _, anchor in current:
+                if not anchors or anchors[-1] != anchor:
+                    anchors.append(anchor)
+            return TextChunk("\n".join(text for text, _, _ in current), current[0][2][0],
+                             current[-1][2][0], anchors, index, path)
+        
+        for page_num, blocks in pages:
+            for block in blocks:
+                text = block.text.strip()
+                if not text:
+                    continue
+                anchor = (page_num, block.x0, block.y0, block.x1, block.y1)
+                for part, size in self._split(text, self.length(text)):
+                    if current and current_size + separator + size > self.chunk_size:
+                        yield make_chunk()
+                        index += 1
+                        # Перекрытие: последние целые блоки, помещающиеся в overlap
+                        keep = 0
+                        kept_size = -separator
+                        for _, kept, _ in reversed(current):
+                            if kept_size + separator + kept > self.overlap:
+                                break
+                            kept_size += separator + kept
+                            keep += 1
+                        while len(current) > keep:
+                            current.popleft()
+                        current_size = kept_size if keep else 0
+                        while current and current_size + separator + size > self.chunk_size:
+                            current_size -= current.popleft()[1] + separator
+                        if not current:
+                            current_size = 0
+                    current_size += size + (separator if current else 0)
+                    current.append((part, size, anchor))
+        
+        if current:
+            yield make_chunk()
+
+
+class _StageTimer:
+    """Контекстный менеджер замера одного этапа обработки."""
+    __slots__ = ("_hook", "_stage", "_start")
+    
+    def __init__(self, hook: "MetricsHook", stage: str):
+        self._hook = hook
+        self._stage = stage
+    
+    def __enter__(self) -> "_StageTimer":
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._hook.observe(self._stage, time.perf_counter() - self._start)
+
+
+class _NullTimer:
+    """Контекстный менеджер, который ничего не замеряет."""
+    __slots__ = ()
+    
+    def __enter__(self) -> "_NullTimer":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsHook:
+    """
+    Приемник метрик парсера.
+    
+    Базовый класс ничего не записывает и почти не влияет на скорость.
+    Для передачи метрик во внешнюю систему (StatsD, OpenTelemetry и т.п.)
+    достаточно переопределить incr и observe и установить enabled = True.
+    
+    Этапы: open (открытие документа), extract (извлечение текста страницы;
+    при параллельной обработке — время всего пула), dict (get_text("dict")),
+    blocks (построение блоков), reassembly (сборка результата из частей),
+    layout (восстановление порядка чтения), index (индексирование),
+    dedup (поиск дубликатов), fingerprint (отпечатки страниц), output
+    (запись результата). Счетчики: pages, spans, chars, bytes_read,
+    cache_hits, cache_misses, fallbacks, files, errors, ocr_pages,
+    duplicates, pages_reused.
+    
+    В режиме "process" этапы dict и blocks выполняются в дочерних процессах
+    и не замеряются.
+    """
+    
+    enabled = False
+    
+    def incr(self, name: str, value: int = 1) -> None:
+        """Увеличение счетчика."""
+    
+    def observe(self, stage: str, seconds: float) -> None:
+        """Запись длительности одного выполнения этапа."""
+    
+    def timer(self, stage: str):
+        """Контекстный менеджер, замеряющий этап и передающий время в observe."""
+        return _StageTimer(self, stage) if self.enabled else _NULL_TIMER
+
+
+class ParserMetrics(MetricsHook):
+    """
+    Потокобезопасный сборщик метрик в памяти с экспортом в JSON и
+    текстовый формат Prometheus.
+    """
+    
+    enabled = True
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        # Этап -> [количество, суммарное время, максимальное время]
+        self.stages: Dict[str, List[float]] = {}
+    
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                self.stages[stage] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Текущие значения метрик.
+        
+        Returns:
+            Dict[str, Any]: {"counters": {...}, "stages": {этап: {"count", "total", "max"}}}
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {stage: {"count": int(count), "total": total, "max": peak}
+                           for stage, (count, total, peak) in self.stages.items()},
+            }
+    
+    def reset(self) -> None:
+        """Сброс всех метрик."""
+        with self._lock:
+            self.counters.clear()
+            self.stages.clear()
+    
+    def to_json(self) -> str:
+        """Экспорт метрик в JSON."""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+    
+    def to_prometheus(self, prefix: str = "pdf_parser") -> str:
+        """
+        Экспорт метрик в текстовый формат Prometheus.
+        
+        Счетчики экспортируются как <prefix>_<имя>_total, этапы — как
+        summary <prefix>_stage_seconds с меткой stage и gauge
+        <prefix>_stage_seconds_max.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        
+        if snapshot["stages"]:
+            metric = f"{prefix}_stage_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for stage, stats in sorted(snapshot["stages"].items()):
+                lines.append(f'{metric}_count{{stage="{stage}"}} {stats["count"]}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {stats["total"]:.6f}')
+            lines.append(f"# TYPE {metric}_max gauge")
+            for stage, stats in sorted(snapshot["stages"].items()):
+                lines.append(f'{metric}_max{{stage="{stage}"}} {stats["max"]:.6f}')
+        return "\n".join(lines) + "\n"
+
+# Приемник метрик по умолчанию: ничего не записывает
+_NULL_METRICS = MetricsHook()
+
+
+# Источник PDF: путь к файлу, содержимое в памяти (bytes, bytearray,
+# memoryview, mmap) или файловый объект, открытый в двоичном режиме
+PDFSource = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview, mmap.mmap, IO[bytes]]
+
+
+def _normalize_source(source: PDFSource) -> Union[str, bytes, memoryview]:
+    """
+    Приведение источника PDF к пути (str), bytes или memoryview.
+    
+    Содержимое bytearray, memoryview и mmap не копируется. Файловый объект
+    читается с текущей позиции до конца, после чего позиция восстанавливается,
+    так что один и тот же объект можно передавать в несколько методов подряд
+    (кроме потоков без поддержки seek, которые читаются однократно). Для
+    io.BytesIO с нулевой позиции буфер берется без копирования.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview, mmap.mmap)):
+        return memoryview(source).cast("B")
+    if isinstance(source, io.BytesIO):
+        position = source.tell()
+        return source.getvalue()[position:] if position else source.getvalue()
+    if hasattr(source, "read"):
+        seekable = getattr(source, "seekable", None)
+        if seekable is None or not seekable():
+            return source.read()
+        position = source.tell()
+        try:
+            return source.read()
+        finally:
+            source.seek(position)
+    raise TypeError(f"Неподдерживаемый источник PDF: {type(source).__name__}")
+
+
+def _source_name(source: Union[str, bytes, memoryview]) -> str:
+    """Имя источника для сообщений журнала."""
+    return source if isinstance(source, str) else f"<PDF в памяти, {len(source)} байт>"
+
+
+def _source_size(source: Union[str, bytes, memoryview]) -> int:
+    """Размер источника в байтах."""
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+def _open_document(source: Union[str, bytes, memoryview]) -> fitz.Document:
+    """Открытие документа PyMuPDF из файла или из памяти без копирования буфера."""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+class _BufferReader(io.RawIOBase):
+    """Файловый интерфейс для memoryview: читаются только запрошенные фрагменты."""
+    
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        size = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def close(self) -> None:
+        # Ссылка на буфер освобождается сразу: объекты PDFMiner образуют циклы
+        # и без этого удерживали бы буфер (и mmap) до сборки мусора
+        self._view = memoryview(b"")
+        super().close()
+
+
+@contextmanager
+def _pdfminer_input(source: Union[str, bytes, memoryview]) -> Iterator[Union[str, IO[bytes]]]:
+    """Аргумент для extract_pages PDFMiner: путь или файловый объект поверх буфера."""
+    if isinstance(source, str):
+        yield source
+        return
+    # BytesIO разделяет буфер с bytes до первой записи
+    reader = io.BytesIO(source) if isinstance(source, bytes) else _BufferReader(source)
+    try:
+        yield reader
+    finally:
+        reader.close()
+
+
+class _CachedDocument:
+    """Запись кэша открытых документов."""
+    __slots__ = ("doc", "source", "lock", "users", "evicted")
+    
+    def __init__(self, doc: fitz.Document, source: Any):
+        self.doc = doc
+        self.source = source  # ссылка на буфер, чтобы он не был освобожден
+        self.lock = threading.RLock()
+        self.users = 0
+        self.evicted = False
+
+
+class DocumentCache:
+    """
+    LRU-кэш открытых документов PyMuPDF.
+    
+    Повторные операции над одним источником (определение количества
+    страниц, извлечение текста, блоков, таблиц) используют один разобранный
+    документ вместо повторного открытия файла. Документ файла на диске
+    открывается заново, если изменились его размер или время модификации.
+    Один документ одновременно используется только одним потоком.
+    
+    Пока документ из памяти находится в кэше, на его буфер есть ссылка:
+    mmap нельзя закрыть, а bytearray — изменить в размере до вызова close().
+    Документы memoryview, охватывающих только часть буфера, не кэшируются.
+    """
+    
+    def __init__(self, max_size: int = 8):
+        """
+        Args:
+            max_size: Максимальное количество открытых документов (0 = без кэша)
+        """
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, _CachedDocument]" = OrderedDict()
+    
+    @staticmethod
+    def _key(source: Union[str, bytes, memoryview]) -> Optional[Tuple]:
+        """Ключ кэша; None, если документ источника не кэшируется."""
+        if isinstance(source, str):
+            stat = os.stat(source)
+            return ("path", os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+        # Для memoryview ключом служит исходный объект буфера
+        owner = source.obj if isinstance(source, memoryview) else source
+        with memoryview(owner) as whole:
+            if whole.nbytes != len(source):
+                # Срезы одного буфера с одинаковой длиной по владельцу не различить
+                return None
+        return ("memory", id(owner), len(source))
+    
+    @contextmanager
+    def open(self, source: Union[str, bytes, memoryview], opener=_open_document) -> Iterator[fitz.Document]:
+        """
+        Получение открытого документа на время блока with.
+        
+        Args:
+            source: Нормализованный источник PDF
+            opener: Функция открытия документа при промахе кэша
+            
+        Yields:
+            fitz.Document: Открытый документ (закрывать его не нужно)
+        """
+        key = self._key(source) if self.max_size > 0 else None
+        if key is None:
+            doc = opener(source)
+            try:
+                yield doc
+            finally:
+                doc.close()
+            return
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.users += 1
+                self._entries.move_to_end(key)
+        
+        if entry is None:
+            doc = opener(source)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = _CachedDocument(doc, source)
+                    self._entries[key] = entry
+                    self._evict()
+                else:
+                    # Документ успел открыть другой поток
+                    doc.close()
+                entry.users += 1
+        
+        try:
+            with entry.lock:
+                yield entry.doc
+        finally:
+            with self._lock:
+                entry.users -= 1
+                if entry.evicted and entry.users == 0:
+                    entry.doc.close()
+    
+    def _evict(self) -> None:
+        """Удаление давно не использовавшихся документов сверх max_size."""
+        while len(self._entries) > self.max_size:
+            _, entry = self._entries.popitem(last=False)
+            entry.evicted = True
+            if entry.users == 0:
+                entry.doc.close()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def close(self) -> None:
+        """Закрытие всех документов, которые сейчас не используются."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.evicted = True
+                if entry.users == 0:
+                    entry.doc.close()
+            self._entries.clear()
+
+
+class OCREngine:
+    """
+    Базовый класс движка распознавания текста для страниц без текстового слоя.
+    
+    Движок получает отрисованную страницу и возвращает строки текста с
+    прямоугольниками в пикселях изображения. Распознавание выполняется в пуле
+    процессов, поэтому объект движка должен сериализоваться pickle.
+    """
+    
+    name = "base"
+    
+    def options(self) -> Dict[str, Any]:
+        """Параметры движка, влияющие на результат (входят в ключ кэша)."""
+        return {}
+    
+    def recognize(self, pixmap: fitz.Pixmap) -> List[Tuple[str, float, float, float, float]]:
+        """
+        Распознавание изображения страницы.
+        
+        Args:
+            pixmap: Изображение страницы
+            
+        Returns:
+            List[Tuple[str, float, float, float, float]]: Строки (текст, x0, y0, x1, y1)
+                в пикселях изображения в порядке чтения
+        """
+        raise NotImplementedError
+
+
+class TesseractEngine(OCREngine):
+    """
+    Распознавание с помощью Tesseract, встроенного в PyMuPDF (Pixmap.pdfocr_tobytes).
+    
+    Требуются установленный Tesseract и языковые данные: путь к ним берется из
+    tessdata или переменной окружения TESSDATA_PREFIX.
+    """
+    
+    name = "tesseract"
+    
+    def __init__(self, language: str = "rus+eng", tessdata: Optional[str] = None):
+        """
+        Args:
+            language: Языки распознавания в формате Tesseract
+            tessdata: Директория языковых данных Tesseract
+        """
+        self.language = language
+        self.tessdata = tessdata
+    
+    def options(self) -> Dict[str, Any]:
+        return {"language": self.language}
+    
+    def recognize(self, pixmap: fitz.Pixmap) -> List[Tuple[str, float, float, float, float]]:
+        data = pixmap.pdfocr_tobytes(language=self.language, tessdata=self.tessdata)
+        lines = []
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page = doc[0]
+            # Страница результата имеет размер изображения с учетом его разрешения
+            scale_x = pixmap.width / page.rect.width
+            scale_y = pixmap.height / page.rect.height
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", ()):
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if text:
+                        x0, y0, x1, y1 = line["bbox"]
+                        lines.append((text, x0 * scale_x, y0 * scale_y, x1 * scale_x, y1 * scale_y))
+        return lines
+
+
+# Выбор страниц: None, номер страницы, range, slice, строка "1-3,10,20-" или их список
+PageSelection = Union[None, int, range, slice, str, Iterable[Union[int, range, slice, str]]]
+
+
+def _resolve_pages(pages: PageSelection, total_pages: int) -> List[int]:
+    """
+    Преобразование выбора страниц в отсортированный список индексов (с нуля).
+    
+    Номера страниц в int, range и строках отсчитываются с единицы, как и
+    TextBlock.page_num; границы строковых диапазонов включаются, а открытая
+    граница ("20-" или "-5") означает конец или начало документа. slice
+    применяется к списку страниц как к обычному списку Python: slice(0, 3) —
+    первые три страницы, slice(-2, None) — последние две.
+    
+    Args:
+        pages: Выбор страниц (None = все страницы)
+        total_pages: Количество страниц в документе
+        
+    Returns:
+        List[int]: Индексы выбранных страниц, существующих в документе
+    """
+    if pages is None:
+        return list(range(total_pages))
+    
+    if isinstance(pages, str):
+        items = pages.split(",")
+    elif isinstance(pages, (int, range, slice)):
+        items = [pages]
+    else:
+        items = pages
+    
+    selected = set()
+    for item in items:
+        if isinstance(item, str):
+            item = item.strip()
+            if not item:
+                continue
+            if "-" in item:
+                first, _, last = item.partition("-")
+                first = int(first) if first.strip() else 1
+                last = int(last) if last.strip() else total_pages
+                selected.update(range(first - 1, last))
+            else:
+                selected.add(int(item) - 1)
+        elif isinstance(item, slice):
+            selected.update(range(total_pages)[item])
+        elif isinstance(item, range):
+            selected.update(page - 1 for page in item)
+        else:
+            selected.add(int(item) - 1)
+    
+    return sorted(idx for idx in selected if 0 <= idx < total_pages)
+
+
+def _contiguous_runs(indices: List[int], max_len: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Группировка отсортированных индексов страниц в непрерывные диапазоны.
+    
+    Args:
+        indices: Отсортированные индексы страниц
+        max_len: Максимальная длина диапазона (None = без ограничения)
+        
+    Returns:
+        List[Tuple[int, int]]: Список диапазонов (start, stop), stop не включается
+    """
+    runs = []
+    for idx in indices:
+        if runs and runs[-1][1] == idx and (max_len is None or idx - runs[-1][0] < max_len):
+            runs[-1] = (runs[-1][0], idx + 1)
+        else:
+            runs.append((idx, idx + 1))
+    return runs
+
+
+class ResultSink:
+    """
+    Базовый класс приемника результатов пакетной обработки.
+    
+    Результаты записываются по одному по мере готовности файлов, поэтому
+    память не зависит от размера пакета. Приемник можно использовать как
+    контекстный менеджер.
+    """
+    
+    def __init__(self):
+        self.written = 0
+        self.failed = 0
+        self.quarantined: List[str] = []  # файлы, помещенные в карантин (см. BatchResult.quarantined)
+    
+    def write(self, result: BatchResult) -> None:
+        """Запись результата обработки одного файла."""
+        self._write(result)
+        self.written += 1
+        if not result.ok:
+            self.failed += 1
+        if result.quarantined:
+            self.quarantined.append(result.path)
+    
+    def _write(self, result: BatchResult) -> None:
+        raise NotImplementedError
+    
+    def output_location(self, result: BatchResult) -> Optional[str]:
+        """Место записи результата (путь к файлу) или None, если результат выводится в поток."""
+        return None
+    
+    def skip(self, result: BatchResult) -> None:
+        """Учет результата, пропущенного как дубликат (в приемник не записывается)."""
+    
+    def close(self) -> None:
+        """Завершение записи."""
+    
+    def __enter__(self) -> "ResultSink":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class TextStreamSink(ResultSink):
+    """Запись результатов в текстовый поток в формате "=== файл ===" (по умолчанию stdout)."""
+    
+    def __init__(self, stream: Optional[IO[str]] = None, preview_chars: Optional[int] = None,
+                 close_stream: bool = False):
+        """
+        Args:
+            stream: Поток для записи (None = sys.stdout)
+            preview_chars: Выводить не более указанного количества символов текста файла
+            close_stream: Закрыть поток при закрытии приемника
+        """
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stdout
+        self.preview_chars = preview_chars
+        self.close_stream = close_stream
+    
+    def _write(self, result: BatchResult) -> None:
+        if result.ok:
+            text = result.text
+            if self.preview_chars is not None and len(text) > self.preview_chars:
+                text = text[:self.preview_chars] + "..."
+        else:
+            text = f"ОШИБКА ({result.error_type}): {result.error}"
+        header = result.path
+        if result.duplicate_of is not None:
+            header += f" (дубликат {result.duplicate_of}, группа {result.cluster})"
+        if result.quarantined:
+            header += " (карантин)"
+        self.stream.write(f"=== {header} ===\n{text}\n\n")
+        self.stream.flush()
+    
+    def close(self) -> None:
+        if self.close_stream:
+            self.stream.close()
+
+
+class JSONLSink(ResultSink):
+    """
+    Запись результатов в файл JSON Lines: одна запись {"path", "text", "error", "error_type"}
+    на строку (при поиске дубликатов также "cluster" и "duplicate_of").
+    """
+    
+    def __init__(self, output: Union[str, IO[str]]):
+        """
+        Args:
+            output: Путь к файлу или открытый текстовый поток
+        """
+        super().__init__()
+        self._owns_stream = isinstance(output, str)
+        self.stream = open(output, 'w', encoding='utf-8') if self._owns_stream else output
+    
+    def output_location(self, result: BatchResult) -> Optional[str]:
+        return self.stream.name if self._owns_stream else None
+    
+    def _write(self, result: BatchResult) -> None:
+        self.stream.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        # Сброс после каждой записи, чтобы потребители могли читать файл по мере заполнения
+        self.stream.flush()
+    
+    def close(self) -> None:
+        if self._owns_stream:
+            self.stream.close()
+
+
+class TextDirSink(ResultSink):
+    """
+    Запись текста каждого файла в отдельный .txt в выходной директории.
+    
+    Ошибки записываются рядом в <имя>.error.json. Если указан root, структура
+    поддиректорий относительно root сохраняется, иначе используется только
+    имя файла.
+    """
+    
+    def __init__(self, output_dir: str, root: Optional[str] = None):
+        """
+        Args:
+            output_dir: Выходная директория
+            root: Общий корень входных файлов для сохранения структуры директорий
+        """
+        super().__init__()
+        self.output_dir = output_dir
+        self.root = root
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def output_path(self, pdf_path: str, suffix: str = ".txt") -> str:
+        """Путь к выходному файлу для PDF-файла."""
+        if self.root is not None:
+            name = os.path.relpath(pdf_path, self.root)
+        else:
+            name = os.path.basename(pdf_path)
+        return os.path.join(self.output_dir, os.path.splitext(name)[0] + suffix)
+    
+    def output_location(self, result: BatchResult) -> Optional[str]:
+        return self.output_path(result.path, ".txt" if result.ok else ".error.json")
+    
+    def _write(self, result: BatchResult) -> None:
+        if result.ok:
+            path = self.output_path(result.path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(result.text)
+        else:
+            path = self.output_path(result.path, ".error.json")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(result.to_dict(), f, ensure_ascii=False)
+
+
+class ParquetSink(ResultSink):
+    """
+    Запись результатов в файл Parquet (требуется pyarrow).
+    
+    Записи накапливаются до batch_size и сбрасываются отдельной группой строк,
+    так что в памяти одновременно находится не больше batch_size текстов.
+    """
+    
+    def __init__(self, path: str, batch_size: int = 1000):
+        """
+        Args:
+            path: Путь к файлу Parquet
+            batch_size: Количество записей в одной группе строк
+        """
+        super().__init__()
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Для записи в Parquet требуется пакет pyarrow: pip install pyarrow")
+        
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(name, pyarrow.string())
+                                       for name in ("path", "text", "error", "error_type")]
+                                      + [("cluster", pyarrow.int64()), ("duplicate_of", pyarrow.string()),
+                                         ("quarantined", pyarrow.bool_())])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        self.path = path
+        self.batch_size = batch_size
+        self._rows: List[Dict[str, Optional[str]]] = []
+    
+    def _write(self, result: BatchResult) -> None:
+        self._rows.append(result.to_dict())
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+    
+    def _flush(self) -> None:
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+    
+    def output_location(self, result: BatchResult) -> Optional[str]:
+        return self.path
+    
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+def write_scan_parquet(results: Iterable[ScanResult], path: str, batch_size: int = 10000) -> int:
+    """
+    Запись сводок быстрого сканирования в файл Parquet (требуется pyarrow).
+    
+    Сводки записываются группами строк по batch_size по мере поступления,
+    оглавление хранится списком структур (level, title, page).
+    
+    Args:
+        results: Сводки, например PDFParser.iter_scan(...)
+        path: Путь к файлу Parquet
+        batch_size: Количество сводок в одной группе строк
+        
+    Returns:
+        int: Количество записанных сводок
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Для записи в Parquet требуется пакет pyarrow: pip install pyarrow")
+    
+    toc_item = pyarrow.struct([("level", pyarrow.int32()), ("title", pyarrow.string()),
+                               ("page", pyarrow.int32())])
+    schema = pyarrow.schema([
+        ("path", pyarrow.string()), ("size", pyarrow.int64()), ("pages", pyarrow.int32()),
+        ("title", pyarrow.string()), ("author", pyarrow.string()), ("creation_date", pyarrow.string()),
+        ("encrypted", pyarrow.bool_()), ("toc", pyarrow.list_(toc_item)), ("has_text", pyarrow.bool_()),
+        ("error", pyarrow.string()), ("error_type", pyarrow.string()),
+    ])
+    
+    written = 0
+    rows = []
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for result in results:
+            row = asdict(result)
+            if result.toc is not None:
+                row["toc"] = [{"level": level, "title": title, "page": page} for level, title, page in result.toc]
+            rows.append(row)
+            if len(rows) >= batch_size:
+                writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+                written += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+            written += len(rows)
+    return written
+
+
+class ManifestSink(ResultSink):
+    """
+    Приемник, который передает результаты другому приемнику и отмечает
+    обработанные файлы в манифесте директории.
+    """
+    
+    def __init__(self, sink: ResultSink, manifest: DirectoryManifest):
+        """
+        Args:
+            sink: Приемник, в который записываются результаты
+            manifest: Манифест для записи статуса обработки
+        """
+        super().__init__()
+        self.sink = sink
+        self.manifest = manifest
+    
+    def _write(self, result: BatchResult) -> None:
+        self.sink.write(result)
+        self.manifest.record(result, self.sink.output_location(result))
+    
+    def skip(self, result: BatchResult) -> None:
+        # Дубликат считается обработанным и при следующем запуске не извлекается
+        self.sink.skip(result)
+        self.manifest.record(result, None)
+    
+    def output_location(self, result: BatchResult) -> Optional[str]:
+        return self.sink.output_location(result)
+    
+    def close(self) -> None:
+        self.sink.close()
+        self.manifest.flush()
+
+
+def _split_page_ranges(indices: List[int], parts: int) -> List[Tuple[int, int]]:
+    """
+    Разбиение выбранных страниц на непрерывные диапазоны примерно равного размера.
+    
+    Args:
+        indices: Отсортированные индексы страниц
+        parts: Желаемое количество частей (часть с пропусками страниц
+            дает несколько диапазонов)
+        
+    Returns:
+        List[Tuple[int, int]]: Список диапазонов (start, stop), stop не включается
+    """
+    parts = max(1, min(parts, len(indices)))
+    size, remainder = divmod(len(indices), parts)
+    ranges = []
+    pos = 0
+    for i in range(parts):
+        stop = pos + size + (1 if i < remainder else 0)
+        ranges.extend(_contiguous_runs(indices[pos:stop]))
+        pos = stop
+    return ranges
+
+
+def _rows_by_page(indices: List[int], rows: Iterable[Tuple]) -> List[List[Tuple]]:
+    """Разбиение строк блоков (кортежей полей TextBlock) по страницам в порядке indices."""
+    by_page = {page_idx + 1: [] for page_idx in indices}
+    for row in rows:
+        by_page[row[1]].append(row)
+    return [by_page[page_idx + 1] for page_idx in indices]
+
+
+def _limit_chars(pages: Iterable[str], max_chars: Optional[int]) -> List[str]:
+    """
+    Накопление текста страниц до max_chars символов; остальные страницы не запрашиваются.
+    
+    Args:
+        pages: Итератор текста страниц
+        max_chars: Ограничение на количество символов (None = без ограничения)
+        
+    Returns:
+        List[str]: Текст страниц, последняя страница обрезается по границе
+    """
+    result = []
+    total = 0
+    for text in pages:
+        if max_chars is not None and total + len(text) >= max_chars:
+            result.append(text[:max_chars - total])
+            break
+        result.append(text)
+        total += len(text)
+    return result
+
+
+def _page_to_blocks(page: fitz.Page, page_idx: int,
+                    metrics: Optional[MetricsHook] = None) -> List[TextBlock]:
+    """
+    Преобразование страницы PyMuPDF в список текстовых блоков (по одному на span).
+    
+    Args:
+        page: Страница документа
+        page_idx: Индекс страницы (с нуля)
+        metrics: Приемник метрик этапов dict и blocks
+        
+    Returns:
+        List[TextBlock]: Список блоков текста с метаданными
+    """
+    metrics = metrics or _NULL_METRICS
+    blocks = []
+    with metrics.timer("dict"):
+        blocks_dict = page.get_text("dict")
+    
+    with metrics.timer("blocks"):
+        for block in blocks_dict["blocks"]:
+            if "lines" in block:
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        blocks.append(TextBlock(
+                            text=span["text"],
+                            page_num=page_idx + 1,
+                            x0=span["bbox"][0],
+                            y0=span["bbox"][1],
+                            x1=span["bbox"][2],
+                            y1=span["bbox"][3],
+                            font=span["font"],
+                            font_size=span["size"],
+                            block_type="text"
+                        ))
+    if metrics.enabled:
+        metrics.incr("spans", len(blocks))
+    return blocks
+
+
+def _page_to_paragraphs(page: fitz.Page, page_idx: int) -> List[TextBlock]:
+    """
+    Текстовые блоки (абзацы) страницы PyMuPDF: строки блока разделены
+    переводом строки, шрифт и размер шрифта не заполняются.
+    """
+    return [
+        TextBlock(text=text.rstrip("\n"), page_num=page_idx + 1, x0=x0, y0=y0, x1=x1, y1=y1,
+                  block_type="paragraph")
+        for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks")
+        if block_type == 0 and text.strip()
+    ]
+
+
+def _page_to_table(page: fitz.Page, page_idx: int, table: TextBlockTable,
+                   metrics: Optional[MetricsHook] = None) -> None:
+    """
+    Добавление блоков страницы PyMuPDF в колоночную таблицу без создания
+    промежуточных объектов TextBlock.
+    
+    Args:
+        page: Страница документа
+        page_idx: Индекс страницы (с нуля)
+        table: Таблица, в которую добавляются блоки
+        metrics: Приемник метрик этапов dict и blocks
+    """
+    metrics = metrics or _NULL_METRICS
+    with metrics.timer("dict"):
+        blocks_dict = page.get_text("dict")
+    page_num = page_idx + 1
+    append = table.append
+    spans_before = len(table)
+    
+    with metrics.timer("blocks"):
+        for block in blocks_dict["blocks"]:
+            if "lines" in block:
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        x0, y0, x1, y1 = span["bbox"]
+                        append(span["text"], page_num, x0, y0, x1, y1, span["font"], span["size"])
+    if metrics.enabled:
+        metrics.incr("spans", len(table) - spans_before)
+
+
+def _body_font_size(table: TextBlockTable) -> float:
+    """Размер основного шрифта: размер, которым набрано больше всего символов."""
+    weights: Dict[float, int] = {}
+    offsets = table._offsets
+    for idx, size in enumerate(table.font_size):
+        if size == size:  # NaN, если размер неизвестен
+            key = round(size * 2) / 2
+            weights[key] = weights.get(key, 0) + offsets[idx + 1] - offsets[idx]
+    return max(weights, key=weights.get) if weights else math.nan
+
+
+def _margin_blocks(table: TextBlockTable, page_heights: Dict[int, float]) -> Dict[int, str]:
+    """
+    Поиск колонтитулов: блоков в верхней или нижней зоне страницы, которые
+    повторяются на нескольких страницах в том же месте. Номера страниц
+    совпадают после замены цифр.
+    
+    Returns:
+        Dict[int, str]: Индекс блока -> "header" или "footer"
+    """
+    pages_count = len(set(table.page_num))
+    min_pages = max(2, math.ceil(pages_count * LAYOUT_REPEAT_RATIO))
+    if pages_count < min_pages:
+        return {}
+    
+    candidates: Dict[Tuple[str, str, int], List[int]] = {}
+    for idx, (page_num, y0, y1) in enumerate(zip(table.page_num, table.y0, table.y1)):
+        height = page_heights.get(page_num)
+        if not height:
+            continue
+        if y1 <= height * LAYOUT_MARGIN_ZONE:
+            zone = "header"
+        elif y0 >= height * (1 - LAYOUT_MARGIN_ZONE):
+            zone = "footer"
+        else:
+            continue
+        text = _DIGITS_RE.sub("#", table.text(idx).strip().lower())
+        if text:
+            candidates.setdefault((zone, text, round(y0)), []).append(idx)
+    
+    margins = {}
+    for (zone, _, _), indices in candidates.items():
+        if len({table.page_num[idx] for idx in indices}) >= min_pages:
+            margins.update((idx, zone) for idx in indices)
+    return margins
+
+
+def _column_gutters(x0: List[float], x1: List[float], min_gap: float) -> List[float]:
+    """
+    Границы колонок страницы: промежутки по горизонтали между областями,
+    занятыми узкими блоками (уже половины ширины текста страницы). Области
+    меньше чем из LAYOUT_COLUMN_BLOCKS блоков (номер страницы, сноска)
+    колонками не считаются.
+    
+    Returns:
+        List[float]: Координаты x середин промежутков по возрастанию
+    """
+    left, right = min(x0), max(x1)
+    half_width = (right - left) / 2
+    intervals = sorted((a, b) for a, b in zip(x0, x1) if b - a < half_width)
+    
+    # Объединение пересекающихся по горизонтали блоков: [начало, конец, количество блоков]
+    regions: List[List[float]] = []
+    for a, b in intervals:
+        if regions and a - regions[-1][1] < min_gap:
+            regions[-1][1] = max(regions[-1][1], b)
+            regions[-1][2] += 1
+        else:
+            regions.append([a, b, 1])
+    regions = [region for region in regions if region[2] >= LAYOUT_COLUMN_BLOCKS]
+    return [(previous[1] + region[0]) / 2 for previous, region in zip(regions, regions[1:])]
+
+
+def _page_reading_order(table: TextBlockTable, indices: List[int], margins: Dict[int, str],
+                        body_size: float) -> Tuple[List[int], List[int]]:
+    """
+    Порядок чтения блоков одной страницы.
+    
+    Страница делится на полосы блоками, пересекающими границы колонок
+    (заголовки и иллюстрации во всю ширину); внутри полосы колонки читаются
+    слева направо, каждая сверху вниз по строкам. Верхний колонтитул ставится
+    в начало страницы, нижний — в конец.
+    
+    Returns:
+        Tuple[List[int], List[int]]: Индексы блоков в порядке чтения и номер
+            строки каждого из них
+    """
+    x0 = [table.x0[i] for i in indices]
+    x1 = [table.x1[i] for i in indices]
+    y0 = [table.y0[i] for i in indices]
+    y1 = [table.y1[i] for i in indices]
+    
+    gutters = _column_gutters(x0, x1, LAYOUT_COLUMN_GAP * body_size)
+    columns = [bisect.bisect_left(gutters, a) for a in x0]
+    spanning = [column != bisect.bisect_left(gutters, b) for column, b in zip(columns, x1)]
+    breaks = sorted(top for top, wide in zip(y0, spanning) if wide)
+    
+    # Полосы: четные — между блоками во всю ширину, нечетные — сами эти блоки
+    bands = []
+    for idx, top, wide in zip(indices, y0, spanning):
+        zone = margins.get(idx)
+        if zone == "header":
+            bands.append(-1)
+        elif zone == "footer":
+            bands.append(len(breaks) * 2 + 1)
+        elif wide:
+            bands.append(bisect.bisect_left(breaks, top) * 2 + 1)
+        else:
+            bands.append(bisect.bisect_right(breaks, top) * 2)
+    columns = [0 if wide or idx in margins else column for idx, column, wide in zip(indices, columns, spanning)]
+    centers = [(a + b) / 2 for a, b in zip(y0, y1)]
+    
+    # Блоки одной колонки с близкими по вертикали центрами образуют строку
+    by_position = sorted(range(len(indices)), key=lambda j: (bands[j], columns[j], centers[j]))
+    lines = [0] * len(indices)
+    line, line_key, line_center, line_height = -1, None, 0.0, 0.0
+    for j in by_position:
+        key = (bands[j], columns[j])
+        if key != line_key or centers[j] - line_center > line_height / 2:
+            line += 1
+            line_key, line_center, line_height = key, centers[j], y1[j] - y0[j]
+        lines[j] = line
+    
+    order = sorted(range(len(indices)), key=lambda j: (lines[j], x0[j]))
+    return [indices[j] for j in order], [lines[j] for j in order]
+
+
+def _classify_lines(table: TextBlockTable, order: List[int], lines: List[int],
+                    margins: Dict[int, str], body_size: float) -> List[str]:
+    """
+    Тип каждого блока по строкам: header и footer для колонтитулов, heading для
+    строк, набранных шрифтом крупнее основного, caption для подписей к рисункам
+    и таблицам, body для остального текста.
+    """
+    types = []
+    start = 0
+    while start < len(order):
+        stop = start
+        while stop < len(order) and lines[stop] == lines[start]:
+            stop += 1
+        line_indices = order[start:stop]
+        zone = margins.get(line_indices[0])
+        if zone is not None:
+            block_type = zone
+        else:
+            sizes = [table.font_size[idx] for idx in line_indices if table.font_size[idx] == table.font_size[idx]]
+            text = "".join(table.text(idx) for idx in line_indices).strip()
+            if sizes and max(sizes) >= body_size * LAYOUT_HEADING_RATIO:
+                block_type = "heading"
+            elif _CAPTION_RE.match(text):
+                block_type = "caption"
+            else:
+                block_type = "body"
+        types.extend([block_type] * (stop - start))
+        start = stop
+    return types
+
+
+def _apply_reading_order(table: TextBlockTable, page_heights: Dict[int, float]
+                         ) -> Tuple[TextBlockTable, List[int]]:
+    """
+    Упорядочение блоков в порядке чтения с заполнением block_type.
+    
+    Args:
+        table: Блоки текста (span'ы) документа
+        page_heights: Высота каждой страницы по ее номеру
+        
+    Returns:
+        Tuple[TextBlockTable, List[int]]: Упорядоченная таблица и номер строки
+            каждого блока (сквозной по документу)
+    """
+    body_size = _body_font_size(table)
+    if body_size != body_size:
+        body_size = 10.0
+    margins = _margin_blocks(table, page_heights)
+    
+    pages: Dict[int, List[int]] = {}
+    for idx, page_num in enumerate(table.page_num):
+        pages.setdefault(page_num, []).append(idx)
+    
+    order, lines, types = [], [], []
+    line_base = 0
+    for page_num in sorted(pages):
+        page_order, page_lines = _page_reading_order(table, pages[page_num], margins, body_size)
+        types.extend(_classify_lines(table, page_order, page_lines, margins, body_size))
+        order.extend(page_order)
+        lines.extend(line + line_base for line in page_lines)
+        line_base += (max(page_lines) + 1) if page_lines else 0
+    
+    ordered = table.take(order)
+    intern = TextBlockTable._intern
+    ordered.type_id = array('i', (intern(block_type, ordered._type_ids, ordered.block_types)
+                                  for block_type in types))
+    return ordered, lines
+
+
+def _ordered_page_texts(table: TextBlockTable, lines: List[int]) -> List[Tuple[int, str]]:
+    """
+    Текст страниц из упорядоченных блоков: блоки одной строки разделяются
+    пробелом, если между ними есть промежуток, строки — переводом строки.
+    
+    Returns:
+        List[Tuple[int, str]]: Номер страницы и ее текст
+    """
+    pages: List[Tuple[int, List[str]]] = []
+    previous_line, previous_x1 = None, 0.0
+    for idx, line in enumerate(lines):
+        page_num = table.page_num[idx]
+        if not pages or pages[-1][0] != page_num:
+            pages.append((page_num, []))
+            previous_line = None
+        parts = pages[-1][1]
+        if line != previous_line:
+            if previous_line is not None:
+                parts.append("\n")
+        elif table.x0[idx] - previous_x1 > 0.1 * (table.y1[idx] - table.y0[idx]):
+            parts.append(" ")
+        parts.append(table.text(idx))
+        previous_line, previous_x1 = line, table.x1[idx]
+    return [(page_num, "".join(parts) + "\n") for page_num, parts in pages]
+
+
+def _page_text_lines(page: fitz.Page) -> List[Dict[str, Any]]:
+    """
+    Группировка span'ов страницы в визуальные строки, а строк — в ячейки.
+    
+    Span'ы объединяются в одну строку при перекрытии по вертикали не менее
+    половины высоты; внутри строки span'ы, разделенные промежутком больше
+    TABLE_CELL_GAP размеров шрифта, считаются разными ячейками.
+    
+    Args:
+        page: Страница документа
+        
+    Returns:
+        List[Dict[str, Any]]: Строки сверху вниз: {"y0", "y1", "cells"},
+            где cells — список [x0, x1, текст] слева направо
+    """
+    spans = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                if span["text"].strip():
+                    x0, y0, x1, y1 = span["bbox"]
+                    spans.append((x0, y0, x1, y1, span["text"].strip(), span["size"]))
+    
+    spans.sort(key=lambda span: (span[1] + span[3]) / 2)
+    lines = []
+    for span in spans:
+        x0, y0, x1, y1 = span[:4]
+        if lines:
+            line = lines[-1]
+            overlap = min(y1, line["y1"]) - max(y0, line["y0"])
+            if overlap >= 0.5 * min(y1 - y0, line["y1"] - line["y0"]):
+                line["spans"].append(span)
+                line["y0"] = min(line["y0"], y0)
+                line["y1"] = max(line["y1"], y1)
+                continue
+        lines.append({"y0": y0, "y1": y1, "spans": [span]})
+    
+    for line in lines:
+        cells = []
+        for x0, _, x1, _, text, size in sorted(line.pop("spans")):
+            if cells and x0 - cells[-1][1] < TABLE_CELL_GAP * size:
+                cells[-1][1] = max(cells[-1][1], x1)
+                cells[-1][2] += " " + text
+            else:
+                cells.append([x0, x1, text])
+        line["cells"] = cells
+    return lines
+
+
+def _page_rulings(page: fitz.Page) -> Tuple[List[Tuple[float, float, float]], List[Tuple[float, float, float]]]:
+    """
+    Линии разметки страницы из векторной графики.
+    
+    Returns:
+        Tuple: Вертикальные линии (x, y0, y1) и горизонтальные линии (y, x0, x1)
+    """
+    vertical, horizontal = [], []
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                rect = fitz.Rect(min(p1.x, p2.x), min(p1.y, p2.y), max(p1.x, p2.x), max(p1.y, p2.y))
+            elif item[0] == "re":
+                rect = fitz.Rect(item[1])
+            else:
+                continue
+            
+            if rect.width <= TABLE_RULING_WIDTH and rect.height > TABLE_RULING_WIDTH:
+                vertical.append(((rect.x0 + rect.x1) / 2, rect.y0, rect.y1))
+            elif rect.height <= TABLE_RULING_WIDTH and rect.width > TABLE_RULING_WIDTH:
+                horizontal.append(((rect.y0 + rect.y1) / 2, rect.x0, rect.x1))
+            elif item[0] == "re":
+                # Прямоугольник ячейки дает четыре линии разметки
+                vertical += [(rect.x0, rect.y0, rect.y1), (rect.x1, rect.y0, rect.y1)]
+                horizontal += [(rect.y0, rect.x0, rect.x1), (rect.y1, rect.x0, rect.x1)]
+    return vertical, horizontal
+
+
+def _merge_positions(positions: List[float], tolerance: float = TABLE_RULING_WIDTH) -> List[float]:
+    """Объединение близких координат линий разметки."""
+    merged = []
+    for pos in sorted(positions):
+        if not merged or pos - merged[-1] > tolerance:
+            merged.append(pos)
+    return merged
+
+
+def _ruled_regions(rulings) -> List[Tuple[float, float, float, float]]:
+    """
+    Поиск областей, размеченных сеткой линий (таблицы с рамками).
+    
+    Соприкасающиеся линии объединяются в одну область; областью таблицы
+    считается группа хотя бы из двух вертикальных и двух горизонтальных линий.
+    
+    Returns:
+        List[Tuple[float, float, float, float]]: Области (x0, y0, x1, y1)
+    """
+    vertical, horizontal = rulings
+    segments = ([((x, y0, x, y1), 1, 0) for x, y0, y1 in vertical]
+                + [((x0, y, x1, y), 0, 1) for y, x0, x1 in horizontal])
+    tol = TABLE_RULING_WIDTH
+    
+    regions = []  # [bbox, количество вертикальных, количество горизонтальных]
+    for bbox, n_vertical, n_horizontal in segments:
+        merged = [bbox, n_vertical, n_horizontal]
+        rest = []
+        for region in regions:
+            rx0, ry0, rx1, ry1 = region[0]
+            x0, y0, x1, y1 = merged[0]
+            if rx0 - tol <= x1 and x0 - tol <= rx1 and ry0 - tol <= y1 and y0 - tol <= ry1:
+                merged = [(min(x0, rx0), min(y0, ry0), max(x1, rx1), max(y1, ry1)),
+                          merged[1] + region[1], merged[2] + region[2]]
+            else:
+                rest.append(region)
+        regions = rest + [merged]
+    
+    return [bbox for bbox, n_vertical, n_horizontal in regions
+            if n_vertical >= 2 and n_horizontal >= 2]
+
+
+def _build_table(lines: List[Dict[str, Any]], rulings, page_num: int,
+                 bbox: Optional[Tuple[float, float, float, float]] = None
+                 ) -> Optional[Dict[str, Any]]:
+    """
+    Построение сетки ячеек для группы строк-кандидатов.
+    
+    Границы столбцов берутся из вертикальных линий разметки внутри области,
+    а при их отсутствии — из промежутков, не занятых ни одной ячейкой.
+    Горизонтальные линии разметки объединяют несколько визуальных строк
+    в одну строку таблицы (многострочные ячейки).
+    
+    Args:
+        lines: Строки-кандидаты сверху вниз
+        rulings: Линии разметки страницы
+        page_num: Номер страницы
+        bbox: Границы размеченной области (None = по ячейкам)
+    
+    Returns:
+        Optional[Dict[str, Any]]: Таблица или None, если сетка не набирает
+            хотя бы двух строк и двух столбцов
+    """
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+    else:
+        x0 = min(cell[0] for line in lines for cell in line["cells"])
+        x1 = max(cell[1] for line in lines for cell in line["cells"])
+        y0, y1 = lines[0]["y0"], lines[-1]["y1"]
+    height = y1 - y0
+    vertical, horizontal = rulings
+    
+    # Вертикальные линии, проходящие через большую часть области
+    separators = _merge_positions([
+        x for x, ly0, ly1 in vertical
+        if x0 - TABLE_RULING_WIDTH <= x <= x1 + TABLE_RULING_WIDTH
+        and min(ly1, y1) - max(ly0, y0) >= 0.5 * height
+    ])
+    inner = [x for x in separators if x0 < x < x1]
+    if inner:
+        bounds = [x0] + inner + [x1]
+        columns = list(zip(bounds[:-1], bounds[1:]))
+    else:
+        columns = []
+        for cx0, cx1, _ in sorted(cell for line in lines for cell in line["cells"]):
+            if columns and cx0 <= columns[-1][1]:
+                columns[-1] = (columns[-1][0], max(columns[-1][1], cx1))
+            else:
+                columns.append((cx0, cx1))
+    if len(columns) < 2:
+        return None
+    
+    row_lines = _merge_positions([
+        y for y, lx0, lx1 in horizontal
+        if y0 - TABLE_RULING_WIDTH <= y <= y1 + TABLE_RULING_WIDTH
+        and min(lx1, x1) - max(lx0, x0) >= 0.5 * (x1 - x0)
+    ])
+    row_bounds = [y for y in row_lines if y0 < y < y1]
+    
+    rows: List[List[str]] = []
+    row_keys = []
+    for line in lines:
+        center = (line["y0"] + line["y1"]) / 2
+        row_key = sum(1 for y in row_bounds if y < center)
+        if not row_keys or row_keys[-1] != row_key or not row_bounds:
+            rows.append([""] * len(columns))
+            row_keys.append(row_key)
+        row = rows[-1]
+        
+        for cx0, cx1, text in line["cells"]:
+            center = (cx0 + cx1) / 2
+            col = next((i for i, (bx0, bx1) in enumerate(columns) if center <= bx1),
+                       len(columns) - 1)
+            row[col] = f"{row[col]} {text}" if row[col] else text
+    
+    if len(rows) < 2:
+        return None
+    return {
+        "page_num": page_num,
+        "bbox": [x0, y0, x1, y1],
+        "n_rows": len(rows),
+        "n_cols": len(columns),
+        "rows": rows,
+    }
+
+
+def _detect_tables(page: fitz.Page, page_idx: int) -> List[Dict[str, Any]]:
+    """
+    Геометрический поиск таблиц на странице.
+    
+    Таблицами считаются области, размеченные сеткой линий, а также группы
+    идущих подряд строк, каждая из которых состоит хотя бы из двух ячеек,
+    с промежутками между строками не больше TABLE_ROW_GAP их высоты.
+    Векторная графика разбирается только на страницах, где есть строки
+    из нескольких ячеек.
+    
+    Args:
+        page: Страница документа
+        page_idx: Индекс страницы (с нуля)
+        
+    Returns:
+        List[Dict[str, Any]]: Найденные таблицы сверху вниз
+    """
+    lines = _page_text_lines(page)
+    if not any(len(line["cells"]) >= 2 for line in lines):
+        return []
+    
+    rulings = _page_rulings(page)
+    tables = []
+    
+    for bbox in _ruled_regions(rulings):
+        rx0, ry0, rx1, ry1 = bbox
+        inside = [
+            line for line in lines
+            if ry0 <= (line["y0"] + line["y1"]) / 2 <= ry1
+            and all(rx0 <= (cell[0] + cell[1]) / 2 <= rx1 for cell in line["cells"])
+        ]
+        if len(inside) >= 2:
+            table = _build_table(inside, rulings, page_idx + 1, bbox)
+            if table is not None:
+                tables.append(table)
+                used = {id(line) for line in inside}
+                lines = [line for line in lines if id(line) not in used]
+    
+    groups = []
+    for line in lines:
+        if len(line["cells"]) < 2:
+            continue
+        if groups:
+            last = groups[-1][-1]
+            if line["y0"] - last["y1"] <= TABLE_ROW_GAP * (last["y1"] - last["y0"]):
+                groups[-1].append(line)
+                continue
+        groups.append([line])
+    
+    for group in groups:
+        if len(group) >= 2:
+            table = _build_table(group, rulings, page_idx + 1)
+            if table is not None:
+                tables.append(table)
+    
+    tables.sort(key=lambda table: table["bbox"][1])
+    return tables
+
+
+def table_to_csv(table: Dict[str, Any]) -> str:
+    """
+    Преобразование таблицы, найденной extract_tables, в CSV.
+    
+    Args:
+        table: Таблица с ключом "rows"
+        
+    Returns:
+        str: Содержимое таблицы в формате CSV
+    """
+    output = io.StringIO()
+    csv.writer(output).writerows(table["rows"])
+    return output.getvalue()
+
+
+# Функции для пула процессов должны быть определены на уровне модуля,
+# чтобы их можно было передать в дочерний процесс. Каждый процесс открывает
+# документ самостоятельно: один fitz.Document нельзя безопасно использовать
+# из нескольких потоков, а PyMuPDF не отпускает GIL.
+
+def _extract_text_range(pdf_path: Union[str, bytes, memoryview], start: int, stop: int) -> List[str]:
+    """Извлечение текста страниц [start, stop) в дочернем процессе."""
+    with _open_document(pdf_path) as doc:
+        return [doc[page_idx].get_text() for page_idx in range(start, stop)]
+
+
+def _extract_blocks_range(pdf_path: Union[str, bytes, memoryview], start: int, stop: int
+                          ) -> List[List[TextBlock]]:
+    """Извлечение блоков текста страниц [start, stop) в дочернем процессе (по списку на страницу)."""
+    with _open_document(pdf_path) as doc:
+        return [_page_to_blocks(doc[page_idx], page_idx) for page_idx in range(start, stop)]
+
+
+def _extract_paragraphs_range(pdf_path: Union[str, bytes, memoryview], start: int, stop: int
+                              ) -> List[List[TextBlock]]:
+    """Извлечение абзацев страниц [start, stop) в дочернем процессе (по списку на страницу)."""
+    with _open_document(pdf_path) as doc:
+        return [_page_to_paragraphs(doc[page_idx], page_idx) for page_idx in range(start, stop)]
+
+
+def _extract_table_range(pdf_path: Union[str, bytes, memoryview], start: int, stop: int) -> TextBlockTable:
+    """Извлечение блоков текста страниц [start, stop) в колоночную таблицу в дочернем процессе."""
+    table = TextBlockTable()
+    with _open_document(pdf_path) as doc:
+        for page_idx in range(start, stop):
+            _page_to_table(doc[page_idx], page_idx, table)
+    return table
+
+
+def _extract_tables_range(pdf_path: Union[str, bytes, memoryview], start: int, stop: int
+                          ) -> List[List[Dict[str, Any]]]:
+    """Поиск таблиц на страницах [start, stop) в отдельном процессе (по списку на страницу)."""
+    with _open_document(pdf_path) as doc:
+        return [_detect_tables(doc[page_idx], page_idx) for page_idx in range(start, stop)]
+
+
+def _layout_to_blocks(page_layout: LTPage, page_num: int, top_left: bool = False) -> List[TextBlock]:
+    """
+    Преобразование страницы PDFMiner в список текстовых блоков (по одному на строку).
+    
+    Шрифт и размер шрифта строки — те, которыми набрано большинство ее символов;
+    префикс подмножества шрифта ("ABCDEF+") отбрасывается, как и в PyMuPDF.
+    
+    Args:
+        page_layout: Разобранная страница
+        page_num: Номер страницы (с единицы)
+        top_left: Перевести координаты в систему PyMuPDF (начало в левом верхнем
+            углу); по умолчанию остаются координаты PDFMiner (левый нижний угол)
+        
+    Returns:
+        List[TextBlock]: Список блоков текста с метаданными
+    """
+    from pdfminer.layout import LTChar, LTTextBox, LTTextLine
+    
+    blocks = []
+    height = page_layout.height
+    
+    for element in page_layout:
+        if isinstance(element, LTTextBox):
+            for text_line in element:
+                if isinstance(text_line, LTTextLine):
+                    x0, y0, x1, y1 = text_line.bbox
+                    if top_left:
+                        y0, y1 = height - y1, height - y0
+                    fonts = Counter((char.fontname, char.size) for char in text_line if isinstance(char, LTChar))
+                    font, font_size = fonts.most_common(1)[0][0] if fonts else (None, None)
+                    if font is not None:
+                        # Для CID-шрифтов PDFMiner возвращает имя в виде bytes
+                        if isinstance(font, bytes):
+                            font = font.decode("latin-1")
+                        font = font.split("+", 1)[-1] if font[6:7] == "+" else font
+                        font_size = round(font_size, 2)
+                    blocks.append(TextBlock(
+                        text=text_line.get_text().strip(),
+                        page_num=page_num,
+                        x0=x0,
+                        y0=y0,
+                        x1=x1,
+                        y1=y1,
+                        font=font,
+                        font_size=font_size,
+                        block_type="text"
+                    ))
+    return blocks
+
+
+def _page_quality_issues(page: fitz.Page, blocks: List[TextBlock]) -> List[str]:
+    """
+    Оценка качества извлечения страницы с помощью PyMuPDF.
+    
+    Args:
+        page: Страница документа
+        blocks: Блоки текста, извлеченные PyMuPDF
+        
+    Returns:
+        List[str]: Обнаруженные проблемы: "empty" (шрифты есть, текста нет),
+            "encoding" (нераспознанные символы, в том числе сломанные лигатуры),
+            "overlap" (массово перекрывающиеся span'ы)
+    """
+    text = "".join(block.text for block in blocks)
+    if not text.strip():
+        # Страница без шрифтов — скан, PDFMiner здесь не поможет
+        return ["empty"] if page.get_fonts() else []
+    
+    issues = []
+    bad_chars = sum(
+        1 for ch in text
+        if ch == "\ufffd" or "\ue000" <= ch <= "\uf8ff" or (ch < " " and ch not in "\t\n\r")
+    )
+    if bad_chars / len(text) > HYBRID_BAD_CHAR_RATIO:
+        issues.append("encoding")
+    
+    ordered = sorted(blocks, key=lambda block: (block.y0, block.x0))
+    overlaps = 0
+    for prev, cur in zip(ordered, ordered[1:]):
+        width = min(prev.x1, cur.x1) - max(prev.x0, cur.x0)
+        height = min(prev.y1, cur.y1) - max(prev.y0, cur.y0)
+        smaller = min((prev.x1 - prev.x0) * (prev.y1 - prev.y0), (cur.x1 - cur.x0) * (cur.y1 - cur.y0))
+        if width > 0 and height > 0 and smaller > 0 and width * height >= 0.5 * smaller:
+            overlaps += 1
+    if len(ordered) > 1 and overlaps / (len(ordered) - 1) > HYBRID_OVERLAP_RATIO:
+        issues.append("overlap")
+    
+    return issues
+
+
+def _hybrid_pymupdf_pages(doc: fitz.Document, indices: Iterable[int]
+                          ) -> List[Tuple[List[TextBlock], float, List[str]]]:
+    """Первый проход гибридного режима: блоки, время и проблемы страниц открытого документа."""
+    results = []
+    for page_idx in indices:
+        page_start = time.perf_counter()
+        page = doc[page_idx]
+        blocks = _page_to_blocks(page, page_idx)
+        elapsed = time.perf_counter() - page_start
+        results.append((blocks, elapsed, _page_quality_issues(page, blocks)))
+    return results
+
+
+def _hybrid_pymupdf_range(pdf_path: Union[str, bytes, memoryview], start: int, stop: int
+                          ) -> List[Tuple[List[TextBlock], float, List[str]]]:
+    """Первый проход гибридного режима для страниц [start, stop) в отдельном процессе."""
+    with _open_document(pdf_path) as doc:
+        return _hybrid_pymupdf_pages(doc, range(start, stop))
+
+
+class _PDFMinerDocument:
+    """
+    Разобранный PDFMiner документ: структура документа, уже найденные
+    страницы и менеджер ресурсов, кэширующий шрифты.
+    """
+    
+    def __init__(self, fp: IO[bytes]):
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser as MinerParser
+        
+        self.fp = fp
+        self.document = PDFDocument(MinerParser(fp))
+        self.resources = PDFResourceManager(caching=True)
+        self._page_iter = PDFPage.create_pages(self.document)
+        self._pages = []
+    
+    def page(self, page_idx: int) -> Optional[Any]:
+        """Страница с индексом page_idx (дерево страниц обходится один раз)."""
+        while len(self._pages) <= page_idx:
+            page = next(self._page_iter, None)
+            if page is None:
+                return None
+            self._pages.append(page)
+        return self._pages[page_idx]
+    
+    def layouts(self, indices: Iterable[int], laparams: Optional[Dict[str, Any]]) -> Iterator[Tuple[int, LTPage]]:
+        """Разметка выбранных страниц (параметры LAParams задаются словарем)."""
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter
+        
+        device = PDFPageAggregator(self.resources, laparams=LAParams(**(laparams or {})))
+        interpreter = PDFPageInterpreter(self.resources, device)
+        for page_idx in indices:
+            page = self.page(page_idx)
+            if page is None:
+                return
+            interpreter.process_page(page)
+            yield page_idx, device.get_result()
+
+
+# Документы, разобранные процессом пула PDFMiner: ключ файла -> _PDFMinerDocument.
+# Заполняется только в дочерних процессах (см. _init_pdfminer_worker)
+_pdfminer_worker_docs: Optional["OrderedDict[Tuple, _PDFMinerDocument]"] = None
+
+
+def _init_pdfminer_worker() -> None:
+    """Инициализация процесса пула PDFMiner: включение кэша разобранных документов."""
+    global _pdfminer_worker_docs
+    _pdfminer_worker_docs = OrderedDict()
+
+
+@contextmanager
+def _pdfminer_document(pdf_path: Union[str, bytes, memoryview]) -> Iterator[_PDFMinerDocument]:
+    """
+    Разобранный документ PDFMiner. В процессе пула документ-файл разбирается
+    один раз и используется всеми задачами процесса, пока файл не изменится.
+    """
+    if _pdfminer_worker_docs is None or not isinstance(pdf_path, str):
+        with _pdfminer_input(pdf_path) as fp:
+            if isinstance(fp, str):
+                with open(fp, 'rb') as f:
+                    yield _PDFMinerDocument(f)
+            else:
+                yield _PDFMinerDocument(fp)
+        return
+    
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    document = _pdfminer_worker_docs.pop(key, None)
+    if document is None:
+        document = _PDFMinerDocument(open(pdf_path, 'rb'))
+    _pdfminer_worker_docs[key] = document
+    while len(_pdfminer_worker_docs) > PDFMINER_WORKER_DOCS:
+        _, evicted = _pdfminer_worker_docs.popitem(last=False)
+        evicted.fp.close()
+    yield document
+
+
+def _extract_pdfminer_pages(pdf_path: Union[str, bytes, memoryview], indices: List[int],
+                            top_left: bool = False, laparams: Optional[Dict[str, Any]] = None
+                            ) -> List[Tuple[List[TextBlock], float]]:
+    """
+    Извлечение блоков выбранных страниц с помощью PDFMiner (с временем на страницу).
+    
+    Args:
+        pdf_path: Путь к PDF-файлу или его содержимое
+        indices: Индексы страниц
+        top_left: Перевести координаты в систему PyMuPDF
+        laparams: Параметры анализа разметки (аргументы LAParams)
+        
+    Returns:
+        List[Tuple[List[TextBlock], float]]: Блоки и время извлечения каждой страницы
+    """
+    results = []
+    page_start = time.perf_counter()
+    with _pdfminer_document(pdf_path) as document:
+        for page_idx, page_layout in document.layouts(indices, laparams):
+            blocks = _layout_to_blocks(page_layout, page_idx + 1, top_left)
+            now = time.perf_counter()
+            results.append((blocks, now - page_start))
+            page_start = now
+    return results
+
+
+def _extract_segments(segments: List[Tuple[str, int, Optional[int]]], max_chars: Optional[int] = None
+                      ) -> List[Tuple[str, int, Optional[List[str]], Optional[Tuple[str, str]]]]:
+    """
+    Задача планировщика пакетной обработки: извлечение текста нескольких
+    фрагментов (файл, первая страница, последняя страница не включительно).
+    
+    Args:
+        segments: Фрагменты; stop = None означает конец документа
+        max_chars: Ограничение на объем текста фрагмента
+        
+    Returns:
+        List[Tuple]: Для каждого фрагмента (файл, start, текст страниц, ошибка);
+            ошибка передается как (имя класса исключения, сообщение)
+    """
+    results = []
+    for pdf_path, start, stop in segments:
+        try:
+            with fitz.open(pdf_path) as doc:
+                stop = len(doc) if stop is None else stop
+                texts = _limit_chars((doc[page_idx].get_text() for page_idx in range(start, stop)),
+                                     max_chars)
+            results.append((pdf_path, start, texts, None))
+        except Exception as e:
+            results.append((pdf_path, start, None, (type(e).__name__, str(e))))
+    return results
+
+
+def _page_count(pdf_path: str) -> int:
+    """Количество страниц PDF-файла."""
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+# Признак того, что поток выполняет задачу асинхронного API (индикаторы прогресса отключаются)
+_async_worker_state = threading.local()
+
+
+def _pdf_date(value: Optional[str]) -> Optional[str]:
+    """Дата из метаданных PDF в формате ISO 8601 (нераспознанная строка возвращается как есть)."""
+    if not value:
+        return None
+    match = _PDF_DATE_RE.match(value.strip())
+    if match is None:
+        return value.strip()
+    year, month, day, hour, minute, second, utc, sign, tz_hour, tz_minute = match.groups()
+    date = f"{year}-{month or '01'}-{day or '01'}"
+    if hour is None:
+        return date
+    date += f"T{hour}:{minute or '00'}:{second or '00'}"
+    if utc:
+        return date + "Z"
+    if sign:
+        return date + f"{sign}{tz_hour}:{tz_minute or '00'}"
+    return date
+
+
+def _has_text_layer(page: fitz.Page) -> bool:
+    """
+    Наличие текстового слоя на странице без извлечения текста: шрифты в
+    ресурсах и текстовые объекты в содержимом страницы или формах.
+    """
+    if not page.get_fonts():
+        # Страницы без шрифтов (сканы без распознанного слоя) не содержат текста
+        return False
+    # Шрифты могут быть объявлены в общих ресурсах, но не использоваться страницей.
+    # Потоки содержимого делятся только по границам операторов, поэтому
+    # достаточно найти первый поток с началом текстового объекта
+    doc = page.parent
+    return (any(b"BT" in (doc.xref_stream(xref) or b"") for xref in page.get_contents())
+            or bool(page.get_xobjects()))
+
+
+def _scan_file(pdf_path: str, size: int, sample_pages: int = 1) -> ScanResult:
+    """
+    Сканирование одного файла: метаданные, количество страниц, шифрование,
+    оглавление и наличие текстового слоя на sample_pages страницах,
+    равномерно выбранных из документа.
+    """
+    result = ScanResult(path=pdf_path, size=size)
+    try:
+        with fitz.open(pdf_path) as doc:
+            metadata = doc.metadata or {}
+            result.pages = doc.page_count
+            result.title = metadata.get("title") or None
+            result.author = metadata.get("author") or None
+            result.creation_date = _pdf_date(metadata.get("creationDate"))
+            result.encrypted = bool(metadata.get("encryption") or doc.needs_pass)
+            if doc.needs_pass:
+                # Без пароля страницы и оглавление недоступны
+                return result
+            
+            result.toc = [(level, title, page) for level, title, page in doc.get_toc(simple=True)]
+            count = min(sample_pages, doc.page_count)
+            # Середины равных частей документа: обложка и последняя страница часто без текста
+            samples = sorted({(2 * i + 1) * doc.page_count // (2 * count) for i in range(count)})
+            result.has_text = any(_has_text_layer(doc[page_idx]) for page_idx in samples)
+    except Exception as e:
+        result.error = str(e)
+        result.error_type = type(e).__name__
+    return result
+
+
+def _scan_files(entries: List[Tuple[str, int]], sample_pages: int = 1) -> List[ScanResult]:
+    """Задача пула быстрого сканирования: несколько файлов (путь, размер)."""
+    return [_scan_file(pdf_path, size, sample_pages) for pdf_path, size in entries]
+
+
+def _quiet_call(func, *args):
+    """Вызов функции в рабочем потоке асинхронного API без индикаторов прогресса."""
+    _async_worker_state.active = True
+    try:
+        return func(*args)
+    finally:
+        _async_worker_state.active = False
+
+
+def _extract_file_text(pdf_path: Union[str, bytes], pages: PageSelection = None,
+                       max_chars: Optional[int] = None) -> List[str]:
+    """Извлечение текста файла в дочернем процессе (для пакетной обработки)."""
+    with _open_document(pdf_path) as doc:
+        indices = _resolve_pages(pages, len(doc))
+        return _limit_chars((doc[page_idx].get_text() for page_idx in indices), max_chars)
+
+
+def _extract_file_ordered(pdf_path: str, pages: PageSelection = None,
+                          max_chars: Optional[int] = None, ocr: Optional["OCREngine"] = None,
+                          ocr_dpi: int = 300) -> List[Tuple[int, str]]:
+    """Извлечение текста файла в порядке чтения по страницам (задача пакетной обработки)."""
+    parser = PDFParser(use_multithreading=False, show_progress=False, ocr=ocr, ocr_dpi=ocr_dpi)
+    try:
+        table, lines = parser._extract_reading_order(pdf_path, pages, max_chars)
+    finally:
+        parser.close()
+    page_texts = _ordered_page_texts(table, lines)
+    texts = _limit_chars((text for _, text in page_texts), max_chars)
+    return [(page_num, text) for (page_num, _), text in zip(page_texts, texts)]
+
+
+def _ocr_page(engine: OCREngine, pdf_path: Union[str, bytes, memoryview], page_idx: int,
+              dpi: int) -> List[Tuple]:
+    """
+    Отрисовка страницы и распознавание текста (задача пула OCR).
+    
+    Returns:
+        List[Tuple]: Строки текста в виде кортежей полей TextBlock в координатах страницы
+    """
+    with _open_document(pdf_path) as doc:
+        pixmap = doc[page_idx].get_pixmap(dpi=dpi)
+    
+    scale = 72 / dpi
+    return [
+        (text, page_idx + 1, x0 * scale, y0 * scale, x1 * scale, y1 * scale, None, (y1 - y0) * scale, "text")
+        for text, x0, y0, x1, y1 in engine.recognize(pixmap)
+    ]
+
+
+def _ocr_text(rows: List[Tuple]) -> str:
+    """Текст страницы из распознанных строк в формате page.get_text()."""
+    return "".join(row[0] + "\n" for row in rows)
+
+
+def _process_rss(pid: int) -> Optional[int]:
+    """Резидентная память процесса в байтах (None, если /proc недоступен)."""
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _supervised_worker(conn) -> None:
+    """
+    Цикл процесса наблюдаемого пула: задачи (функция, аргументы) принимаются
+    из канала, результат или исключение отправляются обратно.
+    """
+    import signal
+    
+    # Прерывание с клавиатуры обрабатывает родительский процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        func, args, kwargs = task
+        try:
+            reply = (True, func(*args, **kwargs))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Результат или исключение не сериализуются
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _SupervisedWorker:
+    """Процесс наблюдаемого пула и переданные ему задачи."""
+    __slots__ = ("process", "conn", "tasks", "deadline", "tasks_sent")
+    
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        # Задачи [future, func, args, kwargs, попытки, повторы] в порядке выполнения;
+        # процесс выполняет первую, остальные ждут в канале
+        self.tasks = deque()
+        self.deadline = None  # срок выполнения первой задачи
+        self.tasks_sent = 0
+
+
+class _SupervisedExecutor(concurrent.futures.Executor):
+    """
+    Пул процессов, который наблюдает за каждой задачей.
+    
+    Процесс выполняет задачи по одной; следующая задача передается ему
+    заранее (WORKER_QUEUE_DEPTH), чтобы процесс не простаивал, пока
+    результат передается обратно. Ограничение времени отсчитывается
+    с момента начала выполнения задачи. Процесс, превысивший ограничение
+    времени задачи или резидентной памяти, принудительно завершается;
+    процесс, выполнивший max_tasks_per_worker задач, завершается штатно.
+    Вместо завершенного процесса запускается новый, остальные процессы
+    не затрагиваются. Задача, процесс которой был остановлен или завершился
+    аварийно, повторяется в новом процессе не более retries раз (задача,
+    переданная submit_once, не повторяется), после чего ее Future получает
+    WorkerTimeoutError, WorkerMemoryError или WorkerCrashError; ожидавшие
+    в канале задачи передаются другим процессам без учета попытки.
+    Исключения самой функции задачи не повторяются.
+    
+    Наблюдение выполняет отдельный поток; память процессов проверяется
+    через /proc (Linux), на других системах ограничение памяти не действует.
+    """
+    
+    def __init__(self, max_workers: int, timeout: Optional[float] = None,
+                 max_memory: Optional[int] = None, max_tasks_per_worker: Optional[int] = None,
+                 retries: int = 1):
+        import multiprocessing
+        
+        self._context = multiprocessing.get_context()
+        self._max_workers = max(1, max_workers)
+        self._timeout = timeout
+        self._max_memory = max_memory
+        self._max_tasks_per_worker = max_tasks_per_worker
+        self._retries = retries
+        self._workers: List[_SupervisedWorker] = []
+        self._queue = deque()
+        self._lock = threading.RLock()
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+        self._wakeup_pending = False
+        self._shutdown = False
+        self._thread = None
+        self._memory_checked = 0.0
+    
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        return self._submit(fn, args, kwargs, self._retries)
+    
+    def submit_once(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        """Передача задачи без повторов: остановка процесса сразу передается в Future."""
+        return self._submit(fn, args, kwargs, 0)
+    
+    def _submit(self, fn, args: Tuple, kwargs: Dict[str, Any], retries: int) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Пул остановлен")
+            self._queue.append([future, fn, args, kwargs, 0, retries])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._supervise, name="pdf-parser-supervisor",
+                                                daemon=True)
+                self._thread.start()
+            self._wakeup()
+        return future
+    
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while self._queue:
+                    self._queue.popleft()[0].cancel()
+            thread = self._thread
+            if thread is not None:
+                self._wakeup()
+            else:
+                self._close_wakeup()
+        if thread is not None and wait:
+            thread.join()
+    
+    def _close_wakeup(self) -> None:
+        """Закрытие канала пробуждения (вызывается под блокировкой)."""
+        if not self._wakeup_writer.closed:
+            self._wakeup_reader.close()
+            self._wakeup_writer.close()
+    
+    def _wakeup(self) -> None:
+        """Пробуждение потока наблюдения (вызывается под блокировкой)."""
+        if not self._wakeup_pending and not self._wakeup_writer.closed:
+            self._wakeup_pending = True
+            self._wakeup_writer.send_bytes(b"")
+    
+    def _spawn(self) -> _SupervisedWorker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_supervised_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _SupervisedWorker(process, parent_conn)
+        self._workers.append(worker)
+        return worker
+    
+    def _stop(self, worker: _SupervisedWorker, kill: bool = False) -> None:
+        """Остановка процесса: штатная (после текущей задачи) или принудительная."""
+        self._workers.remove(worker)
+        if not kill:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                kill = True
+        if kill:
+            worker.process.kill()
+        worker.process.join(None if kill else WORKER_STOP_TIMEOUT)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+    
+    def _accepts(self, worker: _SupervisedWorker, depth: int) -> bool:
+        """Процесс может принять задачу, если у него меньше depth задач и лимит задач не исчерпан."""
+        return (len(worker.tasks) < depth
+                and not (self._max_tasks_per_worker and worker.tasks_sent >= self._max_tasks_per_worker))
+    
+    def _dispatch(self) -> None:
+        """Передача задач из очереди процессам (под блокировкой)."""
+        if self._queue:
+            # Процессы, завершившиеся без задач, не занимают места в пуле
+            for worker in [w for w in self._workers if not w.tasks and not w.process.is_alive()]:
+                self._stop(worker, kill=True)
+        from multiprocessing.reduction import ForkingPickler
+        
+        while self._queue:
+            # Сначала задачи получают свободные процессы, затем — в очередь канала
+            worker = next((w for w in self._workers if self._accepts(w, 1)), None)
+            if worker is None and len(self._workers) < self._max_workers:
+                worker = self._spawn()
+            if worker is None:
+                worker = min((w for w in self._workers if self._accepts(w, WORKER_QUEUE_DEPTH)),
+                             key=lambda w: len(w.tasks), default=None)
+            if worker is None:
+                return
+            task = self._queue.popleft()
+            future, fn, args, kwargs, _, _ = task
+            # Повторяемая или отложенная задача уже выполняется с точки зрения Future
+            if not future.running() and not future.set_running_or_notify_cancel():
+                continue
+            try:
+                data = ForkingPickler.dumps((fn, args, kwargs))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if worker.tasks and len(data) > WORKER_PREFETCH_BYTES:
+                # Задача будет передана, когда процесс освободится
+                self._queue.appendleft(task)
+                return
+            try:
+                worker.conn.send_bytes(data)
+            except OSError:
+                # Процесс завершился: задача передается другому процессу
+                self._queue.appendleft(task)
+                if worker.tasks:
+                    self._crashed(worker)
+                else:
+                    self._stop(worker, kill=True)
+                continue
+            if not worker.tasks:
+                worker.deadline = None if self._timeout is None else time.monotonic() + self._timeout
+            worker.tasks.append(task)
+            worker.tasks_sent += 1
+    
+    def _fail(self, worker: _SupervisedWorker, error: WorkerError) -> None:
+        """Остановка процесса, задача которого не может быть завершена, и повтор задачи."""
+        task, *waiting = worker.tasks
+        worker.tasks.clear()
+        self._stop(worker, kill=True)
+        task[4] += 1
+        with self._lock:
+            # Задачи, не начатые процессом, выполняются первыми в других процессах
+            self._queue.extendleft(reversed(waiting))
+            if task[4] <= task[5]:
+                logger.warning(f"{error}; повтор задачи в новом процессе")
+                self._queue.appendleft(task)
+        if task[4] > task[5]:
+            error.attempts = task[4]
+            task[0].set_exception(error)
+    
+    def _crashed(self, worker: _SupervisedWorker) -> None:
+        """Обработка аварийного завершения процесса, выполнявшего задачу."""
+        worker.process.join(WORKER_STOP_TIMEOUT)
+        self._fail(worker, WorkerCrashError(
+            f"процесс обработки аварийно завершился (код {worker.process.exitcode})"))
+    
+    def _collect(self, worker: _SupervisedWorker) -> None:
+        """Получение результата задачи или обработка завершения процесса."""
+        while worker.tasks:
+            try:
+                if not worker.conn.poll():
+                    if worker.process.is_alive():
+                        return
+                    raise EOFError
+                success, value = worker.conn.recv()
+            except (EOFError, OSError):
+                self._crashed(worker)
+                return
+            except Exception as e:
+                # Результат не удалось восстановить из канала
+                success, value = False, e
+            
+            future = worker.tasks.popleft()[0]
+            if worker.tasks and self._timeout is not None:
+                worker.deadline = time.monotonic() + self._timeout
+            if success:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        
+        if self._max_tasks_per_worker and worker.tasks_sent >= self._max_tasks_per_worker:
+            self._stop(worker)
+    
+    def _check_limits(self) -> None:
+        """Остановка процессов, превысивших ограничения времени и памяти."""
+        now = time.monotonic()
+        check_memory = self._max_memory is not None and now - self._memory_checked >= WORKER_POLL_INTERVAL
+        if check_memory:
+            self._memory_checked = now
+        for worker in [w for w in self._workers if w.tasks]:
+            if worker.deadline is not None and now >= worker.deadline:
+                self._fail(worker, WorkerTimeoutError(f"превышено время обработки ({self._timeout} с)"))
+            elif check_memory:
+                rss = _process_rss(worker.process.pid)
+                if rss is not None and rss > self._max_memory:
+                    self._fail(worker, WorkerMemoryError(
+                        f"превышено ограничение памяти ({rss // 2 ** 20} МБ из {self._max_memory // 2 ** 20} МБ)"))
+    
+    def _supervise(self) -> None:
+        """Цикл потока наблюдения."""
+        from multiprocessing.connection import wait
+        
+        try:
+            while True:
+                with self._lock:
+                    self._wakeup_pending = False
+                    self._dispatch()
+                    busy = [w for w in self._workers if w.tasks]
+                    if self._shutdown and not self._queue and not busy:
+                        return
+                
+                timeout = None
+                deadlines = [w.deadline for w in busy if w.deadline is not None]
+                if deadlines:
+                    timeout = max(0.0, min(deadlines) - time.monotonic())
+                if self._max_memory is not None and busy:
+                    timeout = WORKER_POLL_INTERVAL if timeout is None else min(timeout, WORKER_POLL_INTERVAL)
+                
+                ready = wait([self._wakeup_reader, *(w.conn for w in busy),
+                              *(w.process.sentinel for w in busy)], timeout)
+                if self._wakeup_reader in ready:
+                    while self._wakeup_reader.poll():
+                        self._wakeup_reader.recv_bytes()
+                for worker in busy:
+                    if worker.conn in ready or worker.process.sentinel in ready:
+                        self._collect(worker)
+                self._check_limits()
+        except BaseException as e:
+            # Поток наблюдения не должен оставлять Future без результата
+            logger.error(f"Ошибка наблюдения за процессами обработки: {e}")
+            with self._lock:
+                self._shutdown = True
+                tasks = [task for w in self._workers for task in w.tasks] + list(self._queue)
+                self._queue.clear()
+            for task in tasks:
+                if not task[0].done():
+                    task[0].set_exception(e)
+            raise
+        finally:
+            for worker in list(self._workers):
+                self._stop(worker, kill=bool(worker.tasks))
+            with self._lock:
+                self._close_wakeup()
+
+
+class PDFParser:
+    """
+    Быстрый и точный парсер PDF-файлов с поддержкой обработки больших документов.
+    
+    Использует комбинацию PyMuPDF (быстрый) и PDFMiner (более точный) для
+    обеспечения оптимального баланса скорости и точности.
+    """
+    
+    def __init__(self, use_multithreading: bool = True, max_workers: int = None,
+                 mode: str = "thread", cache: Optional[ExtractionCache] = None,
+                 show_progress: bool = True, max_inflight_bytes: int = 512 * 1024 * 1024,
+                 metrics: Optional[MetricsHook] = None, doc_cache_size: int = 8,
+                 ocr: Optional[OCREngine] = None, ocr_dpi: int = 300, ocr_workers: Optional[int] = None,
+                 laparams: Optional[Dict[str, Any]] = None, file_timeout: Optional[float] = None,
+                 max_worker_memory: Optional[int] = None, max_files_per_worker: Optional[int] = None,
+                 retries: int = 1, page_reuse: bool = False):
+        """
+        Инициализация PDF парсера.
+        
+        Args:
+            use_multithreading: Использовать параллельную обработку для больших файлов
+            max_workers: Максимальное количество потоков (None = автоматическое определение)
+            mode: Режим параллельной обработки: "thread" (пул потоков),
+                "process" (пул процессов, каждый процесс открывает файл сам) или
+                "isolated" (как "process", но пакетная обработка выполняется
+                в наблюдаемых процессах: зависший, превысивший память или
+                аварийно завершившийся процесс заменяется новым, а файл
+                помещается в карантин, см. BatchResult.quarantined)
+            cache: Постоянный кэш результатов извлечения (None = без кэша)
+            show_progress: Показывать индикаторы прогресса tqdm (внутри asyncio
+                они отключаются автоматически)
+            max_inflight_bytes: Ограничение на суммарный размер файлов (или их
+                частей), одновременно обрабатываемых в batch_process
+            metrics: Приемник метрик (например, ParserMetrics); None = метрики
+                не собираются
+            doc_cache_size: Количество открытых документов, которые парсер
+                держит для повторных операций над теми же файлами (0 = не держать)
+            ocr: Движок распознавания страниц без текстового слоя (None = без OCR)
+            ocr_dpi: Разрешение отрисовки страниц для распознавания
+            ocr_workers: Количество процессов распознавания (None = по числу ядер)
+            laparams: Параметры анализа разметки PDFMiner — аргументы
+                pdfminer.layout.LAParams, например {"line_margin": 0.3}
+                (None = значения по умолчанию)
+            file_timeout: Ограничение времени обработки одного файла (или
+                части большого файла) в пакетном режиме, секунды (только "isolated")
+            max_worker_memory: Ограничение резидентной памяти процесса пакетной
+                обработки в байтах (только "isolated", Linux)
+            max_files_per_worker: Перезапускать процесс пакетной обработки после
+                указанного количества задач (только "isolated")
+            retries: Количество повторов файла в новом процессе после остановки
+                или аварийного завершения процесса (только "isolated")
+            page_reuse: Извлекать заново только страницы, отпечатков которых
+                нет в кэше (см. page_fingerprints): в новой версии документа
+                результаты неизмененных страниц берутся из кэша (требует cache)
+        """
+        if mode not in PROCESSING_MODES:
+            raise ValueError(f"Неизвестный режим обработки: {mode}. "
+                             f"Допустимые значения: {', '.join(PROCESSING_MODES)}")
+        if mode != "isolated" and (file_timeout or max_worker_memory or max_files_per_worker):
+            raise ValueError("Ограничения file_timeout, max_worker_memory и max_files_per_worker "
+                             "поддерживаются только в режиме isolated")
+        if page_reuse and cache is None:
+            raise ValueError("Для повторного использования страниц необходим кэш (cache)")
+        
+        self.use_multithreading = use_multithreading
+        self.mode = mode
+        self.cache = cache
+        self.show_progress = show_progress
+        self.max_inflight_bytes = max_inflight_bytes
+        self.metrics = metrics or _NULL_METRICS
+        self._documents = DocumentCache(doc_cache_size)
+        self._async_executor = None
+        self._async_semaphore = None
+        self.ocr = ocr
+        self.ocr_dpi = ocr_dpi
+        self.ocr_workers = ocr_workers or os.cpu_count() or 1
+        self._ocr_executors: Dict[type, concurrent.futures.Executor] = {}
+        self.laparams = dict(laparams or {})
+        self.file_timeout = file_timeout
+        self.max_worker_memory = max_worker_memory
+        self.max_files_per_worker = max_files_per_worker
+        self.retries = retries
+        self.page_reuse = page_reuse
+        if mode != "thread":
+            # Больше процессов, чем ядер, не дает выигрыша для CPU-bound задач
+            self.max_workers = max_workers or os.cpu_count() or 1
+        else:
+            self.max_workers = max_workers or min(32, os.cpu_count() + 4)
+        logger.info(f"Инициализирован PDF Parser (многопоточность: {use_multithreading}, "
+                    f"режим: {mode}, потоков: {self.max_workers})")
+    
+    def _progress(self, iterable, **kwargs):
+        """
+        Индикатор прогресса tqdm, который отключается, если вывод прогресса
+        запрещен или вызов выполняется внутри асинхронного API.
+        """
+        from tqdm import tqdm
+        
+        disable = not self.show_progress or getattr(_async_worker_state, "active", False)
+        # Если asyncio не импортирован, цикл событий не может быть запущен
+        if not disable and "asyncio" in sys.modules:
+            try:
+                asyncio.get_running_loop()
+                disable = True
+            except RuntimeError:
+                pass
+        return tqdm(iterable, disable=disable, **kwargs)
+    
+    def _open(self, pdf_path: Union[str, bytes, memoryview]) -> fitz.Document:
+        """Открытие документа с учетом метрик open и bytes_read."""
+        with self.metrics.timer("open"):
+            doc = _open_document(pdf_path)
+        if self.metrics.enabled:
+            self.metrics.incr("bytes_read", _source_size(pdf_path))
+        return doc
+    
+    def _document(self, pdf_path: Union[str, bytes, memoryview]):
+        """Открытый документ из кэша документов парсера (контекстный менеджер)."""
+        return self._documents.open(pdf_path, self._open)
+    
+    def _executor_cls(self, pdf_path: Union[str, bytes, memoryview, None] = None):
+        """
+        Класс пула исполнителей. Документы из памяти обрабатываются в пуле
+        потоков и в режиме "process": передача буфера в каждый дочерний
+        процесс означала бы его копирование, а memoryview и mmap не сериализуются.
+        """
+        if self.mode != "thread" and (pdf_path is None or isinstance(pdf_path, str)):
+            return concurrent.futures.ProcessPoolExecutor
+        return concurrent.futures.ThreadPoolExecutor
+    
+    def _batch_executor(self, max_workers: int) -> concurrent.futures.Executor:
+        """
+        Пул пакетной обработки. В режиме "isolated" — наблюдаемые процессы
+        с ограничениями времени и памяти (см. _SupervisedExecutor).
+        """
+        if self.mode == "isolated":
+            return _SupervisedExecutor(max_workers, timeout=self.file_timeout,
+                                       max_memory=self.max_worker_memory,
+                                       max_tasks_per_worker=self.max_files_per_worker,
+                                       retries=self.retries)
+        return self._executor_cls()(max_workers=max_workers)
+    
+    def close(self) -> None:
+        """Закрытие открытых документов, которые парсер держит в кэше, и пулов OCR."""
+        self._documents.close()
+        for executor in self._ocr_executors.values():
+            executor.shutdown(wait=True)
+        self._ocr_executors.clear()
+    
+    def _submit_ocr(self, pdf_path: Union[str, bytes, memoryview], page_idx: int) -> concurrent.futures.Future:
+        """
+        Постановка страницы в очередь распознавания. Результаты распознавания
+        кэшируются по страницам; без многопоточности страница распознается сразу.
+        
+        Returns:
+            concurrent.futures.Future: Строки текста в виде кортежей полей TextBlock
+        """
+        options = dict(self.ocr.options(), dpi=self.ocr_dpi)
+        if self.cache is not None:
+            rows = self.cache.get(pdf_path, "ocr", self.ocr.name, page=page_idx, options=options)
+            if rows is not None:
+                future = concurrent.futures.Future()
+                future.set_result([tuple(row) for row in rows])
+                return future
+        
+        self.metrics.incr("ocr_pages")
+        if self.use_multithreading:
+            # Распознавание идет в отдельном пуле и не задерживает извлечение текстового слоя
+            executor_cls = (concurrent.futures.ProcessPoolExecutor if isinstance(pdf_path, str)
+                            else concurrent.futures.ThreadPoolExecutor)
+            if executor_cls not in self._ocr_executors:
+                self._ocr_executors[executor_cls] = executor_cls(max_workers=self.ocr_workers)
+            future = self._ocr_executors[executor_cls].submit(_ocr_page, self.ocr, pdf_path, page_idx, self.ocr_dpi)
+        else:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(_ocr_page(self.ocr, pdf_path, page_idx, self.ocr_dpi))
+            except Exception as e:
+                future.set_exception(e)
+        
+        if self.cache is not None:
+            # Результат выдается после записи в кэш, чтобы следующий запрос
+            # той же страницы не распознавал ее повторно
+            cache = self.cache
+            stored = concurrent.futures.Future()
+            
+            def store(done: concurrent.futures.Future) -> None:
+                if not stored.set_running_or_notify_cancel():
+                    return
+                error = concurrent.futures.CancelledError() if done.cancelled() else done.exception()
+                if error is not None:
+                    stored.set_exception(error)
+                    return
+                try:
+                    cache.put(pdf_path, "ocr", self.ocr.name, done.result(), page=page_idx, options=options)
+                except Exception as e:
+                    logger.warning(f"Не удалось сохранить распознанную страницу в кэш: {e}")
+                stored.set_result(done.result())
+            
+            stored.add_done_callback(lambda result: future.cancel() if result.cancelled() else None)
+            future.add_done_callback(store)
+            return stored
+        return future
+    
+    def _ocr_blank_pages(self, pdf_path: Union[str, bytes, memoryview], page_numbers: List[int],
+                         page_texts: List[Any]) -> List[concurrent.futures.Future]:
+        """
+        Постановка в очередь распознавания страниц без текстового слоя.
+        
+        Текст таких страниц в page_texts заменяется объектами Future.
+        
+        Returns:
+            List[concurrent.futures.Future]: Незавершенные задачи распознавания
+        """
+        futures = []
+        blank = [i for i, text in enumerate(page_texts) if self._is_blank(text)]
+        if not blank:
+            return futures
+        try:
+            with self._document(pdf_path) as doc:
+                blank = [i for i in blank if doc[page_numbers[i] - 1].get_images()]
+        except Exception as e:
+            logger.warning(f"Не удалось проверить изображения страниц {_source_name(pdf_path)}: {e}")
+            return futures
+        for i in blank:
+            future = self._submit_ocr(pdf_path, page_numbers[i] - 1)
+            if future.done():
+                page_texts[i] = _ocr_text(self._ocr_result(pdf_path, page_numbers[i], future))
+            else:
+                page_texts[i] = future
+                futures.append(future)
+        return futures
+    
+    def _ocr_result(self, pdf_path: Union[str, bytes, memoryview], page_num: int,
+                    future: concurrent.futures.Future) -> List[Tuple]:
+        """Результат распознавания страницы; при ошибке движка страница остается пустой."""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(f"Не удалось распознать страницу {page_num} {_source_name(pdf_path)}: {e}")
+            self.metrics.incr("errors")
+            return []
+    
+    @staticmethod
+    def _is_blank(content: Union[str, List[TextBlock]]) -> bool:
+        """Страница без текста (кандидат на распознавание, если на ней есть изображения)."""
+        if isinstance(content, str):
+            return not content.strip()
+        return all(not block.text.strip() for block in content)
+    
+    def _ocr_stream(self, pdf_path: Union[str, bytes, memoryview],
+                    pages: Iterable[Tuple[int, Union[str, List[TextBlock]]]], with_metadata: bool
+                    ) -> Iterator[Tuple[int, Union[str, List[TextBlock]]]]:
+        """
+        Замена страниц без текстового слоя результатами распознавания.
+        
+        Страницы выдаются по порядку. Пока распознается страница, следующие
+        страницы продолжают извлекаться (не более 2 * max_workers страниц вперед).
+        """
+        pending = deque()
+        limit = self.max_workers * 2
+        
+        with ExitStack() as stack:
+            doc = None
+            for page_num, content in pages:
+                if self._is_blank(content):
+                    if doc is None:
+                        doc = stack.enter_context(self._document(pdf_path))
+                    if doc[page_num - 1].get_images():
+                        content = self._submit_ocr(pdf_path, page_num - 1)
+                pending.append((page_num, content))
+                
+                while pending and (not isinstance(pending[0][1], concurrent.futures.Future)
+                                   or pending[0][1].done() or len(pending) > limit):
+                    yield self._resolve_ocr_page(pdf_path, *pending.popleft(), with_metadata)
+            
+            while pending:
+                yield self._resolve_ocr_page(pdf_path, *pending.popleft(), with_metadata)
+    
+    def _ocr_table(self, pdf_path: Union[str, bytes, memoryview], indices: List[int],
+                   table: TextBlockTable, max_chars: Optional[int] = None,
+                   top_left: bool = True) -> TextBlockTable:
+        """
+        Добавление в таблицу блоков распознанных страниц без текстового слоя.
+        
+        Args:
+            max_chars: Лимит объема, с которым извлекалась таблица: страницы после
+                последней извлеченной при исчерпанном лимите не распознаются
+            top_left: Координаты таблицы отсчитываются от левого верхнего угла
+                (PyMuPDF); иначе распознанные строки переводятся в систему PDFMiner
+        """
+        present = set(table.page_num)
+        if max_chars is not None and table.char_count >= max_chars:
+            indices = [idx for idx in indices if idx < table.page_num[-1]]
+        blank = ((idx + 1, []) for idx in indices if idx + 1 not in present)
+        
+        ocr_table = TextBlockTable()
+        heights = {}
+        for page_num, blocks in self._ocr_stream(pdf_path, blank, True):
+            for block in blocks:
+                if not top_left:
+                    if page_num not in heights:
+                        with self._document(pdf_path) as doc:
+                            heights[page_num] = doc[page_num - 1].rect.height
+                    height = heights[page_num]
+                    block.y0, block.y1 = height - block.y1, height - block.y0
+                ocr_table.append(*astuple(block))
+        if not len(ocr_table):
+            return table
+        
+        # Распознанные страницы встают на свои места по номеру страницы
+        table.extend(ocr_table)
+        order = sorted(range(len(table)), key=table.page_num.__getitem__)
+        return table.take(order)
+    
+    def _apply_ocr(self, pdf_path: Union[str, bytes, memoryview], indices: List[int],
+                   page_texts: Iterable[str]) -> Iterator[str]:
+        """Текст страниц с заменой страниц без текстового слоя результатами распознавания."""
+        if self.ocr is None:
+            return iter(page_texts)
+        stream = self._ocr_stream(pdf_path, zip((idx + 1 for idx in indices), page_texts), False)
+        return (text for _, text in stream)
+    
+    def _resolve_ocr_page(self, pdf_path: Union[str, bytes, memoryview], page_num: int,
+                          content: Any, with_metadata: bool) -> Tuple[int, Union[str, List[TextBlock]]]:
+        """Страница потока _ocr_stream с ожиданием результата распознавания."""
+        if not isinstance(content, concurrent.futures.Future):
+            return page_num, content
+        rows = self._ocr_result(pdf_path, page_num, content)
+        return page_num, [TextBlock(*row) for row in rows] if with_metadata else _ocr_text(rows)
+    
+    def _cache_get(self, pdf_path: Union[str, bytes, memoryview], kind: str, backend: str,
+                   options: Optional[Dict[str, Any]] = None) -> Any:
+        """Чтение из кэша с учетом метрик cache_hits и cache_misses."""
+        value = self.cache.get(pdf_path, kind, backend, options=options)
+        self.metrics.incr("cache_misses" if value is None else "cache_hits")
+        return value
+    
+    def page_fingerprints(self, pdf_path: PDFSource, pages: PageSelection = None) -> List[str]:
+        """
+        Отпечатки страниц: хеши потоков содержимого и ресурсов страниц.
+        
+        Вычисляются без извлечения текста и отрисовки; у страницы, которая не
+        изменилась в новой версии документа, отпечаток тот же.
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое
+            pages: Страницы (None = все страницы)
+            
+        Returns:
+            List[str]: Отпечатки страниц в порядке выбора
+        """
+        pdf_path = _normalize_source(pdf_path)
+        with self._document(pdf_path) as doc:
+            return self._fingerprints(doc, _resolve_pages(pages, len(doc)))
+    
+    def _fingerprints(self, doc: fitz.Document, indices: List[int]) -> List[str]:
+        with self.metrics.timer("fingerprint"):
+            fingerprinter = _PageFingerprinter(doc)
+            return [fingerprinter.fingerprint(page_idx) for page_idx in indices]
+    
+    def page_diff(self, pdf_path: PDFSource, previous: Union[PDFSource, List[str], None] = None) -> PageDiff:
+        """
+        Постраничное сравнение документа с предыдущей версией.
+        
+        Args:
+            pdf_path: Новая версия документа
+            previous: Предыдущая версия (путь, содержимое или список отпечатков
+                страниц); None = отпечатки, сохраненные в кэше при последней
+                обработке файла pdf_path с page_reuse
+            
+        Returns:
+            PageDiff: Неизмененные, измененные, вставленные и удаленные страницы
+            
+        Raises:
+            ValueError: Если previous не указан, а в кэше нет отпечатков файла
+        """
+        if previous is None:
+            if self.cache is None or not isinstance(pdf_path, str):
+                raise ValueError("Предыдущая версия не указана, а кэш отпечатков недоступен")
+            previous = self.cache.get_page_fingerprints(pdf_path)
+            if previous is None:
+                raise ValueError(f"В кэше нет отпечатков страниц {pdf_path}")
+        elif not isinstance(previous, list):
+            previous = self.page_fingerprints(previous)
+        return diff_page_fingerprints(previous, self.page_fingerprints(pdf_path))
     
-    def __init__(self, use_multithreading: bool = True, max_workers: int = None):
+    def _reuse_pages(self, pdf_path: Union[str, bytes, memoryview], doc: fitz.Document, indices: List[int],
+                     kind: str, backend: str, options: Optional[Dict[str, Any]],
+                     extract: Callable[[List[int]], List[Any]]) -> List[Any]:
         """
-        Инициализация PDF парсера.
+        Результаты страниц с повторным использованием неизмененных страниц.
+        
+        Страницы, отпечатки которых есть в кэше, берутся из него, остальные
+        извлекаются функцией extract и сохраняются в кэш.
         
         Args:
-            use_multithreading: Использовать многопоточную обработку для больших файлов
-            max_workers: Максимальное количество потоков (None = автоматическое определение)
+            pdf_path: Путь к PDF-файлу или его содержимое
+            doc: Открытый документ
+            indices: Индексы страниц
+            kind: Вид результата (text, blocks)
+            backend: Бэкенд извлечения
+            options: Опции, от которых зависит результат
+            extract: Функция, возвращающая результаты для списка индексов страниц
+            
+        Returns:
+            List[Any]: Результаты страниц в порядке indices
         """
-        self.use_multithreading = use_multithreading
-        self.max_workers = max_workers or min(32, os.cpu_count() + 4)
-        logger.info(f"Инициализирован PDF Parser (многопоточность: {use_multithreading}, "
-                    f"потоков: {self.max_workers})")
+        fingerprints = self._fingerprints(doc, indices)
+        results = self.cache.get_pages(fingerprints, kind, backend, options)
+        missing = [pos for pos, value in enumerate(results) if value is None]
+        self.metrics.incr("pages_reused", len(indices) - len(missing))
+        logger.info(f"{_source_name(pdf_path)}: страниц из кэша {len(indices) - len(missing)}, "
+                    f"к извлечению {len(missing)}")
+        
+        if missing:
+            extracted = extract([indices[pos] for pos in missing])
+            for pos, value in zip(missing, extracted):
+                results[pos] = value
+            self.cache.put_pages([fingerprints[pos] for pos in missing], kind, backend, extracted, options)
+        if isinstance(pdf_path, str) and len(indices) == len(doc):
+            self.cache.put_page_fingerprints(pdf_path, fingerprints)
+        return results
     
-    def extract_text(self, pdf_path: str) -> str:
+    def extract_text(self, pdf_path: PDFSource, pages: PageSelection = None,
+                     max_chars: Optional[int] = None, reading_order: bool = False) -> str:
         """
         Быстрое извлечение текста из PDF-файла.
         
         Args:
-            pdf_path: Путь к PDF-файлу
+            pdf_path: Путь к PDF-файлу или его содержимое (bytes, bytearray,
+                memoryview, mmap, файловый объект)
+            pages: Извлекаемые страницы: номер, range, slice или строка
+                вида "1-3,10" (None = все страницы)
+            max_chars: Прекратить извлечение, набрав указанное количество символов
+            reading_order: Восстановить порядок чтения (многоколоночная верстка,
+                колонтитулы в начале и конце страницы) по координатам блоков
             
         Returns:
             str: Извлеченный текст
         """
         try:
             start_time = time.time()
-            logger.info(f"Начало извлечения текста из {pdf_path}")
+            pdf_path = _normalize_source(pdf_path)
+            logger.info(f"Начало извлечения текста из {_source_name(pdf_path)}")
+            
+            if reading_order:
+                table, lines = self._extract_reading_order(pdf_path, pages, max_chars)
+                page_texts = [text for _, text in _ordered_page_texts(table, lines)]
+                text = "".join(_limit_chars(page_texts, max_chars))
+                logger.info(f"Извлечение завершено за {time.time() - start_time:.2f} секунд. "
+                            f"Объем текста: {len(text)} символов")
+                return text
+            
+            if self.cache is not None:
+                cached = self._cache_get(pdf_path, "text", "pymupdf")
+                if cached is not None:
+                    logger.info(f"Текст {_source_name(pdf_path)} получен из кэша")
+                    indices = _resolve_pages(pages, len(cached))
+                    page_texts = self._apply_ocr(pdf_path, indices, (cached[idx] for idx in indices))
+                    return "".join(_limit_chars(page_texts, max_chars))
+            
+            if max_chars is not None:
+                # Страницы извлекаются потоком, чтобы остановиться сразу после набора лимита
+                stream = self.iter_pages(pdf_path, pages=pages)
+                try:
+                    text = "".join(_limit_chars((page for _, page in stream), max_chars))
+                finally:
+                    stream.close()
+                logger.info(f"Извлечение завершено за {time.time() - start_time:.2f} секунд. "
+                            f"Объем текста: {len(text)} символов")
+                return text
             
             # Используем PyMuPDF (fitz) для быстрого извлечения
-            doc = fitz.open(pdf_path)
-            total_pages = len(doc)
+            with self._document(pdf_path) as doc:
+                indices = _resolve_pages(pages, len(doc))
+                if self.page_reuse:
+                    page_texts = self._reuse_pages(
+                        pdf_path, doc, indices, "text", "pymupdf", None,
+                        lambda missing: self._extract_page_texts(pdf_path, doc, missing))
+                else:
+                    page_texts = self._extract_page_texts(pdf_path, doc, indices)
             
-            if total_pages > 100 and self.use_multithreading:
-                # Для больших документов используем многопоточную обработку
-                return self._extract_text_multithread(doc)
-            else:
-                # Для небольших документов - однопоточная обработка
-                text = ""
-                for page in tqdm(doc, total=total_pages, desc="Извлечение текста"):
-                    text += page.get_text()
+            with self.metrics.timer("reassembly"):
+                text = "".join(page_texts)
+            if self.metrics.enabled:
+                self.metrics.incr("pages", len(page_texts))
+                self.metrics.incr("chars", len(text))
+            if self.cache is not None and pages is None:
+                # В кэш попадает только документ целиком, выборки строятся из него
+                # (текстовый слой; результаты распознавания кэшируются отдельно)
+                self.cache.put(pdf_path, "text", "pymupdf", page_texts)
+            if self.ocr is not None:
+                text = "".join(self._apply_ocr(pdf_path, indices, page_texts))
             
-            doc.close()
             elapsed = time.time() - start_time
             logger.info(f"Извлечение завершено за {elapsed:.2f} секунд. "
                          f"Объем текста: {len(text)} символов")
@@ -96,182 +4752,1285 @@ class PDFParser:
             logger.error(f"Ошибка при извлечении текста: {str(e)}")
             raise
     
-    def _extract_text_multithread(self, doc: fitz.Document) -> str:
+    def _extract_page_texts(self, pdf_path: Union[str, bytes, memoryview], doc: fitz.Document,
+                            indices: List[int]) -> List[str]:
+        """Текст страниц открытого документа в исходном порядке."""
+        if len(indices) > 100 and self.use_multithreading and self.mode != "thread":
+            # Документ откроют дочерние процессы
+            with self.metrics.timer("extract"):
+                return self._extract_text_multiprocess(pdf_path, indices)
+        if len(indices) > 100 and self.use_multithreading:
+            # Для больших документов используем многопоточную обработку
+            with self.metrics.timer("extract"):
+                return self._extract_text_multithread(doc, indices)
+        
+        # Для небольших документов - однопоточная обработка
+        timer = self.metrics.timer
+        page_texts = []
+        for page_idx in self._progress(indices, desc="Извлечение текста"):
+            with timer("extract"):
+                page_texts.append(doc[page_idx].get_text())
+        return page_texts
+    
+    def _extract_text_multithread(self, doc: fitz.Document, indices: List[int]) -> List[str]:
         """
         Многопоточное извлечение текста для больших PDF-файлов.
         
         Args:
             doc: Открытый PDF-документ
+            indices: Индексы извлекаемых страниц
             
         Returns:
-            str: Извлеченный текст
+            List[str]: Текст страниц в исходном порядке
         """
-        total_pages = len(doc)
-        logger.info(f"Запуск многопоточного извлечения для документа с {total_pages} страницами")
-        results = [""] * total_pages
+        logger.info(f"Запуск многопоточного извлечения для {len(indices)} страниц")
+        results = [""] * len(indices)
         
-        def process_page(page_idx):
-            page = doc[page_idx]
-            return page_idx, page.get_text()
+        def process_page(pos):
+            page = doc[indices[pos]]
+            return pos, page.get_text()
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = [executor.submit(process_page, i) for i in range(total_pages)]
+            futures = [executor.submit(process_page, pos) for pos in range(len(indices))]
             
-            for future in tqdm(
+            for future in self._progress(
                 concurrent.futures.as_completed(futures),
                 total=len(futures),
                 desc="Извлечение текста"
             ):
-                page_idx, text = future.result()
-                results[page_idx] = text
+                pos, text = future.result()
+                results[pos] = text
         
-        return "".join(results)
+        return results
     
-    def extract_text_with_metadata(self, pdf_path: str, detailed: bool = False) -> List[TextBlock]:
+    def _extract_text_multiprocess(self, pdf_path: Union[str, bytes, memoryview],
+                                   indices: List[int]) -> List[str]:
         """
-        Извлечение текста с сохранением метаданных (позиция, шрифт и др.)
+        Извлечение текста в пуле процессов: каждый процесс открывает файл
+        и обрабатывает свой непрерывный диапазон страниц.
         
         Args:
             pdf_path: Путь к PDF-файлу
+            indices: Индексы извлекаемых страниц
+            
+        Returns:
+            List[str]: Текст страниц в исходном порядке
+        """
+        ranges = _split_page_ranges(indices, self.max_workers)
+        logger.info(f"Запуск извлечения в {min(len(ranges), self.max_workers)} процессах "
+                    f"для {len(indices)} страниц")
+        results = self._run_in_pool(_extract_text_range, pdf_path, ranges)
+        return [text for chunk in results for text in chunk]
+    
+    def _run_in_pool(self, func, pdf_path: Union[str, bytes, memoryview], tasks: List[Tuple]) -> List[Any]:
+        """
+        Выполнение функции над частями документа в пуле процессов
+        (или потоков в режиме "thread"; каждая задача открывает файл сама).
+        
+        Args:
+            func: Функция уровня модуля с сигнатурой (pdf_path, *task),
+                например (pdf_path, start, stop) для диапазонов страниц
+            pdf_path: Путь к PDF-файлу или его содержимое
+            tasks: Аргументы задач
+            
+        Returns:
+            List[Any]: Результаты в порядке задач
+        """
+        results = [None] * len(tasks)
+        if not tasks:
+            return results
+        
+        workers = min(len(tasks), self.max_workers)
+        with self._executor_cls(pdf_path)(max_workers=workers) as executor:
+            future_to_idx = {
+                executor.submit(func, pdf_path, *task): idx
+                for idx, task in enumerate(tasks)
+            }
+            
+            for future in self._progress(
+                concurrent.futures.as_completed(future_to_idx),
+                total=len(future_to_idx),
+                desc="Извлечение текста"
+            ):
+                results[future_to_idx[future]] = future.result()
+        
+        return results
+    
+    def iter_pages(self, pdf_path: PDFSource, with_metadata: bool = False,
+                   read_ahead: Optional[int] = None, pages: PageSelection = None
+                   ) -> Iterator[Tuple[int, Union[str, List[TextBlock]]]]:
+        """
+        Потоковое извлечение текста: страницы выдаются по мере готовности,
+        без накопления всего документа в памяти.
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое
+            with_metadata: Выдавать списки TextBlock вместо строк
+            read_ahead: Максимальное количество страниц, извлекаемых заранее
+                при параллельной обработке (None = 2 задачи на поток)
+            pages: Извлекаемые страницы (None = все страницы)
+            
+        Yields:
+            Tuple[int, Union[str, List[TextBlock]]]: Номер страницы (с единицы)
+                и ее текст или блоки текста
+        """
+        pdf_path = _normalize_source(pdf_path)
+        stream = self._iter_layer_pages(pdf_path, "blocks" if with_metadata else "text", read_ahead, pages)
+        if self.ocr is not None:
+            stream = self._ocr_stream(pdf_path, stream, with_metadata)
+        yield from stream
+    
+    def iter_chunks(self, pdf_path: PDFSource, chunker: Optional[TextChunker] = None,
+                    pages: PageSelection = None, read_ahead: Optional[int] = None,
+                    path: Optional[str] = None) -> Iterator[TextChunk]:
+        """
+        Потоковое разбиение документа на фрагменты для эмбеддингов.
+        
+        Страницы извлекаются по абзацам (блокам PyMuPDF) и разбиваются по мере
+        готовности, поэтому память не зависит от размера документа.
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое
+            chunker: Параметры разбиения (None = TextChunker() по умолчанию)
+            pages: Извлекаемые страницы (None = все страницы)
+            read_ahead: Максимальное количество страниц, извлекаемых заранее
+            path: Путь, записываемый во фрагменты (по умолчанию pdf_path, если это путь)
+            
+        Yields:
+            TextChunk: Фрагменты с номерами страниц и прямоугольниками блоков
+        """
+        pdf_path = _normalize_source(pdf_path)
+        chunker = chunker or TextChunker()
+        if path is None and isinstance(pdf_path, str):
+            path = pdf_path
+        stream = self._iter_layer_pages(pdf_path, "paragraphs", read_ahead, pages)
+        if self.ocr is not None:
+            stream = self._ocr_stream(pdf_path, stream, True)
+        yield from chunker.chunks(stream, path)
+    
+    def _iter_layer_pages(self, pdf_path: Union[str, bytes, memoryview], kind: str,
+                          read_ahead: Optional[int], pages: PageSelection
+                          ) -> Iterator[Tuple[int, Union[str, List[TextBlock]]]]:
+        """
+        Потоковое извлечение текстового слоя страниц (без распознавания).
+        
+        Args:
+            kind: Содержимое страницы: "text" (строка), "blocks" (span'ы) или
+                "paragraphs" (абзацы)
+        """
+        if self.cache is not None and kind == "text":
+            cached = self._cache_get(pdf_path, "text", "pymupdf")
+            if cached is not None:
+                for page_idx in _resolve_pages(pages, len(cached)):
+                    yield page_idx + 1, cached[page_idx]
+                return
+        
+        with self._document(pdf_path) as doc:
+            indices = _resolve_pages(pages, len(doc))
+            
+            if len(indices) <= 100 or not self.use_multithreading:
+                for page_idx in indices:
+                    page = doc[page_idx]
+                    if kind == "blocks":
+                        result = _page_to_blocks(page, page_idx, self.metrics)
+                    else:
+                        with self.metrics.timer("extract"):
+                            result = (_page_to_paragraphs(page, page_idx) if kind == "paragraphs"
+                                      else page.get_text())
+                    self.metrics.incr("pages")
+                    yield page_idx + 1, result
+                return
+        
+        yield from self._iter_pages_parallel(pdf_path, indices, kind, read_ahead)
+    
+    def _iter_pages_parallel(self, pdf_path: Union[str, bytes, memoryview], indices: List[int],
+                             kind: str,
+                             read_ahead: Optional[int]
+                             ) -> Iterator[Tuple[int, Union[str, List[TextBlock]]]]:
+        """
+        Параллельное потоковое извлечение с ограниченным упреждением.
+        
+        Документ делится на небольшие диапазоны страниц; в работе одновременно
+        находится не более read_ahead страниц, результаты выдаются строго по порядку.
+        Каждая задача открывает файл самостоятельно, поэтому в режиме "thread"
+        потоки не разделяют один fitz.Document.
+        """
+        if read_ahead is None:
+            max_in_flight = self.max_workers * 2
+        else:
+            max_in_flight = max(1, read_ahead // STREAM_CHUNK_PAGES)
+        
+        func = {"text": _extract_text_range, "blocks": _extract_blocks_range,
+                "paragraphs": _extract_paragraphs_range}[kind]
+        ranges = iter(_contiguous_runs(indices, STREAM_CHUNK_PAGES))
+        executor = self._executor_cls(pdf_path)(max_workers=self.max_workers)
+        pending = deque()
+        try:
+            for start, stop in ranges:
+                pending.append((start, executor.submit(func, pdf_path, start, stop)))
+                if len(pending) >= max_in_flight:
+                    break
+            
+            while pending:
+                start, future = pending.popleft()
+                with self.metrics.timer("extract"):
+                    chunk = future.result()
+                self.metrics.incr("pages", len(chunk))
+                
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append((next_range[0], executor.submit(func, pdf_path, *next_range)))
+                
+                for offset, page in enumerate(chunk):
+                    yield start + offset + 1, page
+        finally:
+            # При досрочном закрытии генератора не ждем ненужные страницы
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    def extract_text_with_metadata(self, pdf_path: PDFSource, detailed: bool = False,
+                                   columnar: bool = False, pages: PageSelection = None,
+                                   max_chars: Optional[int] = None, reading_order: bool = False
+                                   ) -> Union[List[TextBlock], TextBlockTable]:
+        """
+        Извлечение текста с сохранением метаданных (позиция, шрифт и др.)
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое
             detailed: Использовать более детальное извлечение (медленнее, но точнее)
+            columnar: Вернуть колоночную таблицу TextBlockTable вместо списка
+                (значительно меньше памяти на документах с миллионами span'ов)
+            pages: Извлекаемые страницы (None = все страницы)
+            max_chars: Прекратить извлечение на странице, где суммарный текст
+                блоков достиг указанного количества символов
+            reading_order: Упорядочить блоки в порядке чтения (колонки, строки)
+                и заполнить block_type: heading, body, header, footer, caption
             
         Returns:
-            List[TextBlock]: Список блоков текста с метаданными
+            Union[List[TextBlock], TextBlockTable]: Блоки текста с метаданными
+            
+        Raises:
+            ValueError: Если reading_order указан вместе с detailed
         """
-        logger.info(f"Начало извлечения текста с метаданными из {pdf_path}")
-        start_time = time.time()
+        if reading_order:
+            if detailed:
+                raise ValueError("Порядок чтения восстанавливается только для блоков PyMuPDF")
+            table, _ = self._extract_reading_order(pdf_path, pages, max_chars)
+            return table if columnar else table.to_blocks()
+        
+        pdf_path = _normalize_source(pdf_path)
+        logger.info(f"Начало извлечения текста с метаданными из {_source_name(pdf_path)}")
+        backend = "pdfminer" if detailed else "pymupdf"
+        # Результат PDFMiner зависит от параметров анализа разметки
+        options = {"laparams": self.laparams} if detailed else None
+        # В кэше хранится только документ целиком
+        use_cache = self.cache is not None and pages is None and max_chars is None
+        
+        table = None
+        if use_cache:
+            rows = self._cache_get(pdf_path, "blocks", backend, options)
+            if rows is not None:
+                logger.info(f"Блоки текста {_source_name(pdf_path)} получены из кэша")
+                if self.ocr is None:
+                    # Документ при попадании в кэш не открывается
+                    return TextBlockTable.from_blocks(rows) if columnar else [TextBlock(*row) for row in rows]
+                table = TextBlockTable.from_blocks(rows)
+        
+        with self._document(pdf_path) as doc:
+            indices = _resolve_pages(pages, len(doc))
         
-        if detailed:
+        if table is None and self.page_reuse and max_chars is None:
+            def extract(missing: List[int]) -> List[List[Tuple]]:
+                if detailed:
+                    rows = [astuple(block) for block in self._extract_with_pdfminer(pdf_path, missing)]
+                else:
+                    rows = self._extract_with_pymupdf(pdf_path, missing).rows()
+                return _rows_by_page(missing, rows)
+            
+            with self._document(pdf_path) as doc:
+                page_rows = self._reuse_pages(pdf_path, doc, indices, "blocks", backend, options, extract)
+            # Страница могла сместиться относительно версии, из которой взята
+            rows = [(row[0], page_idx + 1, *row[2:]) for page_idx, chunk in zip(indices, page_rows) for row in chunk]
+            if use_cache:
+                self.cache.put(pdf_path, "blocks", backend, rows, options=options)
+            table = TextBlockTable.from_blocks(rows)
+            if self.ocr is None:
+                return table if columnar else table.to_blocks()
+        
+        if table is None and detailed:
             # Используем PDFMiner для более точного извлечения
-            return self._extract_with_pdfminer(pdf_path)
-        else:
+            blocks = self._extract_with_pdfminer(pdf_path, indices, max_chars)
+            if use_cache:
+                self.cache.put(pdf_path, "blocks", backend, [astuple(block) for block in blocks], options=options)
+            if self.ocr is None:
+                return TextBlockTable.from_blocks(blocks) if columnar else blocks
+            table = TextBlockTable.from_blocks(blocks)
+        
+        if table is None:
             # Используем PyMuPDF (быстрее)
-            return self._extract_with_pymupdf(pdf_path)
+            table = self._extract_with_pymupdf(pdf_path, indices, max_chars)
+            if use_cache:
+                self.cache.put(pdf_path, "blocks", backend, list(table.rows()))
+        
+        if self.ocr is not None:
+            table = self._ocr_table(pdf_path, indices, table, max_chars, top_left=not detailed)
+        return table if columnar else table.to_blocks()
+    
+    def _extract_reading_order(self, pdf_path: PDFSource, pages: PageSelection = None,
+                               max_chars: Optional[int] = None) -> Tuple[TextBlockTable, List[int]]:
+        """
+        Извлечение блоков в порядке чтения.
+        
+        Returns:
+            Tuple[TextBlockTable, List[int]]: Упорядоченные блоки и номер строки каждого блока
+        """
+        pdf_path = _normalize_source(pdf_path)
+        table = self.extract_text_with_metadata(pdf_path, columnar=True, pages=pages, max_chars=max_chars)
+        with self._document(pdf_path) as doc:
+            page_heights = {page_num: doc.page_cropbox(page_num - 1).height for page_num in set(table.page_num)}
+        with self.metrics.timer("layout"):
+            return _apply_reading_order(table, page_heights)
     
-    def _extract_with_pymupdf(self, pdf_path: str) -> List[TextBlock]:
+    def _extract_with_pymupdf(self, pdf_path: Union[str, bytes, memoryview], indices: List[int],
+                              max_chars: Optional[int] = None) -> TextBlockTable:
         """
         Извлечение текста с метаданными с помощью PyMuPDF.
         
         Args:
             pdf_path: Путь к PDF-файлу
+            indices: Индексы извлекаемых страниц
+            max_chars: Ограничение на суммарный текст блоков (None = без ограничения)
             
         Returns:
-            List[TextBlock]: Список блоков текста с метаданными
+            TextBlockTable: Колоночная таблица блоков текста
         """
-        blocks = []
-        doc = fitz.open(pdf_path)
-        
-        for page_idx, page in enumerate(tqdm(doc, desc="Извлечение блоков текста")):
-            blocks_dict = page.get_text("dict")
-            
-            for block in blocks_dict["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            blocks.append(TextBlock(
-                                text=span["text"],
-                                page_num=page_idx + 1,
-                                x0=span["bbox"][0],
-                                y0=span["bbox"][1],
-                                x1=span["bbox"][2],
-                                y1=span["bbox"][3],
-                                font=span["font"],
-                                font_size=span["size"],
-                                block_type="text"
-                            ))
-        
-        doc.close()
-        logger.info(f"Извлечено {len(blocks)} текстовых блоков за "
+        start_time = time.time()
+        
+        if (len(indices) > 100 and self.use_multithreading and self.mode != "thread"
+                and max_chars is None):
+            ranges = _split_page_ranges(indices, self.max_workers)
+            # Таблицы передаются между процессами компактно: несколько массивов и одна строка
+            table = TextBlockTable()
+            with self.metrics.timer("extract"):
+                chunks = self._run_in_pool(_extract_table_range, pdf_path, ranges)
+            with self.metrics.timer("reassembly"):
+                for chunk in chunks:
+                    table.extend(chunk)
+            self.metrics.incr("pages", len(indices))
+            self.metrics.incr("spans", len(table))
+        else:
+            table = TextBlockTable()
+            with self._document(pdf_path) as doc:
+                for page_idx in self._progress(indices, desc="Извлечение блоков текста"):
+                    _page_to_table(doc[page_idx], page_idx, table, self.metrics)
+                    self.metrics.incr("pages")
+                    if max_chars is not None and table.char_count >= max_chars:
+                        break
+        
+        logger.info(f"Извлечено {len(table)} текстовых блоков за "
                      f"{time.time() - start_time:.2f} секунд")
-        return blocks
+        return table
     
-    def _extract_with_pdfminer(self, pdf_path: str) -> List[TextBlock]:
+    def _extract_with_pdfminer(self, pdf_path: Union[str, bytes, memoryview], indices: List[int],
+                               max_chars: Optional[int] = None) -> List[TextBlock]:
         """
         Извлечение текста с метаданными с помощью PDFMiner (более точное).
         
         Args:
             pdf_path: Путь к PDF-файлу
+            indices: Индексы извлекаемых страниц
+            max_chars: Ограничение на суммарный текст блоков (None = без ограничения)
             
         Returns:
             List[TextBlock]: Список блоков текста с метаданными
         """
+        start_time = time.time()
         blocks = []
+        total_chars = 0
+        
+        if self.use_multithreading and len(indices) > PDFMINER_SHARD_PAGES:
+            pages = self._pdfminer_shards(pdf_path, indices)
+        else:
+            pages = self._pdfminer_serial(pdf_path, indices)
         
-        for page_layout in extract_pages(pdf_path):
-            page_num = page_layout.pageid
-            
-            for element in page_layout:
-                if isinstance(element, LTTextBox):
-                    for text_line in element:
-                        if isinstance(text_line, LTTextLine):
-                            blocks.append(TextBlock(
-                                text=text_line.get_text().strip(),
-                                page_num=page_num,
-                                x0=text_line.bbox[0],
-                                y0=text_line.bbox[1],
-                                x1=text_line.bbox[2],
-                                y1=text_line.bbox[3],
-                                block_type="text"
-                            ))
+        try:
+            for page_blocks in pages:
+                self.metrics.incr("pages")
+                self.metrics.incr("spans", len(page_blocks))
+                blocks.extend(page_blocks)
+                total_chars += sum(len(block.text) for block in page_blocks)
+                
+                if max_chars is not None and total_chars >= max_chars:
+                    break
+        finally:
+            pages.close()
         
         logger.info(f"Извлечено {len(blocks)} текстовых блоков с PDFMiner за "
                      f"{time.time() - start_time:.2f} секунд")
         return blocks
     
-    def batch_process(self, pdf_files: List[str]) -> Dict[str, str]:
+    def _pdfminer_serial(self, pdf_path: Union[str, bytes, memoryview],
+                         indices: List[int]) -> Iterator[List[TextBlock]]:
+        """Блоки страниц, извлеченные PDFMiner в текущем потоке."""
+        with _pdfminer_document(pdf_path) as document:
+            layouts = document.layouts(indices, self.laparams)
+            for page_idx in indices:
+                with self.metrics.timer("extract"):
+                    page = next(layouts, None)
+                if page is None:
+                    return
+                with self.metrics.timer("blocks"):
+                    yield _layout_to_blocks(page[1], page_idx + 1)
+    
+    def _pdfminer_shards(self, pdf_path: Union[str, bytes, memoryview],
+                         indices: List[int]) -> Iterator[List[TextBlock]]:
+        """
+        Блоки страниц, извлеченные PDFMiner в пуле: индексы делятся на части
+        по PDFMINER_SHARD_PAGES страниц, результаты возвращаются по порядку.
+        
+        PDFMiner написан на чистом Python, поэтому файлы на диске разбираются
+        в пуле процессов и в режиме "thread". Процесс пула разбирает структуру
+        документа один раз и использует ее во всех своих задачах. В пуле
+        одновременно находится не больше двух задач на процесс, так что при
+        ограничении max_chars лишние части не извлекаются.
+        """
+        shards = [indices[i:i + PDFMINER_SHARD_PAGES] for i in range(0, len(indices), PDFMINER_SHARD_PAGES)]
+        if isinstance(pdf_path, str):
+            workers = self.max_workers if self.mode != "thread" else os.cpu_count() or 1
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(len(shards), workers), initializer=_init_pdfminer_worker)
+        else:
+            workers = self.max_workers
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(shards), workers))
+        
+        pending = deque()
+        remaining = deque(shards)
+        try:
+            with self._progress(None, total=len(indices), desc="Извлечение текста PDFMiner") as progress:
+                while pending or remaining:
+                    while remaining and len(pending) < workers * 2:
+                        pending.append(executor.submit(
+                            _extract_pdfminer_pages, pdf_path, remaining.popleft(), False, self.laparams))
+                    with self.metrics.timer("extract"):
+                        results = pending.popleft().result()
+                    for page_blocks, _ in results:
+                        progress.update(1)
+                        yield page_blocks
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    def extract_text_hybrid(self, pdf_path: PDFSource, pages: PageSelection = None
+                            ) -> Tuple[List[TextBlock], List[PageReport]]:
+        """
+        Гибридное извлечение: все страницы обрабатываются PyMuPDF, и только
+        страницы с признаками плохого качества (пустой текстовый слой,
+        нераспознанные символы, перекрывающиеся span'ы) повторно извлекаются
+        PDFMiner в пуле процессов или потоков.
+        
+        Координаты блоков PDFMiner переводятся в систему PyMuPDF (начало
+        в левом верхнем углу), чтобы блоки разных страниц были сопоставимы.
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое
+            pages: Извлекаемые страницы (None = все страницы)
+            
+        Returns:
+            Tuple[List[TextBlock], List[PageReport]]: Блоки текста и отчет по
+                каждой странице: использованный бэкенд, время и найденные проблемы
+        """
+        pdf_path = _normalize_source(pdf_path)
+        logger.info(f"Начало гибридного извлечения текста из {_source_name(pdf_path)}")
+        start_time = time.time()
+        use_cache = self.cache is not None and pages is None
+        
+        if use_cache:
+            cached = self._cache_get(pdf_path, "blocks", "hybrid", {"laparams": self.laparams})
+            if cached is not None:
+                logger.info(f"Блоки текста {_source_name(pdf_path)} получены из кэша")
+                return ([TextBlock(*row) for row in cached["blocks"]],
+                        [PageReport(*row) for row in cached["reports"]])
+        
+        with self._document(pdf_path) as doc:
+            indices = _resolve_pages(pages, len(doc))
+            
+            with self.metrics.timer("extract"):
+                if len(indices) > 100 and self.use_multithreading:
+                    ranges = _split_page_ranges(indices, self.max_workers)
+                    chunks = self._run_in_pool(_hybrid_pymupdf_range, pdf_path, ranges)
+                else:
+                    chunks = [_hybrid_pymupdf_pages(doc, indices)]
+        self.metrics.incr("pages", len(indices))
+        
+        page_blocks = {}
+        reports = {}
+        for page_idx, (blocks, elapsed, issues) in zip(indices, (page for chunk in chunks for page in chunk)):
+            page_blocks[page_idx] = blocks
+            reports[page_idx] = PageReport(page_idx + 1, "pymupdf", elapsed, issues=issues)
+        
+        flagged = [page_idx for page_idx in indices if reports[page_idx].issues]
+        if flagged:
+            logger.info(f"Повторное извлечение PDFMiner для {len(flagged)} из {len(indices)} страниц")
+            self.metrics.incr("fallbacks", len(flagged))
+            
+            if len(flagged) > 1 and self.use_multithreading:
+                size = -(-len(flagged) // self.max_workers)
+                parts = [flagged[i:i + size] for i in range(0, len(flagged), size)]
+                results = self._run_in_pool(_extract_pdfminer_pages, pdf_path,
+                                            [(part, True, self.laparams) for part in parts])
+            else:
+                parts = [flagged]
+                results = [_extract_pdfminer_pages(pdf_path, flagged, True, self.laparams)]
+            
+            for part, chunk in zip(parts, results):
+                for page_idx, (blocks, elapsed) in zip(part, chunk):
+                    report = reports[page_idx]
+                    report.pdfminer_time = elapsed
+                    # Результат PDFMiner используется, только если он содержит текст
+                    if any(block.text for block in blocks):
+                        page_blocks[page_idx] = blocks
+                        report.backend = "pdfminer"
+        
+        with self.metrics.timer("reassembly"):
+            blocks = [block for page_idx in indices for block in page_blocks[page_idx]]
+            reports = [reports[page_idx] for page_idx in indices]
+        self.metrics.incr("spans", len(blocks))
+        
+        if use_cache:
+            self.cache.put(pdf_path, "blocks", "hybrid", {
+                "blocks": [astuple(block) for block in blocks],
+                "reports": [astuple(report) for report in reports],
+            }, options={"laparams": self.laparams})
+        
+        logger.info(f"Извлечено {len(blocks)} текстовых блоков за "
+                    f"{time.time() - start_time:.2f} секунд "
+                    f"(PDFMiner: {sum(report.backend == 'pdfminer' for report in reports)} страниц)")
+        return blocks, reports
+    
+    def batch_process(self, pdf_files: List[str], pages: PageSelection = None,
+                      max_chars: Optional[int] = None,
+                      sink: Optional[ResultSink] = None,
+                      index: Optional[SearchIndex] = None,
+                      reading_order: bool = False,
+                      dedup: Optional[DuplicateIndex] = None,
+                      skip_duplicates: bool = False,
+                      structured: bool = False) -> Optional[Dict[str, Union[str, BatchResult]]]:
         """
         Пакетная обработка нескольких PDF-файлов.
         
         Args:
             pdf_files: Список путей к PDF-файлам
+            pages: Извлекаемые страницы каждого файла (None = все страницы)
+            max_chars: Ограничение на объем текста каждого файла
+            sink: Приемник результатов; если указан, результаты записываются
+                в него по мере готовности и в памяти не накапливаются
+            index: Полнотекстовый индекс, в который добавляется текст каждого
+                обработанного файла по страницам
+            reading_order: Восстанавливать порядок чтения (см. extract_text)
+            dedup: Индекс дубликатов, в который добавляется каждый обработанный
+                файл; BatchResult.cluster и duplicate_of заполняются. Побайтно
+                одинаковые файлы пакета извлекаются один раз
+            skip_duplicates: Не передавать дубликаты в sink, index и результат;
+                файлы, побайтно совпадающие с ранее добавленными в dedup, не извлекаются
+            structured: Возвращать BatchResult для каждого файла, а не только
+                для необработанных
             
         Returns:
-            Dict[str, str]: Словарь {путь_к_файлу: извлеченный_текст}
+            Optional[Dict[str, Union[str, BatchResult]]]: Словарь {путь_к_файлу:
+                извлеченный_текст}; для необработанных файлов значение — BatchResult
+                с описанием ошибки. При structured — словарь {путь_к_файлу:
+                BatchResult}. None, если указан sink
         """
         logger.info(f"Начало пакетной обработки {len(pdf_files)} файлов")
         start_time = time.time()
         
-        results = {}
+        results = {} if sink is None else None
+        
+        def deliver(result: BatchResult) -> None:
+            self.metrics.incr("files")
+            if not result.ok:
+                self.metrics.incr("errors")
+            elif result.duplicate_of is not None:
+                self.metrics.incr("duplicates")
+                if skip_duplicates:
+                    if sink is not None:
+                        sink.skip(result)
+                    return
+            if result.ok and index is not None:
+                with self.metrics.timer("index"):
+                    index.add(result.path, result.pages)
+            result.pages = None
+            if sink is not None:
+                with self.metrics.timer("output"):
+                    sink.write(result)
+            else:
+                results[result.path] = result if structured or not result.ok else result.text
+        
+        digests: Dict[str, str] = {}
+        copies: Dict[str, List[str]] = {}  # файл -> побайтно совпадающие с ним файлы пакета
+        if dedup is not None:
+            pdf_files, digests, copies = self._plan_dedup(pdf_files, dedup, skip_duplicates, deliver)
+        
+        for result in self.iter_batch(pdf_files, pages, max_chars,
+                                      with_pages=index is not None or dedup is not None,
+                                      reading_order=reading_order):
+            duplicates = []
+            if dedup is not None and result.ok:
+                with self.metrics.timer("dedup"):
+                    match = dedup.add(result.path, result.pages, digests.get(result.path))
+                    result.cluster, result.duplicate_of = match.cluster, match.duplicate_of
+                    for copy in copies.get(result.path, ()):
+                        copy_match = dedup.add(copy, (), digests[copy])
+                        duplicates.append(BatchResult(copy, result.text, pages=result.pages,
+                                                      cluster=copy_match.cluster,
+                                                      duplicate_of=copy_match.duplicate_of))
+            else:
+                duplicates = [BatchResult(copy, error=result.error, error_type=result.error_type)
+                              for copy in copies.get(result.path, ())]
+            deliver(result)
+            for duplicate in duplicates:
+                deliver(duplicate)
+        
+        if index is not None:
+            index.flush()
+        if dedup is not None:
+            dedup.flush()
+        
+        logger.info(f"Пакетная обработка завершена за {time.time() - start_time:.2f} секунд")
+        return results
+    
+    def _plan_dedup(self, pdf_files: List[str], dedup: DuplicateIndex, skip_duplicates: bool,
+                    deliver: Callable[[BatchResult], None]) -> Tuple[List[str], Dict[str, str], Dict[str, List[str]]]:
+        """
+        Поиск побайтно одинаковых файлов по хешу содержимого до извлечения.
+        
+        Из каждой группы одинаковых файлов пакета извлекается только первый.
+        При skip_duplicates не извлекаются файлы, которые по хешу содержимого
+        уже известны dedup как дубликаты (см. DuplicateIndex.lookup):
+        результаты для них сразу передаются в deliver.
+        
+        Returns:
+            Tuple[List[str], Dict[str, str], Dict[str, List[str]]]: Файлы для
+                извлечения, хеши файлов и копии каждого извлекаемого файла
+        """
+        to_extract = []
+        digests: Dict[str, str] = {}
+        copies: Dict[str, List[str]] = {}
+        first: Dict[str, str] = {}
+        with self.metrics.timer("dedup"):
+            for file in pdf_files:
+                try:
+                    digest = _file_digest(file)
+                except OSError:
+                    # Ошибку чтения сообщит извлечение
+                    to_extract.append(file)
+                    continue
+                digests[file] = digest
+                if digest in first and first[digest] in copies:
+                    copies[first[digest]].append(file)
+                    continue
+                if digest not in first:
+                    first[digest] = file
+                    known = dedup.lookup(file, digest) if skip_duplicates else None
+                    if known is None or known.duplicate_of is None:
+                        copies[file] = []
+                        to_extract.append(file)
+                        continue
+                # Дубликат, известный по прошлым запускам
+                match = dedup.add(file, (), digest)
+                deliver(BatchResult(file, "", cluster=match.cluster, duplicate_of=match.duplicate_of))
+        return to_extract, digests, copies
+    
+    def iter_batch(self, pdf_files: List[str], pages: PageSelection = None,
+                   max_chars: Optional[int] = None, with_pages: bool = False,
+                   reading_order: bool = False) -> Iterator[BatchResult]:
+        """
+        Пакетная обработка с выдачей результатов по мере готовности файлов.
+        
+        При многопоточной обработке порядок результатов соответствует порядку
+        завершения, а не порядку pdf_files. Ошибки не прерывают обработку
+        и выдаются как BatchResult с заполненными error и error_type. В режиме
+        "isolated" файл, из-за которого процесс обработки был остановлен или
+        завершился аварийно, выдается с quarantined=True.
+        
+        Args:
+            pdf_files: Список путей к PDF-файлам
+            pages: Извлекаемые страницы каждого файла (None = все страницы)
+            max_chars: Ограничение на объем текста каждого файла
+            with_pages: Заполнять BatchResult.pages текстом по страницам
+            reading_order: Восстанавливать порядок чтения (см. extract_text)
+            
+        Yields:
+            BatchResult: Результат обработки очередного файла
+        """
+        if reading_order:
+            yield from self._iter_batch_ordered(pdf_files, pages, max_chars, with_pages)
+            return
+        if (self.use_multithreading and len(pdf_files) > 1) or self.mode == "isolated":
+            yield from self._iter_batch(pdf_files, pages, max_chars, with_pages)
+            return
+        
+        for file in self._progress(pdf_files, desc="Обработка файлов"):
+            try:
+                if with_pages:
+                    page_texts = []
+                    remaining = max_chars
+                    for page_num, page_text in self.iter_pages(file, pages=pages):
+                        if remaining is not None:
+                            page_text = page_text[:remaining]
+                            remaining -= len(page_text)
+                        page_texts.append((page_num, page_text))
+                        if remaining == 0:
+                            break
+                    text = "".join(page_text for _, page_text in page_texts)
+                else:
+                    text = self.extract_text(file, pages, max_chars)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке {file}: {str(e)}")
+                yield BatchResult.from_exception(file, e)
+            else:
+                yield BatchResult(file, text, pages=page_texts if with_pages else None)
+    
+    def _iter_batch_ordered(self, pdf_files: List[str], pages: PageSelection, max_chars: Optional[int],
+                            with_pages: bool) -> Iterator[BatchResult]:
+        """
+        Пакетная обработка с восстановлением порядка чтения. Колонтитулы ищутся
+        по всему документу, поэтому каждый файл обрабатывается одной задачей.
+        
+        Yields:
+            BatchResult: Результат обработки файла по мере готовности
+        """
+        max_workers = self.max_workers if self.use_multithreading else 1
+        executor = self._batch_executor(max_workers)
+        progress = self._progress(None, total=len(pdf_files), desc="Обработка файлов")
+        pending_files = deque(pdf_files)
+        in_flight = {}
         
-        if self.use_multithreading and len(pdf_files) > 1:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(pdf_files), self.max_workers)) as executor:
-                future_to_file = {
-                    executor.submit(self.extract_text, file): file for file in pdf_files
-                }
+        try:
+            while pending_files or in_flight:
+                # В работе не больше 2 * max_workers файлов, чтобы результаты не накапливались
+                while pending_files and len(in_flight) < max_workers * 2:
+                    file = pending_files.popleft()
+                    in_flight[executor.submit(_extract_file_ordered, file, pages, max_chars,
+                                                self.ocr, self.ocr_dpi)] = file
                 
-                for future in tqdm(
-                    concurrent.futures.as_completed(future_to_file),
-                    total=len(pdf_files),
-                    desc="Обработка файлов"
-                ):
-                    file = future_to_file[future]
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    file = in_flight.pop(future)
+                    progress.update()
                     try:
-                        results[file] = future.result()
+                        page_texts = future.result()
                     except Exception as e:
                         logger.error(f"Ошибка при обработке {file}: {str(e)}")
-                        results[file] = f"ОШИБКА: {str(e)}"
+                        yield BatchResult.from_exception(file, e)
+                        continue
+                    self.metrics.incr("pages", len(page_texts))
+                    yield BatchResult(file, "".join(text for _, text in page_texts),
+                                      pages=page_texts if with_pages else None)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
+            progress.close()
+    
+    def search(self, index: Union[str, SearchIndex], query: str, limit: int = 100) -> List[SearchHit]:
+        """
+        Поиск фразы в полнотекстовом индексе, построенном batch_process(index=...)
+        или SearchIndex.add.
+        
+        Args:
+            index: Путь к файлу индекса или открытый SearchIndex
+            query: Слова фразы через пробел; "слово*" — поиск по префиксу
+            limit: Максимальное количество вхождений
+            
+        Returns:
+            List[SearchHit]: Вхождения с путем к файлу, номером страницы, позицией
+                и прямоугольником блока (если индексировались блоки)
+        """
+        if isinstance(index, SearchIndex):
+            return index.search(query, limit)
+        
+        search_index = SearchIndex(index, readonly=True)
+        try:
+            return search_index.search(query, limit)
+        finally:
+            search_index.close()
+    
+    def scan(self, paths: Union[str, Iterable[str]], sample_pages: int = 1) -> List[ScanResult]:
+        """
+        Быстрое сканирование файлов без извлечения текста (см. iter_scan).
+        
+        Returns:
+            List[ScanResult]: Сводки, отсортированные по пути
+        """
+        return sorted(self.iter_scan(paths, sample_pages), key=lambda result: result.path)
+    
+    def iter_scan(self, paths: Union[str, Iterable[str]], sample_pages: int = 1) -> Iterator[ScanResult]:
+        """
+        Быстрое сканирование для предварительного отбора файлов: количество
+        страниц, название, автор, дата создания, шифрование, оглавление и
+        наличие текстового слоя. Читаются только метаданные, оглавление и
+        содержимое sample_pages страниц, текст не извлекается.
+        
+        Директории обходятся через os.scandir (см. scan_pdf_files), файлы
+        передаются в пул процессов пачками по SCAN_BATCH_FILES. В режиме
+        "isolated" действуют ограничения file_timeout и max_worker_memory.
+        
+        Args:
+            paths: Пути к PDF-файлам или директориям
+            sample_pages: Количество страниц, на которых проверяется наличие
+                текстового слоя
+            
+        Yields:
+            ScanResult: Сводки по мере готовности (порядок файлов не сохраняется);
+                ошибки открытия файла записываются в error и error_type
+        """
+        if sample_pages < 1:
+            raise ValueError("sample_pages должен быть положительным")
+        
+        entries = scan_pdf_files(paths)
+        batches = deque([(entry.path, entry.size) for entry in entries[i:i + SCAN_BATCH_FILES]]
+                        for i in range(0, len(entries), SCAN_BATCH_FILES))
+        logger.info(f"Сканирование {len(entries)} файлов")
+        
+        workers = self.max_workers if self.use_multithreading else 1
+        if self.mode == "isolated":
+            executor = self._batch_executor(workers)
+        elif self.use_multithreading and len(batches) > 1:
+            # PyMuPDF не отпускает GIL, поэтому сканирование всегда выполняется в процессах
+            workers = self.max_workers if self.mode != "thread" else os.cpu_count() or 1
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=min(len(batches), workers))
         else:
-            for file in tqdm(pdf_files, desc="Обработка файлов"):
+            executor = None
+        
+        pending: Dict[concurrent.futures.Future, List[Tuple[str, int]]] = {}
+        try:
+            with self._progress(None, total=len(entries), desc="Сканирование") as progress:
+                while pending or batches:
+                    if executor is None:
+                        results = _scan_files(batches.popleft(), sample_pages)
+                    else:
+                        while batches and len(pending) < workers * 2:
+                            batch = batches.popleft()
+                            if self.mode == "isolated" and len(batch) > 1:
+                                future = executor.submit_once(_scan_files, batch, sample_pages)
+                            else:
+                                future = executor.submit(_scan_files, batch, sample_pages)
+                            pending[future] = batch
+                        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        results = []
+                        for future in done:
+                            batch = pending.pop(future)
+                            try:
+                                results.extend(future.result())
+                            except WorkerError as e:
+                                if len(batch) > 1:
+                                    # Файлы пачки повторяются по одному, чтобы ошибку получил только проблемный
+                                    batches.extendleft([entry] for entry in reversed(batch))
+                                    continue
+                                pdf_path, size = batch[0]
+                                results.append(ScanResult(path=pdf_path, size=size, error=str(e),
+                                                          error_type=type(e).__name__))
+                    
+                    progress.update(len(results))
+                    self.metrics.incr("files", len(results))
+                    self.metrics.incr("errors", sum(1 for result in results if result.error is not None))
+                    yield from results
+        finally:
+            if executor is not None:
+                for future in pending:
+                    future.cancel()
+                executor.shutdown(wait=True)
+    
+    def _plan_batch(self, pdf_files: List[str], pages: PageSelection, max_chars: Optional[int],
+                    executor: Optional[concurrent.futures.Executor] = None
+                    ) -> Tuple[List[Tuple[List[Tuple[str, int, Optional[int]]], int]],
+                               Dict[str, int], Dict[str, Exception]]:
+        """
+        Планирование пакетной обработки.
+        
+        Большие документы делятся на задачи не более SCHEDULER_SPLIT_PAGES
+        страниц, мелкие файлы объединяются в пакеты до SCHEDULER_BATCH_BYTES.
+        Мелкие файлы при планировании не открываются. Вес задачи — оценка
+        объема обрабатываемых данных в байтах (доля размера файла).
+        
+        Если указан пул наблюдаемых процессов, файлы не открываются в текущем
+        процессе: количество страниц больших файлов определяют задачи пула.
+        
+        Returns:
+            Tuple: Задачи (фрагменты, вес), количество фрагментов каждого файла
+                и ошибки, обнаруженные при планировании
+        """
+        tasks = []
+        expected = {}
+        errors = {}
+        batch, batch_bytes = [], 0
+        
+        sizes = {}
+        for file in pdf_files:
+            try:
+                sizes[file] = os.path.getsize(file)
+            except Exception as e:
+                errors[file] = e
+        
+        # При ограничении объема файл не делится, чтобы остановиться на первых страницах
+        whole = {file for file, size in sizes.items()
+                 if pages is None and (size < SCHEDULER_SMALL_FILE or max_chars is not None)}
+        page_counts = {}
+        if executor is not None:
+            futures = {file: executor.submit(_page_count, file) for file in sizes if file not in whole}
+            for file, future in futures.items():
                 try:
-                    results[file] = self.extract_text(file)
+                    page_counts[file] = future.result()
                 except Exception as e:
-                    logger.error(f"Ошибка при обработке {file}: {str(e)}")
-                    results[file] = f"ОШИБКА: {str(e)}"
+                    errors[file] = e
         
-        logger.info(f"Пакетная обработка завершена за {time.time() - start_time:.2f} секунд")
-        return results
+        for file, size in sizes.items():
+            if file in errors:
+                continue
+            try:
+                if file in whole:
+                    segments = [(file, 0, None)]
+                    page_weight = size
+                else:
+                    total_pages = page_counts[file] if file in page_counts else _page_count(file)
+                    indices = _resolve_pages(pages, total_pages)
+                    runs = _contiguous_runs(indices, None if max_chars is not None else SCHEDULER_SPLIT_PAGES)
+                    segments = [(file, start, stop) for start, stop in runs]
+                    page_weight = size / max(total_pages, 1)
+            except Exception as e:
+                errors[file] = e
+                continue
+            
+            expected[file] = len(segments)
+            if len(segments) == 1 and size < SCHEDULER_BATCH_BYTES:
+                batch.append(segments[0])
+                batch_bytes += size
+                if batch_bytes >= SCHEDULER_BATCH_BYTES or len(batch) >= SCHEDULER_BATCH_FILES:
+                    tasks.append((batch, batch_bytes))
+                    batch, batch_bytes = [], 0
+            else:
+                for segment in segments:
+                    weight = size if segment[2] is None else int(page_weight * (segment[2] - segment[1]))
+                    tasks.append(([segment], weight))
+        
+        if batch:
+            tasks.append((batch, batch_bytes))
+        return tasks, expected, errors
+    
+    def _iter_batch(self, pdf_files: List[str], pages: PageSelection,
+                    max_chars: Optional[int], with_pages: bool = False) -> Iterator[BatchResult]:
+        """
+        Планировщик пакетной обработки с общим бюджетом исполнителей.
+        
+        Все задачи (части больших документов и пакеты мелких файлов) выполняются
+        в одном пуле без вложенных пулов; свободные исполнители забирают задачи
+        из общей очереди. Новые задачи передаются в пул, только пока в работе
+        не больше 2 * max_workers задач и max_inflight_bytes данных.
+        
+        Yields:
+            BatchResult: Результат обработки файла по мере готовности
+        """
+        use_cache = self.cache is not None
+        # Файлы, ожидающие распознавания страниц: путь -> (номера страниц, текст страниц);
+        # текст распознаваемой страницы до готовности результата — Future
+        ocr_waiting: Dict[str, Tuple[List[int], List[Any]]] = {}
+        ocr_in_flight: Dict[concurrent.futures.Future, str] = {}
+        
+        def finish(file: str, page_numbers: List[int], page_texts: List[str]) -> Iterator[BatchResult]:
+            page_texts = _limit_chars(page_texts, max_chars)
+            if self.ocr is not None:
+                page_numbers = page_numbers[:len(page_texts)]
+                futures = self._ocr_blank_pages(file, page_numbers, page_texts)
+                if futures:
+                    ocr_waiting[file] = (page_numbers, page_texts)
+                    ocr_in_flight.update((future, file) for future in futures)
+                    return
+            yield BatchResult(file, "".join(page_texts),
+                              pages=list(zip(page_numbers, page_texts)) if with_pages else None)
+        
+        def resolve_ocr(future: concurrent.futures.Future) -> Iterator[BatchResult]:
+            file = ocr_in_flight.pop(future)
+            page_numbers, page_texts = ocr_waiting[file]
+            if any(future in ocr_in_flight for future in page_texts
+                   if isinstance(future, concurrent.futures.Future)):
+                return
+            del ocr_waiting[file]
+            page_texts = [_ocr_text(self._ocr_result(file, page_num, text))
+                          if isinstance(text, concurrent.futures.Future) else text
+                          for page_num, text in zip(page_numbers, page_texts)]
+            page_texts = _limit_chars(page_texts, max_chars)
+            yield BatchResult(file, "".join(page_texts),
+                              pages=list(zip(page_numbers, page_texts)) if with_pages else None)
+        
+        pending_files = []
+        for file in pdf_files:
+            cached = self._cache_get(file, "text", "pymupdf") if use_cache else None
+            if cached is not None:
+                indices = _resolve_pages(pages, len(cached))
+                yield from finish(file, [idx + 1 for idx in indices], [cached[idx] for idx in indices])
+            else:
+                pending_files.append(file)
+        
+        max_workers = self.max_workers if self.use_multithreading else 1
+        executor = self._batch_executor(max_workers)
+        parts: Dict[str, Dict[int, Any]] = {}
+        in_flight = {}
+        in_flight_bytes = 0
+        progress = None
+        
+        try:
+            tasks, expected, errors = self._plan_batch(pending_files, pages, max_chars,
+                                                       executor if self.mode == "isolated" else None)
+            for file, error in errors.items():
+                logger.error(f"Ошибка при обработке {file}: {error}")
+                yield BatchResult.from_exception(file, error)
+            for file in [file for file, count in expected.items() if count == 0]:
+                yield BatchResult(file, "", pages=[] if with_pages else None)
+            
+            logger.info(f"Запланировано {len(tasks)} задач для {len(expected)} файлов")
+            tasks = deque(tasks)
+            progress = self._progress(None, total=len(expected), desc="Обработка файлов")
+            
+            while tasks or in_flight or ocr_in_flight:
+                while (tasks and len(in_flight) < max_workers * 2
+                       and (not in_flight or in_flight_bytes + tasks[0][1] <= self.max_inflight_bytes)):
+                    segments, weight = tasks.popleft()
+                    if len(segments) > 1 and isinstance(executor, _SupervisedExecutor):
+                        # Пакет мелких файлов не повторяется целиком (см. ниже)
+                        future = executor.submit_once(_extract_segments, segments, max_chars)
+                    else:
+                        future = executor.submit(_extract_segments, segments, max_chars)
+                    in_flight[future] = (segments, weight)
+                    in_flight_bytes += weight
+                
+                done, _ = concurrent.futures.wait([*in_flight, *ocr_in_flight],
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    if future in ocr_in_flight:
+                        yield from resolve_ocr(future)
+                        continue
+                    segments, weight = in_flight.pop(future)
+                    in_flight_bytes -= weight
+                    try:
+                        segment_results = future.result()
+                    except WorkerError as e:
+                        if len(segments) == 1:
+                            segment_results = [(segments[0][0], segments[0][1], None, e)]
+                        else:
+                            # Процесс остановлен на одном из файлов пакета: файлы пакета
+                            # обрабатываются по одному, чтобы в карантин попал только он
+                            logger.warning(f"{e}; файлы пакета обрабатываются по одному")
+                            tasks.extendleft(([segment], weight // len(segments)) for segment in reversed(segments))
+                            continue
+                    except Exception as e:
+                        segment_results = [(file, start, None, e) for file, start, _ in segments]
+                    
+                    for file, start, texts, error in segment_results:
+                        file_parts = parts.setdefault(file, {})
+                        file_parts[start] = texts if error is None else error
+                        if len(file_parts) < expected[file]:
+                            continue
+                        
+                        del parts[file]
+                        progress.update()
+                        ordered = [file_parts[key] for key in sorted(file_parts)]
+                        failed = next((part for part in ordered if isinstance(part, (tuple, Exception))), None)
+                        if failed is not None:
+                            if isinstance(failed, Exception):
+                                result = BatchResult.from_exception(file, failed)
+                            else:
+                                result = BatchResult(file, error=failed[1], error_type=failed[0])
+                            logger.error(f"Ошибка при обработке {file}: {result.error}")
+                            yield result
+                            continue
+                        
+                        with self.metrics.timer("reassembly"):
+                            page_texts = [text for part in ordered for text in part]
+                        self.metrics.incr("pages", len(page_texts))
+                        if use_cache and pages is None and max_chars is None:
+                            self.cache.put(file, "text", "pymupdf", page_texts)
+                        # Фрагменты файла — непрерывные диапазоны страниц, начинающиеся с start
+                        page_numbers = [start + 1 + i for start in sorted(file_parts)
+                                        for i in range(len(file_parts[start]))]
+                        yield from finish(file, page_numbers, page_texts)
+        finally:
+            for future in [*in_flight, *ocr_in_flight]:
+                future.cancel()
+            executor.shutdown(wait=True)
+            if progress is not None:
+                progress.close()
+    
+    def _get_async_executor(self) -> concurrent.futures.Executor:
+        """Общий для всех асинхронных вызовов пул, создается при первом обращении."""
+        if self._async_executor is None:
+            self._async_executor = self._executor_cls()(max_workers=self.max_workers)
+        return self._async_executor
+    
+    async def aextract_text(self, pdf_path: PDFSource, pages: PageSelection = None,
+                            max_chars: Optional[int] = None,
+                            timeout: Optional[float] = None) -> str:
+        """
+        Асинхронное извлечение текста без блокировки цикла событий.
+        
+        Работа выполняется в общем ограниченном пуле парсера; одновременно
+        в пул передается не более 2 * max_workers файлов, остальные вызовы
+        ожидают освобождения места.
+        
+        Args:
+            pdf_path: Путь к PDF-файлу или его содержимое
+            pages: Извлекаемые страницы (None = все страницы)
+            max_chars: Ограничение на объем текста
+            timeout: Максимальное время ожидания результата в секундах
+            
+        Returns:
+            str: Извлеченный текст
+            
+        Raises:
+            asyncio.TimeoutError: Если результат не получен за timeout секунд
+        """
+        pdf_path = _normalize_source(pdf_path)
+        # Семафор привязан к циклу событий, поэтому для нового цикла создается заново
+        loop = asyncio.get_running_loop()
+        if self._async_semaphore is None or self._async_semaphore[0] is not loop:
+            self._async_semaphore = (loop, asyncio.Semaphore(self.max_workers * 2))
+        
+        async with self._async_semaphore[1]:
+            return await asyncio.wait_for(self._aextract_text(pdf_path, pages, max_chars), timeout)
+    
+    async def _aextract_text(self, pdf_path: Union[str, bytes, memoryview], pages: PageSelection,
+                             max_chars: Optional[int]) -> str:
+        """Передача извлечения текста одного файла в общий пул."""
+        loop = asyncio.get_running_loop()
+        
+        if self.mode == "thread":
+            return await loop.run_in_executor(
+                self._get_async_executor(), _quiet_call, self.extract_text, pdf_path, pages, max_chars)
+        
+        if not isinstance(pdf_path, str):
+            # Документ из памяти не передается в дочерний процесс (см. _executor_cls)
+            return await loop.run_in_executor(
+                None, _quiet_call, self.extract_text, pdf_path, pages, max_chars)
+        executor = self._get_async_executor()
+        
+        # Дочерним процессам парсер с кэшем не передается: кэш проверяется
+        # здесь, а файл целиком обрабатывается в одном процессе
+        if self.cache is not None:
+            cached = await loop.run_in_executor(None, self.cache.get, pdf_path, "text", "pymupdf")
+            if cached is not None:
+                indices = _resolve_pages(pages, len(cached))
+                return "".join(_limit_chars((cached[idx] for idx in indices), max_chars))
+        
+        page_texts = await loop.run_in_executor(executor, _extract_file_text, pdf_path, pages, max_chars)
+        if self.cache is not None and pages is None and max_chars is None:
+            await loop.run_in_executor(None, self.cache.put, pdf_path, "text", "pymupdf", page_texts)
+        return "".join(page_texts)
+    
+    async def abatch_process(self, pdf_files: Iterable[str], pages: PageSelection = None,
+                             max_chars: Optional[int] = None, timeout: Optional[float] = None,
+                             structured: bool = False) -> AsyncIterator[Tuple[str, Union[str, BatchResult]]]:
+        """
+        Асинхронная пакетная обработка: результаты выдаются в порядке готовности.
+        
+        Файлы берутся из pdf_files по мере освобождения места в пуле, поэтому
+        список может быть сколь угодно длинным. При досрочном завершении
+        итерации или отмене задачи ожидающие файлы отменяются.
+        
+        Args:
+            pdf_files: Пути к PDF-файлам
+            pages: Извлекаемые страницы каждого файла (None = все страницы)
+            max_chars: Ограничение на объем текста каждого файла
+            timeout: Максимальное время обработки одного файла в секундах
+            structured: Выдавать BatchResult для каждого файла, а не только
+                для необработанных
+            
+        Yields:
+            Tuple[str, Union[str, BatchResult]]: Путь к файлу и извлеченный текст
+                (или BatchResult с описанием ошибки; при structured — всегда BatchResult)
+        """
+        async def process(file: str) -> Tuple[str, Union[str, BatchResult]]:
+            try:
+                text = await self.aextract_text(file, pages, max_chars, timeout)
+                return file, BatchResult(file, text) if structured else text
+            except asyncio.TimeoutError:
+                logger.error(f"Превышено время обработки {file}")
+                return file, BatchResult(file, error=f"превышено время обработки ({timeout} секунд)",
+                                         error_type="TimeoutError")
+            except Exception as e:
+                logger.error(f"Ошибка при обработке {file}: {str(e)}")
+                return file, BatchResult.from_exception(file, e)
+        
+        files = iter(pdf_files)
+        pending = set()
+        try:
+            for file in files:
+                pending.add(asyncio.ensure_future(process(file)))
+                if len(pending) >= self.max_workers * 2:
+                    break
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    file = next(files, None)
+                    if file is not None:
+                        pending.add(asyncio.ensure_future(process(file)))
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
     
-    def extract_tables(self, pdf_path: str) -> List[Dict]:
+    async def aclose(self) -> None:
+        """Остановка общего пула асинхронного API."""
+        if self._async_executor is not None:
+            executor, self._async_executor = self._async_executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+    
+    def extract_tables(self, pdf_path: PDFSource, pages: PageSelection = None) -> List[Dict]:
         """
         Извлечение таблиц из PDF-файла (экспериментальная функция).
         
+        Таблицы ищутся по геометрии span'ов: строки выделяются по перекрытию
+        по вертикали, столбцы — по линиям разметки страницы или промежуткам
+        между ячейками. Большие документы обрабатываются параллельно.
+        
         Args:
-            pdf_path: Путь к PDF-файлу
+            pdf_path: Путь к PDF-файлу или его содержимое
+            pages: Обрабатываемые страницы (None = все страницы)
             
         Returns:
-            List[Dict]: Список таблиц с метаданными
+            List[Dict]: Список таблиц: {"page_num", "bbox", "n_rows", "n_cols",
+                "rows"}, где rows — список строк, каждая из n_cols ячеек
         """
         logger.warning("Функция извлечения таблиц находится в экспериментальном состоянии")
-        # Реализация извлечения таблиц может быть добавлена в будущем
-        # Это сложнее, чем простое извлечение текста, и требует дополнительной логики
-        return [] 
\ No newline at end of file
+        pdf_path = _normalize_source(pdf_path)
+        
+        if self.cache is not None and pages is None:
+            tables = self._cache_get(pdf_path, "tables", "pymupdf")
+            if tables is not None:
+                return tables
+        
+        start_time = time.time()
+        with self._document(pdf_path) as doc:
+            indices = _resolve_pages(pages, len(doc))
+            
+            if len(indices) > 100 and self.use_multithreading:
+                ranges = _split_page_ranges(indices, self.max_workers)
+                with self.metrics.timer("extract"):
+                    chunks = self._run_in_pool(_extract_tables_range, pdf_path, ranges)
+                tables = [table for chunk in chunks for page in chunk for table in page]
+            else:
+                tables = []
+                for page_idx in self._progress(indices, desc="Поиск таблиц"):
+                    with self.metrics.timer("extract"):
+                        tables.extend(_detect_tables(doc[page_idx], page_idx))
+        self.metrics.incr("pages", len(indices))
+        
+        elapsed = time.time() - start_time
+        logger.info(f"Найдено {len(tables)} таблиц на {len(indices)} страницах за "
+                    f"{elapsed:.2f} секунд ({len(indices) / max(elapsed, 1e-9):.0f} стр/с)")
+        
+        if self.cache is not None and pages is None:
+            self.cache.put(pdf_path, "tables", "pymupdf", tables)
+        return tables
@@ -2,13 +2,75 @@
 # -*- coding: utf-8 -*-
 
 import os
+import io
+import mmap
+import time
+import json
+import asyncio
+import pickle
+import sqlite3
+import random
+import shutil
 import unittest
 import tempfile
-from pdf_parser import PDFParser, TextBlock
+import multiprocessing
+from unittest import mock
+import pdf_parser
+from pdf_parser import PDFParser, TextBlock, TextBlockTable, ExtractionCache, BatchResult, table_to_csv
+from pdf_parser import JSONLSink, TextDirSink, TextStreamSink, ParserMetrics
+from pdf_parser import DirectoryManifest, ManifestSink, scan_pdf_files, SearchIndex, OCREngine
+from pdf_parser import DuplicateIndex, TextChunker
 
 # Для создания тестового PDF-файла
 import fitz
 
+# Допустимое время холодного импорта pdf_parser и CLI (секунды; измерено ~0.15)
+IMPORT_TIME_BUDGET = 0.4
+
+# Допустимая доля времени импорта с загрузкой PyMuPDF, PDFMiner и tqdm
+# (измерено ~0.5)
+IMPORT_TIME_RATIO = 0.75
+
+# Стандартные шрифты base-14 (helv и др.) не содержат кириллицы,
+# поэтому для тестовых документов используется встроенный CJK-шрифт
+TEST_FONT = "china-s"
+
+
+class FakeOCREngine(OCREngine):
+    """Движок распознавания для тестов: одна строка в верхней части изображения."""
+    
+    name = "fake"
+    
+    def __init__(self, fail=False):
+        self.fail = fail
+    
+    def recognize(self, pixmap):
+        if self.fail:
+            raise RuntimeError("движок недоступен")
+        return [("Распознанный текст", pixmap.width * 0.1, pixmap.height * 0.1,
+                 pixmap.width * 0.5, pixmap.height * 0.12)]
+
+
+_extract_segments = pdf_parser._extract_segments
+
+
+def poisoned_segments(segments, max_chars=None):
+    """
+    Задача планировщика для тестов изоляции: на файлах hang*.pdf процесс
+    зависает, на crash*.pdf аварийно завершается, на bomb*.pdf расходует память.
+    """
+    for pdf_path, _, _ in segments:
+        name = os.path.basename(pdf_path)
+        if name.startswith("hang"):
+            time.sleep(60)
+        elif name.startswith("crash"):
+            os._exit(3)
+        elif name.startswith("bomb"):
+            data = b"x" * (256 * 2 ** 20)
+            time.sleep(60)
+            del data
+    return _extract_segments(segments, max_chars)
+
 
 class TestPDFParser(unittest.TestCase):
     """Тесты для PDFParser."""
@@ -19,6 +81,7 @@ class TestPDFParser(unittest.TestCase):
         cls.temp_dir = tempfile.TemporaryDirectory()
         cls.sample_pdf_path = os.path.join(cls.temp_dir.name, "sample.pdf")
         cls.large_pdf_path = os.path.join(cls.temp_dir.name, "large.pdf")
+        cls.tables_pdf_path = os.path.join(cls.temp_dir.name, "tables.pdf")
         
         # Создаем простой PDF-файл
         doc = fitz.open()
@@ -31,7 +94,8 @@ class TestPDFParser(unittest.TestCase):
             "Это тестовый PDF-документ для проверки парсера.\n"
             "Вторая строка текста.\n"
             "Третья строка текста с кириллицей.",
-            fontsize=12
+            fontsize=12,
+            fontname=TEST_FONT
         )
         
         # Сохраняем PDF
@@ -48,11 +112,14 @@ class TestPDFParser(unittest.TestCase):
                 f"Страница {i+1}\n"
                 f"Это тестовый текст на странице {i+1}.\n"
                 f"Еще одна строка с текстом.",
-                fontsize=12
+                fontsize=12,
+                fontname=TEST_FONT
             )
         
         large_doc.save(cls.large_pdf_path)
         large_doc.close()
+        
+        create_tables_pdf(cls.tables_pdf_path)
     
     @classmethod
     def tearDownClass(cls):
@@ -111,6 +178,1141 @@ class TestPDFParser(unittest.TestCase):
         # Проверяем содержимое
         self.assertIn("Это тестовый PDF-документ", results[self.sample_pdf_path])
         self.assertIn("Страница 1", results[self.large_pdf_path])
+    
+    def test_invalid_mode(self):
+        """Тест проверки режима обработки."""
+        with self.assertRaises(ValueError):
+            PDFParser(mode="gpu")
+    
+    def test_extract_large_pdf_process_mode(self):
+        """Тест извлечения текста большого PDF-файла в пуле процессов."""
+        parser = PDFParser(mode="process", max_workers=3)
+        text = parser.extract_text(self.large_pdf_path)
+        
+        # Результат должен совпадать с однопоточным извлечением, включая порядок страниц
+        expected = PDFParser(use_multithreading=False).extract_text(self.large_pdf_path)
+        self.assertEqual(text, expected)
+        self.assertLess(text.index("Страница 99\n"), text.index("Страница 100\n"))
+    
+    def test_extract_metadata_process_mode(self):
+        """Тест извлечения метаданных большого PDF-файла в пуле процессов."""
+        parser = PDFParser(mode="process", max_workers=3)
+        blocks = parser.extract_text_with_metadata(self.large_pdf_path)
+        
+        page_nums = [block.page_num for block in blocks]
+        self.assertEqual(page_nums, sorted(page_nums))
+        self.assertEqual(page_nums[0], 1)
+        self.assertEqual(page_nums[-1], 150)
+    
+    def test_pdfminer_parallel(self):
+        """Тест параллельного извлечения PDFMiner по частям документа."""
+        expected = PDFParser(use_multithreading=False, show_progress=False).extract_text_with_metadata(
+            self.large_pdf_path, detailed=True)
+        
+        # Части обрабатываются в пуле процессов и собираются в исходном порядке
+        parser = PDFParser(mode="process", max_workers=2, show_progress=False)
+        blocks = parser.extract_text_with_metadata(self.large_pdf_path, detailed=True)
+        self.assertEqual(blocks, expected)
+        self.assertEqual(blocks[-1].page_num, 150)
+        
+        # Шрифт и размер шрифта заполняются, как и для PyMuPDF
+        pymupdf_block = parser.extract_text_with_metadata(self.sample_pdf_path)[0]
+        block = parser.extract_text_with_metadata(self.sample_pdf_path, detailed=True)[0]
+        self.assertEqual(block.font, pymupdf_block.font)
+        self.assertAlmostEqual(block.font_size, pymupdf_block.font_size, places=1)
+        
+        # Документ из памяти обрабатывается в пуле потоков
+        with open(self.large_pdf_path, "rb") as f:
+            self.assertEqual(parser.extract_text_with_metadata(f.read(), detailed=True), expected)
+        
+        # Ограничение max_chars останавливает извлечение
+        limited = parser.extract_text_with_metadata(self.large_pdf_path, detailed=True, max_chars=100)
+        self.assertLess(len(limited), len(expected))
+        self.assertEqual(limited, expected[:len(limited)])
+        
+        # Параметры анализа разметки передаются в PDFMiner и учитываются в кэше
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ExtractionCache(cache_dir)
+            default = PDFParser(show_progress=False, cache=cache).extract_text_with_metadata(
+                self.sample_pdf_path, detailed=True)
+            # При нулевом char_margin PDFMiner не объединяет символы в строки
+            split = PDFParser(show_progress=False, cache=cache, laparams={"char_margin": 0.0})
+            chars = split.extract_text_with_metadata(self.sample_pdf_path, detailed=True)
+            self.assertGreater(len(chars), len(default))
+            self.assertIn("Э", [block.text for block in chars])
+            cache.close()
+    
+    def test_batch_processing_process_mode(self):
+        """Тест пакетной обработки в пуле процессов."""
+        parser = PDFParser(mode="process")
+        results = parser.batch_process([self.sample_pdf_path, self.large_pdf_path])
+        
+        self.assertIn("Это тестовый PDF-документ", results[self.sample_pdf_path])
+        self.assertIn("Страница 150", results[self.large_pdf_path])
+
+    
+    def test_iter_pages(self):
+        """Тест потокового извлечения страниц."""
+        parser = PDFParser(use_multithreading=False)
+        pages = list(parser.iter_pages(self.sample_pdf_path))
+        
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0][0], 1)
+        self.assertIn("Вторая строка", pages[0][1])
+    
+    def test_iter_pages_parallel(self):
+        """Тест потокового извлечения с ограниченным упреждением."""
+        for mode in ("thread", "process"):
+            with self.subTest(mode=mode):
+                parser = PDFParser(mode=mode, max_workers=2)
+                pages = list(parser.iter_pages(self.large_pdf_path, read_ahead=16))
+                
+                self.assertEqual([num for num, _ in pages], list(range(1, 151)))
+                self.assertIn("Страница 150\n", pages[-1][1])
+    
+    def test_iter_pages_with_metadata_early_close(self):
+        """Тест досрочного прекращения потокового извлечения блоков."""
+        parser = PDFParser(max_workers=2)
+        iterator = parser.iter_pages(self.large_pdf_path, with_metadata=True)
+        
+        page_num, blocks = next(iterator)
+        iterator.close()
+        
+        self.assertEqual(page_num, 1)
+        self.assertTrue(all(isinstance(block, TextBlock) for block in blocks))
+        self.assertTrue(all(block.page_num == 1 for block in blocks))
+
+    
+    def test_extraction_cache(self):
+        """Тест постоянного кэша результатов извлечения."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ExtractionCache(cache_dir)
+            parser = PDFParser(cache=cache)
+            
+            text = parser.extract_text(self.sample_pdf_path)
+            blocks = parser.extract_text_with_metadata(self.sample_pdf_path)
+            tables = parser.extract_tables(self.sample_pdf_path)
+            self.assertEqual(cache.stats()["misses"], 3)
+            
+            # Повторные вызовы обслуживаются из кэша, в том числе новым экземпляром кэша
+            cache.close()
+            cache = ExtractionCache(cache_dir)
+            parser = PDFParser(cache=cache)
+            # При попадании в кэш PDF не открывается
+            with mock.patch.object(pdf_parser.fitz, "open", side_effect=AssertionError):
+                self.assertEqual(parser.extract_text(self.sample_pdf_path), text)
+                self.assertEqual(parser.extract_text_with_metadata(self.sample_pdf_path), blocks)
+                self.assertEqual(parser.extract_tables(self.sample_pdf_path), tables)
+            self.assertEqual(parser.batch_process([self.sample_pdf_path])[self.sample_pdf_path], text)
+            
+            stats = cache.stats()
+            self.assertEqual(stats["hits"], 4)
+            self.assertEqual(stats["misses"], 0)
+            self.assertEqual(stats["entries"], 3)
+            cache.close()
+    
+    def test_extraction_cache_eviction(self):
+        """Тест вытеснения давно не использовавшихся записей кэша."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ExtractionCache(cache_dir)
+            cache.put(self.sample_pdf_path, "text", "pymupdf", ["первая"])
+            
+            # Лимит вмещает только одну запись
+            cache.max_size = cache.stats()["size"]
+            cache.put(self.large_pdf_path, "text", "pymupdf", ["вторая"])
+            
+            self.assertIsNone(cache.get(self.sample_pdf_path, "text", "pymupdf"))
+            self.assertEqual(cache.stats()["entries"], 1)
+            
+            # Время обращения при попадании записывается не сразу, но учитывается при вытеснении
+            cache.max_size *= 2
+            cache.put(self.tables_pdf_path, "text", "pymupdf", ["третья"])
+            time.sleep(0.01)
+            key = cache.make_key(self.large_pdf_path, "text", "pymupdf")
+            reader = sqlite3.connect(cache.path)
+            query = "SELECT accessed FROM entries WHERE key = ?"
+            accessed = reader.execute(query, (key,)).fetchone()
+            self.assertEqual(cache.get(self.large_pdf_path, "text", "pymupdf"), ["вторая"])
+            self.assertEqual(reader.execute(query, (key,)).fetchone(), accessed)
+            reader.close()
+            cache.put(self.sample_pdf_path, "text", "pymupdf", ["первая"])
+            self.assertIsNone(cache.get(self.tables_pdf_path, "text", "pymupdf"))
+            self.assertEqual(cache.get(self.large_pdf_path, "text", "pymupdf"), ["вторая"])
+            cache.close()
+    
+    def test_page_reuse(self):
+        """Тест повторного использования неизмененных страниц новой версии документа."""
+        with self.assertRaises(ValueError):
+            PDFParser(page_reuse=True)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            contract_path = os.path.join(temp_dir, "contract.pdf")
+            shutil.copy(self.large_pdf_path, contract_path)
+            cache = ExtractionCache(os.path.join(temp_dir, "cache"))
+            metrics = ParserMetrics()
+            parser = PDFParser(cache=cache, page_reuse=True, metrics=metrics)
+            parser.extract_text(contract_path)
+            parser.extract_text_with_metadata(contract_path)
+            
+            # Новая версия: две страницы изменены, одна вставлена; файл перезаписан
+            # целиком со сжатием и перенумерацией объектов
+            doc = fitz.open(self.large_pdf_path)
+            for page_idx in (4, 98):
+                doc[page_idx].insert_text((50, 400), "Новая редакция пункта", fontsize=12, fontname=TEST_FONT)
+            doc.insert_page(49, text="Приложение")
+            revised = doc.tobytes(garbage=2, deflate=True)
+            doc.close()
+            with open(contract_path, "wb") as f:
+                f.write(revised)
+            
+            diff = parser.page_diff(contract_path)
+            self.assertEqual(diff, parser.page_diff(contract_path, self.large_pdf_path))
+            self.assertEqual((diff.old_pages, diff.new_pages), (150, 151))
+            self.assertEqual(diff.changed, [5, 100])
+            self.assertEqual(diff.added, [50])
+            self.assertEqual(diff.removed, [])
+            self.assertIn((60, 61), diff.unchanged)
+            
+            metrics.reset()
+            plain = PDFParser()
+            self.assertEqual(parser.extract_text(contract_path), plain.extract_text(contract_path))
+            self.assertEqual(parser.extract_text_with_metadata(contract_path),
+                             plain.extract_text_with_metadata(contract_path))
+            self.assertEqual(metrics.snapshot()["counters"]["pages_reused"], 2 * 148)
+            
+            # Отпечатки новой версии сохранены для сравнения со следующей
+            self.assertEqual(parser.page_diff(contract_path).unchanged, [(i, i) for i in range(1, 152)])
+            cache.close()
+
+    
+    def test_text_block_table(self):
+        """Тест колоночного хранилища блоков текста."""
+        parser = PDFParser(mode="process", max_workers=3)
+        blocks = parser.extract_text_with_metadata(self.large_pdf_path)
+        table = parser.extract_text_with_metadata(self.large_pdf_path, columnar=True)
+        
+        self.assertIsInstance(table, TextBlockTable)
+        self.assertEqual(table, blocks)
+        self.assertEqual(table[-1], blocks[-1])
+        self.assertEqual(table.fonts, ["Heiti"])
+        
+        restored = pickle.loads(pickle.dumps(table))
+        self.assertEqual(restored.to_blocks(), blocks)
+    
+    def test_text_block_table_filter(self):
+        """Тест отбора блоков по странице, области и размеру шрифта."""
+        table = TextBlockTable.from_blocks([
+            TextBlock("заголовок", 1, 50, 40, 300, 60, "Bold", 18.0),
+            TextBlock("текст", 1, 50, 100, 300, 112, "Regular", 10.0),
+            TextBlock("сноска", 2, 50, 700, 300, 708, "Regular", 7.0),
+            TextBlock("без шрифта", 2, 50, 200, 300, 212),
+        ])
+        
+        self.assertEqual([b.text for b in table.filter(pages=2)], ["сноска", "без шрифта"])
+        self.assertEqual([b.text for b in table.filter(pages=(1, 2), min_font_size=10)],
+                         ["заголовок", "текст"])
+        self.assertEqual([b.text for b in table.filter(bbox=(0, 650, 600, 800))], ["сноска"])
+        self.assertEqual([b.text for b in table.filter(max_font_size=8)], ["сноска"])
+        
+        last = table.filter(pages=2)[-1]
+        self.assertIsNone(last.font)
+        self.assertIsNone(last.font_size)
+
+    
+    def test_page_selection(self):
+        """Тест извлечения выбранных страниц."""
+        parser = PDFParser(use_multithreading=False)
+        
+        text = parser.extract_text(self.large_pdf_path, pages="2-3,150")
+        self.assertIn("Страница 2\n", text)
+        self.assertIn("Страница 3\n", text)
+        self.assertIn("Страница 150\n", text)
+        self.assertNotIn("Страница 1\n", text)
+        
+        text = parser.extract_text(self.large_pdf_path, pages=slice(-2, None))
+        self.assertTrue(text.startswith("Страница 149\n"))
+        
+        for detailed in (False, True):
+            with self.subTest(detailed=detailed):
+                blocks = parser.extract_text_with_metadata(
+                    self.large_pdf_path, detailed=detailed, pages=range(10, 12))
+                self.assertEqual({block.page_num for block in blocks}, {10, 11})
+        
+        pages = [num for num, _ in PDFParser(max_workers=2).iter_pages(
+            self.large_pdf_path, pages=[1, range(40, 150)])]
+        self.assertEqual(pages, [1] + list(range(40, 150)))
+    
+    def test_max_chars(self):
+        """Тест досрочного прекращения извлечения по объему текста."""
+        for mode in ("thread", "process"):
+            with self.subTest(mode=mode):
+                parser = PDFParser(mode=mode, max_workers=2)
+                text = parser.extract_text(self.large_pdf_path, max_chars=100)
+                self.assertEqual(len(text), 100)
+                self.assertTrue(text.startswith("Страница 1\n"))
+        
+        parser = PDFParser()
+        results = parser.batch_process([self.sample_pdf_path, self.large_pdf_path],
+                                       pages="1-5", max_chars=20)
+        self.assertTrue(all(len(text) == 20 for text in results.values()))
+        
+        blocks = parser.extract_text_with_metadata(self.large_pdf_path, detailed=True,
+                                                   max_chars=10)
+        self.assertEqual({block.page_num for block in blocks}, {1})
+
+    
+    def test_extract_tables(self):
+        """Тест геометрического поиска таблиц."""
+        parser = PDFParser()
+        tables = parser.extract_tables(self.tables_pdf_path)
+        
+        self.assertEqual(len(tables), 2)
+        
+        # Таблица без рамок: столбцы определяются по промежуткам между ячейками
+        plain = tables[0]
+        self.assertEqual(plain["page_num"], 1)
+        self.assertEqual((plain["n_rows"], plain["n_cols"]), (4, 3))
+        self.assertEqual(plain["rows"][0], ["Товар", "Количество", "Цена"])
+        self.assertEqual(table_to_csv(plain).splitlines()[1], "Яблоки,10,100.5")
+        
+        # Таблица с рамками: многострочная ячейка объединяется в одну
+        ruled = tables[1]
+        self.assertEqual((ruled["n_rows"], ruled["n_cols"]), (3, 2))
+        self.assertEqual(ruled["rows"][1], ["A1", "Первая строка вторая строка"])
+        
+        # Обычный текст таблицей не считается
+        self.assertEqual(parser.extract_tables(self.sample_pdf_path), [])
+        self.assertEqual(parser.extract_tables(self.large_pdf_path, pages="1-5"), [])
+
+    
+    def test_extract_text_hybrid(self):
+        """Тест гибридного извлечения с повторной обработкой проблемных страниц."""
+        pdf_path = os.path.join(self.temp_dir.name, "hybrid.pdf")
+        doc = fitz.open()
+        for i in range(3):
+            page = doc.new_page()
+            page.insert_text((50, 100), f"Обычная страница {i + 1}", fontsize=12, fontname=TEST_FONT)
+            if i == 1:
+                # Текст, напечатанный поверх самого себя («ложный жирный»)
+                for dx in (0.3, 0.6):
+                    page.insert_text((50 + dx, 100), f"Обычная страница {i + 1}",
+                                     fontsize=12, fontname=TEST_FONT)
+        doc.new_page()  # пустая страница без шрифтов
+        doc.save(pdf_path)
+        doc.close()
+        
+        parser = PDFParser(max_workers=2)
+        blocks, reports = parser.extract_text_hybrid(pdf_path)
+        
+        self.assertEqual([report.page_num for report in reports], [1, 2, 3, 4])
+        self.assertEqual([report.backend for report in reports],
+                         ["pymupdf", "pdfminer", "pymupdf", "pymupdf"])
+        self.assertEqual(reports[1].issues, ["overlap"])
+        self.assertIsNotNone(reports[1].pdfminer_time)
+        self.assertIsNone(reports[0].pdfminer_time)
+        self.assertEqual(reports[3].issues, [])
+        
+        # Координаты PDFMiner переведены в систему PyMuPDF
+        page2 = [block for block in blocks if block.page_num == 2]
+        self.assertTrue(page2)
+        self.assertTrue(all(50 < block.y1 < 120 for block in page2))
+
+    
+    def test_async_api(self):
+        """Тест асинхронного извлечения текста и пакетной обработки."""
+        for mode in ("thread", "process"):
+            with self.subTest(mode=mode):
+                parser = PDFParser(mode=mode, max_workers=2)
+                missing = os.path.join(self.temp_dir.name, "missing.pdf")
+                files = [self.sample_pdf_path, self.large_pdf_path, missing]
+                
+                async def run():
+                    # Внутри цикла событий индикаторы прогресса отключены
+                    self.assertTrue(parser._progress([]).disable)
+                    text = await parser.aextract_text(self.sample_pdf_path)
+                    results = {file: result async for file, result in parser.abatch_process(files)}
+                    structured = [result async for _, result in parser.abatch_process(files, structured=True)]
+                    await parser.aclose()
+                    self.assertEqual(sorted(result.ok for result in structured), [False, True, True])
+                    return text, results
+                
+                text, results = asyncio.run(run())
+                self.assertIn("Вторая строка", text)
+                self.assertEqual(set(results), set(files))
+                self.assertIn("Страница 150", results[self.large_pdf_path])
+                self.assertIsInstance(results[missing], BatchResult)
+                self.assertFalse(results[missing].ok)
+    
+    def test_async_timeout(self):
+        """Тест ограничения времени обработки файла в асинхронном API."""
+        parser = PDFParser(max_workers=1)
+        
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await parser.aextract_text(self.large_pdf_path, timeout=1e-6)
+            results = [result async for _, result in
+                       parser.abatch_process([self.large_pdf_path], timeout=1e-6)]
+            await parser.aclose()
+            return results
+        
+        results = asyncio.run(run())
+        self.assertEqual(results[0].error_type, "TimeoutError")
+        self.assertIn("превышено время", results[0].error)
+
+    
+    def test_batch_scheduler(self):
+        """Тест разбиения больших документов и упаковки мелких файлов в пакеты."""
+        missing = os.path.join(self.temp_dir.name, "missing.pdf")
+        files = [self.sample_pdf_path, self.large_pdf_path, self.tables_pdf_path, missing]
+        
+        with mock.patch.object(pdf_parser, "SCHEDULER_SMALL_FILE", 0):
+            parser = PDFParser(max_workers=2, max_inflight_bytes=1)
+            tasks, expected, errors = parser._plan_batch(files, None, None)
+            
+            # 150 страниц делятся на задачи по 64 страницы, два мелких файла упакованы вместе
+            self.assertEqual(expected[self.large_pdf_path], 3)
+            self.assertIn(missing, errors)
+            self.assertEqual(sorted(len(segments) for segments, _ in tasks), [1, 1, 1, 2])
+            
+            for mode in ("thread", "process"):
+                with self.subTest(mode=mode):
+                    parser = PDFParser(mode=mode, max_workers=2, max_inflight_bytes=1)
+                    results = parser.batch_process(files)
+                    
+                    expected_text = PDFParser(use_multithreading=False).extract_text(self.large_pdf_path)
+                    self.assertEqual(results[self.large_pdf_path], expected_text)
+                    self.assertIn("Вторая строка", results[self.sample_pdf_path])
+                    self.assertEqual(results[missing].error_type, "FileNotFoundError")
+                    
+                    # При structured каждому файлу соответствует BatchResult
+                    structured = parser.batch_process(files, structured=True)
+                    self.assertTrue(all(isinstance(result, BatchResult) for result in structured.values()))
+                    self.assertEqual(structured[self.large_pdf_path].text, expected_text)
+                    self.assertEqual([file for file, result in structured.items() if not result.ok], [missing])
+    
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                         "подмена задачи передается процессам только при fork")
+    def test_isolated_batch(self):
+        """Тест изоляции файлов, на которых процесс зависает, падает или превышает память."""
+        root = os.path.join(self.temp_dir.name, "isolated")
+        os.makedirs(root, exist_ok=True)
+        files = []
+        for name in ("ok1", "hang", "ok2", "crash", "bomb", "ok3"):
+            files.append(os.path.join(root, f"{name}.pdf"))
+            shutil.copy(self.sample_pdf_path, files[-1])
+        
+        with self.assertRaises(ValueError):
+            PDFParser(file_timeout=1)
+        
+        parser = PDFParser(mode="isolated", max_workers=2, show_progress=False, file_timeout=0.5,
+                           max_worker_memory=128 * 2 ** 20, max_files_per_worker=2)
+        with mock.patch.object(pdf_parser, "_extract_segments", poisoned_segments):
+            results = {os.path.basename(result.path): result for result in parser.iter_batch(files)}
+        
+        # Исправные файлы обработаны, несмотря на остановленные процессы
+        expected = PDFParser(show_progress=False).extract_text(self.sample_pdf_path)
+        for name in ("ok1.pdf", "ok2.pdf", "ok3.pdf"):
+            self.assertEqual(results[name].text, expected)
+            self.assertFalse(results[name].quarantined)
+        
+        failures = {"hang.pdf": "WorkerTimeoutError", "crash.pdf": "WorkerCrashError"}
+        if pdf_parser._process_rss(os.getpid()) is not None:
+            failures["bomb.pdf"] = "WorkerMemoryError"
+        for name, error_type in failures.items():
+            self.assertEqual(results[name].error_type, error_type)
+            self.assertTrue(results[name].quarantined)
+            self.assertIn("попыток: 2", results[name].error)
+        
+        # Файлы в карантине отмечаются в манифесте
+        manifest = DirectoryManifest(os.path.join(self.temp_dir.name, "isolated.sqlite3"))
+        manifest.sync(scan_pdf_files(root))
+        for result in results.values():
+            manifest.record(result)
+        self.assertIn(os.path.abspath(files[1]), [record.path for record in manifest.quarantined()])
+        self.assertEqual(manifest.pending(), [])
+        manifest.close()
+    
+    def test_batch_sinks(self):
+        """Тест потоковой записи результатов пакетной обработки в приемники."""
+        missing = os.path.join(self.temp_dir.name, "missing.pdf")
+        files = [self.sample_pdf_path, self.tables_pdf_path, missing]
+        expected_text = PDFParser(use_multithreading=False).extract_text(self.sample_pdf_path)
+        
+        for use_multithreading in (True, False):
+            with self.subTest(use_multithreading=use_multithreading):
+                parser = PDFParser(use_multithreading=use_multithreading, show_progress=False)
+                
+                stream = io.StringIO()
+                with JSONLSink(stream) as sink:
+                    self.assertIsNone(parser.batch_process(files, sink=sink))
+                self.assertEqual((sink.written, sink.failed), (3, 1))
+                
+                records = {record["path"]: record
+                           for record in map(json.loads, stream.getvalue().splitlines())}
+                self.assertEqual(records[self.sample_pdf_path]["text"], expected_text)
+                self.assertIsNone(records[self.sample_pdf_path]["error"])
+                self.assertIsNone(records[missing]["text"])
+                self.assertIsNotNone(records[missing]["error_type"])
+        
+        output_dir = os.path.join(self.temp_dir.name, "sink_output")
+        with TextDirSink(output_dir) as sink:
+            parser.batch_process(files, sink=sink)
+        with open(os.path.join(output_dir, "sample.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), expected_text)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "missing.error.json")))
+        
+        stream = io.StringIO()
+        with TextStreamSink(stream, preview_chars=10) as sink:
+            parser.batch_process([self.sample_pdf_path], sink=sink)
+        self.assertEqual(stream.getvalue(),
+                         f"=== {self.sample_pdf_path} ===\n{expected_text[:10]}...\n\n")
+    
+    def test_metrics(self):
+        """Тест сбора метрик этапов и счетчиков и их экспорта."""
+        metrics = ParserMetrics()
+        parser = PDFParser(use_multithreading=False, show_progress=False, metrics=metrics)
+        
+        parser.extract_text(self.sample_pdf_path)
+        parser.extract_text_with_metadata(self.sample_pdf_path)
+        snapshot = metrics.snapshot()
+        
+        self.assertEqual(snapshot["counters"]["pages"], 2)
+        self.assertGreater(snapshot["counters"]["spans"], 0)
+        for stage in ("open", "extract", "dict", "blocks", "reassembly"):
+            self.assertIn(stage, snapshot["stages"])
+        opened = snapshot["stages"]["open"]["count"]
+        self.assertEqual(snapshot["counters"]["bytes_read"], opened * os.path.getsize(self.sample_pdf_path))
+        
+        self.assertEqual(json.loads(metrics.to_json()), snapshot)
+        prometheus = metrics.to_prometheus()
+        self.assertIn("pdf_parser_pages_total 2\n", prometheus)
+        self.assertIn(f'pdf_parser_stage_seconds_count{{stage="open"}} {opened}\n', prometheus)
+        
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {"counters": {}, "stages": {}})
+    
+    def test_in_memory_sources(self):
+        """Тест извлечения из bytes, bytearray, memoryview, mmap и файловых объектов."""
+        parser = PDFParser(show_progress=False)
+        expected_text = parser.extract_text(self.sample_pdf_path)
+        expected_blocks = parser.extract_text_with_metadata(self.sample_pdf_path)
+        expected_detailed = parser.extract_text_with_metadata(self.sample_pdf_path, detailed=True)
+        with open(self.sample_pdf_path, "rb") as f:
+            data = f.read()
+        
+        with open(self.sample_pdf_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            sources = {
+                "bytes": lambda: data,
+                "bytearray": lambda: bytearray(data),
+                "memoryview": lambda: memoryview(data),
+                "mmap": lambda: mapped,
+                "BytesIO": lambda: io.BytesIO(data),
+                "file": lambda: open(self.sample_pdf_path, "rb"),
+            }
+            for name, make_source in sources.items():
+                with self.subTest(source=name):
+                    self.assertEqual(parser.extract_text(make_source()), expected_text)
+                    self.assertEqual(parser.extract_text_with_metadata(make_source()), expected_blocks)
+                    self.assertEqual(parser.extract_text_with_metadata(make_source(), detailed=True),
+                                     expected_detailed)
+                    self.assertEqual([text for _, text in parser.iter_pages(make_source())],
+                                     [text for _, text in parser.iter_pages(self.sample_pdf_path)])
+            
+            # Один файловый объект можно передать в несколько методов подряд
+            expected_tables = parser.extract_tables(self.sample_pdf_path)
+            with open(self.sample_pdf_path, "rb") as source:
+                self.assertEqual(parser.extract_text(source), expected_text)
+                self.assertEqual(parser.extract_tables(source), expected_tables)
+                self.assertEqual(source.tell(), 0)
+            buffer = io.BytesIO(b"prefix" + data)
+            buffer.seek(len(b"prefix"))
+            self.assertEqual(parser.extract_text(buffer), expected_text)
+            self.assertEqual(buffer.tell(), len(b"prefix"))
+            
+            # Документы из памяти держат ссылку на буфер до закрытия парсера
+            parser.close()
+            mapped.close()
+        
+        with open(self.large_pdf_path, "rb") as f:
+            large = f.read()
+        for mode in ("thread", "process"):
+            with self.subTest(mode=mode):
+                parser = PDFParser(mode=mode, max_workers=2, show_progress=False)
+                self.assertEqual(parser.extract_text(large), parser.extract_text(self.large_pdf_path))
+                self.assertEqual(len(list(parser.iter_pages(memoryview(large)))), 150)
+                parser.close()
+    
+    def test_document_cache(self):
+        """Тест повторного использования открытого документа и его переоткрытия при изменении файла."""
+        path = os.path.join(self.temp_dir.name, "doc_cache.pdf")
+        create_test_pdf(path, num_pages=2, text_per_page="Первая версия")
+        
+        metrics = ParserMetrics()
+        parser = PDFParser(use_multithreading=False, show_progress=False, metrics=metrics)
+        parser.extract_text(path)
+        parser.extract_text_with_metadata(path)
+        parser.extract_tables(path)
+        self.assertEqual(metrics.snapshot()["stages"]["open"]["count"], 1)
+        
+        create_test_pdf(path, num_pages=2, text_per_page="Вторая версия")
+        os.utime(path, ns=(0, 0))
+        self.assertIn("Вторая версия", parser.extract_text(path))
+        self.assertEqual(metrics.snapshot()["stages"]["open"]["count"], 2)
+        
+        parser.close()
+        self.assertEqual(len(parser._documents), 0)
+        
+        # Срезы одного буфера одинаковой длины — разные документы
+        contents = []
+        for name in ("Первый документ", "Второй документ"):
+            create_test_pdf(path, num_pages=1, text_per_page=name)
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        size = max(len(data) for data in contents)
+        buffer = bytearray(b"".join(data.ljust(size, b"\n") for data in contents))
+        view = memoryview(buffer)
+        self.assertIn("Первый документ", parser.extract_text(view[:size]))
+        self.assertIn("Второй документ", parser.extract_text(view[size:]))
+        parser.close()
+        view.release()
+        
+        parser = PDFParser(use_multithreading=False, show_progress=False, metrics=metrics,
+                           doc_cache_size=0)
+        metrics.reset()
+        parser.extract_text(path)
+        parser.extract_text(path)
+        self.assertEqual(metrics.snapshot()["stages"]["open"]["count"], 2)
+    
+    def test_daemon(self):
+        """Тест сервера извлечения: потоковые результаты, ошибки и остановка."""
+        import threading
+        import pdf_daemon
+        
+        # Протокол без аутентификации: TCP принимается только на localhost
+        self.assertEqual(pdf_daemon.parse_address("[::1]:8765"), ("::1", 8765))
+        server = pdf_daemon.ExtractionDaemon("0.0.0.0:8765", mode="thread", max_workers=1)
+        with self.assertRaises(ValueError):
+            server.bind()
+        server.close()
+        
+        address = os.path.join(self.temp_dir.name, "daemon.sock")
+        server = pdf_daemon.ExtractionDaemon(address, mode="thread", max_workers=2, client_limit=1)
+        server.bind()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = pdf_daemon.find_daemon(address)
+            self.assertIsNotNone(client)
+            self.assertEqual(client.ping()["workers"], 2)
+            
+            missing = os.path.join(self.temp_dir.name, "missing.pdf")
+            results = {result["path"]: result
+                       for result in client.extract([self.sample_pdf_path, self.large_pdf_path, missing])}
+            expected = PDFParser(use_multithreading=False).extract_text(self.large_pdf_path)
+            self.assertEqual(results[self.large_pdf_path]["text"], expected)
+            self.assertIn("Вторая строка", results[self.sample_pdf_path]["text"])
+            self.assertIsNone(results[self.sample_pdf_path]["error"])
+            self.assertIsNotNone(results[missing]["error_type"])
+            
+            head = next(client.extract([self.large_pdf_path], pages="2", max_chars=5))
+            self.assertEqual(head["text"], PDFParser(use_multithreading=False).extract_text(
+                self.large_pdf_path, pages="2", max_chars=5))
+            
+            with self.assertRaises(pdf_daemon.DaemonError):
+                list(client.request({"op": "unknown"}))
+            self.assertEqual(client.stats()["counters"]["files"], 4)
+            
+            client.shutdown()
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+            self.assertFalse(os.path.exists(address))
+            self.assertIsNone(pdf_daemon.find_daemon(address))
+        finally:
+            server.shutdown()
+            thread.join(timeout=10)
+    
+    def test_benchmark(self):
+        """Тест замера точки входа на синтетическом корпусе и поиска регрессий."""
+        import benchmark
+        
+        files = benchmark.generate_corpus(self.temp_dir.name, [3], density=5,
+                                          fonts=["helv", TEST_FONT], tables=True, images=True)
+        report = benchmark.run_benchmark(files, entries=["text", "tables", "chunks"], modes=["single"],
+                                         latency_samples=3, isolate=False)
+        
+        result = report["results"]["text/single"]
+        self.assertEqual(result["pages"], 6)
+        self.assertEqual(report["results"]["chunks/single"]["pages"], 6)
+        self.assertGreater(result["pages_per_sec"], 0)
+        self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertEqual(benchmark.compare_results(report, report), [])
+        
+        slower = json.loads(json.dumps(report))
+        slower["results"]["text/single"]["pages_per_sec"] = result["pages_per_sec"] / 2
+        regressions = benchmark.compare_results(slower, report)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("text/single: pages_per_sec", regressions[0])
+    
+    def test_scan(self):
+        """Тест быстрого сканирования метаданных, оглавления и наличия текстового слоя."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "archive"))
+            shutil.copy(self.sample_pdf_path, os.path.join(temp_dir, "sample.pdf"))
+            
+            doc = fitz.open(self.large_pdf_path)
+            doc.set_metadata({"title": "Договор", "author": "Отдел", "creationDate": "D:20240131093000+03'00'"})
+            doc.set_toc([[1, "Условия", 1], [2, "Оплата", 40]])
+            doc.save(os.path.join(temp_dir, "archive", "contract.pdf"))
+            doc.close()
+            
+            # Скан без текстового слоя и документ, защищенный паролем
+            doc = fitz.open()
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 32, 32), False)
+            for _ in range(3):
+                doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), pixmap=pixmap)
+            doc.save(os.path.join(temp_dir, "archive", "scan.pdf"))
+            doc.close()
+            doc = fitz.open(self.sample_pdf_path)
+            doc.save(os.path.join(temp_dir, "locked.pdf"), encryption=fitz.PDF_ENCRYPT_AES_256,
+                     user_pw="user", owner_pw="owner")
+            doc.close()
+            with open(os.path.join(temp_dir, "broken.pdf"), "wb") as f:
+                f.write(b"not a pdf")
+            
+            results = PDFParser(use_multithreading=False).scan(temp_dir, sample_pages=2)
+            by_name = {os.path.basename(result.path): result for result in results}
+            self.assertEqual(sorted(by_name), ["broken.pdf", "contract.pdf", "locked.pdf", "sample.pdf", "scan.pdf"])
+            
+            contract = by_name["contract.pdf"]
+            self.assertEqual((contract.pages, contract.title, contract.author), (150, "Договор", "Отдел"))
+            self.assertEqual(contract.creation_date, "2024-01-31T09:30:00+03:00")
+            self.assertEqual(contract.toc, [(1, "Условия", 1), (2, "Оплата", 40)])
+            self.assertTrue(contract.has_text)
+            self.assertFalse(contract.encrypted)
+            self.assertEqual(contract.size, os.path.getsize(contract.path))
+            
+            self.assertFalse(by_name["scan.pdf"].has_text)
+            self.assertTrue(by_name["sample.pdf"].has_text)
+            self.assertTrue(by_name["locked.pdf"].encrypted)
+            self.assertIsNone(by_name["locked.pdf"].toc)
+            self.assertFalse(by_name["broken.pdf"].ok)
+            self.assertIsNone(by_name["broken.pdf"].pages)
+            
+            # Пачки по 2 файла выполняются в пуле процессов
+            with mock.patch.object(pdf_parser, "SCAN_BATCH_FILES", 2):
+                pooled = PDFParser(mode="process", max_workers=2).scan(temp_dir, sample_pages=2)
+            self.assertEqual(pooled, results)
+            self.assertEqual(json.loads(json.dumps(contract.to_dict()))["toc"][1], [2, "Оплата", 40])
+    
+    def test_incremental_manifest(self):
+        """Тест параллельного сканирования и инкрементальной обработки по манифесту."""
+        root = os.path.join(self.temp_dir.name, "incremental")
+        paths = [os.path.join(root, name) for name in ("a.pdf", os.path.join("sub", "b.pdf"),
+                                                        os.path.join("sub", "deep", "c.PDF"))]
+        for i, path in enumerate(paths):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            create_test_pdf(path, num_pages=1, text_per_page=f"Файл {i}")
+        with open(os.path.join(root, "notes.txt"), "w") as f:
+            f.write("не PDF")
+        
+        entries = scan_pdf_files(root, max_workers=3)
+        self.assertEqual([entry.path for entry in entries], sorted(paths))
+        self.assertEqual(entries[0].size, os.path.getsize(entries[0].path))
+        
+        manifest = DirectoryManifest(os.path.join(self.temp_dir.name, "manifest.sqlite3"))
+        output_dir = os.path.join(self.temp_dir.name, "incremental_out")
+        parser = PDFParser(show_progress=False)
+        
+        def run():
+            changes = manifest.sync(scan_pdf_files(root))
+            pending = manifest.pending()
+            with ManifestSink(TextDirSink(output_dir), manifest) as sink:
+                parser.batch_process(pending, sink=sink)
+            return changes, pending
+        
+        changes, pending = run()
+        self.assertEqual(sorted(changes.added), sorted(paths))
+        self.assertEqual(len(pending), 3)
+        record = manifest.get(paths[0])
+        self.assertEqual(record.status, "ok")
+        self.assertEqual(record.output, os.path.join(output_dir, "a.txt"))
+        self.assertTrue(os.path.exists(record.output))
+        
+        # Повторный запуск без изменений ничего не обрабатывает
+        changes, pending = run()
+        self.assertEqual(pending, [])
+        self.assertEqual(len(changes.unchanged), 3)
+        
+        # Изменение времени модификации без изменения содержимого не требует обработки
+        os.utime(paths[0], ns=(0, 10 ** 9))
+        create_test_pdf(paths[1], num_pages=2, text_per_page="Новый текст")
+        os.remove(paths[2])
+        changes, pending = run()
+        self.assertEqual(changes.modified, [paths[1]])
+        self.assertEqual(pending, [paths[1]])
+        self.assertEqual([record.path for record in changes.deleted], [paths[2]])
+        self.assertIsNone(manifest.get(paths[2]))
+        self.assertEqual(manifest.stats(), {"ok": 2})
+        with open(os.path.join(output_dir, "b.txt"), encoding="utf-8") as f:
+            self.assertIn("Новый текст 2", f.read())
+        manifest.close()
+    
+    def test_search_index(self):
+        """Тест построения полнотекстового индекса при пакетной обработке и поиска фраз."""
+        files = []
+        for i in range(3):
+            path = os.path.join(self.temp_dir.name, f"search_{i}.pdf")
+            create_test_pdf(path, num_pages=3, text_per_page=f"Отчет номер {i} страница")
+            files.append(path)
+        
+        index_path = os.path.join(self.temp_dir.name, "search.sqlite3")
+        for use_multithreading in (True, False):
+            with self.subTest(use_multithreading=use_multithreading):
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+                parser = PDFParser(use_multithreading=use_multithreading, show_progress=False)
+                index = SearchIndex(index_path)
+                results = parser.batch_process(files, index=index)
+                self.assertEqual(len(results), 3)
+                self.assertEqual(index.stats()["pages"], 9)
+                
+                hits = parser.search(index, "номер 1 страница 3")
+                self.assertEqual([(hit.path, hit.page_num, hit.position) for hit in hits],
+                                 [(files[1], 3, 1)])
+                self.assertEqual(len(parser.search(index, "отч*")), 9)
+                self.assertEqual(parser.search(index, "страница номер"), [])
+                self.assertEqual(len(parser.search(index, "отчет", limit=4)), 4)
+                index.close()
+        
+        # Повторное индексирование блоков заменяет документ и добавляет bbox
+        index = SearchIndex(index_path)
+        index.add(files[0], parser.iter_pages(files[0], with_metadata=True))
+        index.remove(files[2])
+        hits = parser.search(index, "номер 0 страница 2")
+        self.assertEqual(len(hits), 1)
+        self.assertIsNotNone(hits[0].bbox)
+        self.assertEqual(parser.search(index, "номер 2"), [])
+        index.optimize()
+        index.close()
+        
+        # Поиск по пути к индексу открывает его только для чтения
+        self.assertEqual(len(parser.search(index_path, "страница")), 6)
+        with self.assertRaises(FileNotFoundError):
+            parser.search(os.path.join(self.temp_dir.name, "missing.sqlite3"), "отчет")
+    
+    def test_batch_empty_page_selection(self):
+        """Тест индексирования и поиска дубликатов файлов, в которых не выбрано ни одной страницы."""
+        files = []
+        for i in range(2):
+            path = os.path.join(self.temp_dir.name, f"empty_selection_{i}.pdf")
+            create_test_pdf(path, num_pages=1, text_per_page=f"Файл {i}")
+            files.append(path)
+        
+        index = SearchIndex(os.path.join(self.temp_dir.name, "empty_selection.sqlite3"))
+        for use_multithreading in (True, False):
+            with self.subTest(use_multithreading=use_multithreading):
+                parser = PDFParser(use_multithreading=use_multithreading, show_progress=False)
+                results = parser.batch_process(files, pages="5", index=index)
+                self.assertEqual(results, {path: "" for path in files})
+        self.assertEqual(index.stats()["pages"], 0)
+        index.close()
+        
+        dedup = DuplicateIndex(os.path.join(self.temp_dir.name, "empty_selection_dedup.sqlite3"))
+        parser = PDFParser(show_progress=False)
+        self.assertEqual(parser.batch_process(files, pages="5", dedup=dedup), {path: "" for path in files})
+        dedup.close()
+    
+    def test_search_index_readd(self):
+        """Тест повторного индексирования измененного документа после фиксации."""
+        index = SearchIndex(os.path.join(self.temp_dir.name, "readd.sqlite3"))
+        index.add("a.pdf", [(1, "старый текст"), (2, "общий текст")])
+        index.flush()
+        index.add("a.pdf", [(1, "новый текст"), (2, "общий текст")])
+        index.flush()
+        
+        self.assertEqual([hit.page_num for hit in index.search("новый")], [1])
+        self.assertEqual(index.search("старый"), [])
+        self.assertEqual(len(index.search("общий текст")), 1)
+        index.close()
+    
+    def test_search_index_remove(self):
+        """Тест того, что записи удаленного документа не относятся к добавленному после него."""
+        index_path = os.path.join(self.temp_dir.name, "remove.sqlite3")
+        index = SearchIndex(index_path)
+        index.add("a.pdf", [(1, "старый текст")])
+        index.flush()
+        index.remove("a.pdf")
+        index.add("b.pdf", [(1, "новый текст")])
+        
+        self.assertEqual(index.search("старый"), [])
+        self.assertEqual([hit.path for hit in index.search("текст")], [os.path.abspath("b.pdf")])
+        index.close()
+        
+        # Индекс старого формата переводится на непереиспользуемые идентификаторы страниц
+        conn = sqlite3.connect(index_path)
+        conn.executescript("""
+            ALTER TABLE pages RENAME TO pages_new;
+            CREATE TABLE pages (id INTEGER PRIMARY KEY, doc_id INTEGER NOT NULL,
+                                page_num INTEGER NOT NULL, boxes BLOB);
+            INSERT INTO pages SELECT * FROM pages_new;
+            DROP TABLE pages_new;
+        """)
+        conn.close()
+        index = SearchIndex(index_path)
+        self.assertEqual(index.stats()["postings"], 2)
+        index.remove("b.pdf")
+        index.add("c.pdf", [(1, "другой документ")])
+        self.assertEqual(index.search("новый"), [])
+        index.close()
+    
+    def test_reading_order(self):
+        """Тест восстановления порядка чтения двухколоночной верстки и типов блоков."""
+        path = os.path.join(self.temp_dir.name, "columns.pdf")
+        doc = fitz.open()
+        for p in range(3):
+            page = doc.new_page()
+            page.insert_text((50, 30), "Вестник испытаний", fontsize=9, fontname=TEST_FONT)
+            page.insert_text((50, 110), f"Заголовок {p + 1}", fontsize=18, fontname=TEST_FONT)
+            for i in range(10):
+                page.insert_text((50, 140 + i * 14), f"Левая {p + 1}.{i}", fontsize=10, fontname=TEST_FONT)
+                page.insert_text((320, 140 + i * 14), f"Правая {p + 1}.{i}", fontsize=10, fontname=TEST_FONT)
+            page.insert_text((50, 320), "Рис. 1. Подпись", fontsize=10, fontname=TEST_FONT)
+            page.insert_text((290, 820), str(p + 1), fontsize=9, fontname=TEST_FONT)
+        doc.save(path)
+        doc.close()
+        
+        parser = PDFParser(show_progress=False)
+        text = parser.extract_text(path, pages="2", reading_order=True)
+        lines = text.split("\n")
+        self.assertEqual(lines[:3], ["Вестник испытаний", "Заголовок 2", "Левая 2.0"])
+        self.assertLess(lines.index("Левая 2.9"), lines.index("Рис. 1. Подпись"))
+        self.assertLess(lines.index("Рис. 1. Подпись"), lines.index("Правая 2.0"))
+        
+        blocks = parser.extract_text_with_metadata(path, reading_order=True)
+        types = {block.text: block.block_type for block in blocks if block.page_num == 2}
+        self.assertEqual(types["Вестник испытаний"], "header")
+        self.assertEqual(types["Заголовок 2"], "heading")
+        self.assertEqual(types["Левая 2.5"], "body")
+        self.assertEqual(types["Рис. 1. Подпись"], "caption")
+        self.assertEqual(types["2"], "footer")
+        self.assertEqual(blocks[-1].text, "3")
+        
+        results = parser.batch_process([path, self.sample_pdf_path], reading_order=True)
+        self.assertEqual(results[path], parser.extract_text(path, reading_order=True))
+        
+        with self.assertRaises(ValueError):
+            parser.extract_text_with_metadata(path, detailed=True, reading_order=True)
+    
+    def test_ocr_fallback(self):
+        """Тест распознавания страниц без текстового слоя."""
+        path = os.path.join(self.temp_dir.name, "scanned.pdf")
+        doc = fitz.open()
+        doc.new_page().insert_text((50, 100), "Текстовая страница", fontsize=12, fontname=TEST_FONT)
+        scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+        scan.clear_with(200)
+        doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), pixmap=scan)
+        doc.new_page()  # пустая страница без изображений не распознается
+        doc.save(path)
+        doc.close()
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ExtractionCache(cache_dir)
+            metrics = ParserMetrics()
+            parser = PDFParser(show_progress=False, cache=cache, metrics=metrics,
+                               ocr=FakeOCREngine(), ocr_dpi=144, ocr_workers=1)
+            try:
+                text = parser.extract_text(path)
+                self.assertEqual(text, "Текстовая страница\nРаспознанный текст\n")
+                self.assertEqual([page for _, page in parser.iter_pages(path)],
+                                 ["Текстовая страница\n", "Распознанный текст\n", ""])
+                
+                blocks = parser.extract_text_with_metadata(path)
+                self.assertEqual([block.page_num for block in blocks], [1, 2])
+                ocr_block = blocks[1]
+                self.assertEqual(ocr_block.text, "Распознанный текст")
+                self.assertAlmostEqual(ocr_block.x0, 59.5, places=0)
+                self.assertAlmostEqual(ocr_block.y0, 84.2, places=0)
+                detailed = parser.extract_text_with_metadata(path, detailed=True)
+                self.assertEqual(detailed[-1].text, "Распознанный текст")
+                self.assertAlmostEqual(detailed[-1].y1, 842 - 84.2, places=0)
+                
+                results = list(parser.iter_batch([path, self.sample_pdf_path], with_pages=True))
+                batch = {result.path: result for result in results}
+                self.assertEqual(batch[path].text, text)
+                self.assertEqual(batch[path].pages[1], (2, "Распознанный текст\n"))
+                
+                # Страница распознается один раз, далее результат берется из кэша
+                self.assertEqual(metrics.counters["ocr_pages"], 1)
+            finally:
+                parser.close()
+                cache.close()
+        
+        failing = PDFParser(show_progress=False, use_multithreading=False, ocr=FakeOCREngine(fail=True))
+        self.assertEqual(failing.extract_text(path), "Текстовая страница\n")
+    
+    def test_deduplication(self):
+        """Тест поиска почти одинаковых и побайтно одинаковых документов."""
+        rng = random.Random(0)
+        words = [f"слово{i}" for i in range(2000)]
+        lines = [" ".join(rng.choice(words) for _ in range(8)) for _ in range(60)]
+        edited = list(lines)
+        edited[10] = "изменения второй редакции договора"
+        
+        paths = {name: os.path.join(self.temp_dir.name, f"dedup_{name}.pdf")
+                 for name in ("contract", "edited", "copy", "other")}
+        for name, text_lines in (("contract", lines), ("edited", edited),
+                                 ("other", [" ".join(rng.choice(words) for _ in range(8)) for _ in range(60)])):
+            doc = fitz.open()
+            for p in range(2):
+                doc.new_page().insert_text((50, 50), "\n".join(text_lines[p * 30:(p + 1) * 30]),
+                                           fontsize=10, fontname=TEST_FONT)
+            doc.save(paths[name])
+            doc.close()
+        shutil.copyfile(paths["contract"], paths["copy"])
+        
+        parser = PDFParser(show_progress=False)
+        files = [paths[name] for name in ("contract", "edited", "copy", "other")]
+        dedup_path = os.path.join(self.temp_dir.name, "dedup.sqlite3")
+        dedup = DuplicateIndex(dedup_path)
+        results = []
+        
+        class ListSink(TextStreamSink):
+            def _write(self, result):
+                results.append(result)
+        
+        parser.batch_process(files, sink=ListSink(), dedup=dedup)
+        by_name = {os.path.basename(result.path)[6:-4]: result for result in results}
+        self.assertEqual(len(results), 4)
+        self.assertEqual(by_name["edited"].cluster, by_name["contract"].cluster)
+        self.assertEqual(by_name["edited"].duplicate_of, os.path.abspath(paths["contract"]))
+        self.assertEqual(by_name["copy"].cluster, by_name["contract"].cluster)
+        self.assertEqual(by_name["copy"].text, by_name["contract"].text)
+        self.assertNotEqual(by_name["other"].cluster, by_name["contract"].cluster)
+        self.assertIsNone(by_name["other"].duplicate_of)
+        self.assertEqual(json.loads(json.dumps(by_name["edited"].to_dict()))["cluster"], by_name["edited"].cluster)
+        
+        # Страница 2 не менялась и совпадает со страницей 2 исходного договора
+        similar = dedup.similar_pages(paths["edited"], 2)
+        self.assertIn((os.path.abspath(paths["contract"]), 2, 1.0), similar)
+        self.assertEqual(dedup.stats()["duplicates"], 2)
+        dedup.close()
+        
+        # Повторный запуск: известные дубликаты не извлекаются и не выводятся
+        dedup = DuplicateIndex(dedup_path)
+        with mock.patch.object(parser, "iter_batch", wraps=parser.iter_batch) as iter_batch:
+            output = parser.batch_process(files, dedup=dedup, skip_duplicates=True)
+        self.assertEqual(iter_batch.call_args[0][0], [paths["contract"], paths["other"]])
+        self.assertEqual(sorted(output), sorted([paths["contract"], paths["other"]]))
+        
+        changed = os.path.join(self.temp_dir.name, "dedup_resent.pdf")
+        doc = fitz.open(paths["edited"])
+        doc.set_metadata({"title": "Повторная отправка"})
+        doc.save(changed)
+        doc.close()
+        output = parser.batch_process([changed], dedup=dedup, skip_duplicates=True)
+        self.assertEqual(output, {})
+        self.assertEqual(dedup.cluster(changed), dedup.cluster(paths["contract"]))
+        dedup.close()
+        
+        with self.assertRaises(ValueError):
+            DuplicateIndex(dedup_path, num_perm=64)
+    
+    def test_chunking(self):
+        """Тест разбиения на перекрывающиеся фрагменты с привязкой к страницам."""
+        path = os.path.join(self.temp_dir.name, "chunks.pdf")
+        doc = fitz.open()
+        for p in range(3):
+            page = doc.new_page()
+            for i in range(6):
+                page.insert_text((50, 60 + i * 100), f"Абзац {p + 1}.{i} " + "текст " * 8,
+                                 fontsize=10, fontname=TEST_FONT)
+        doc.save(path)
+        doc.close()
+        
+        parser = PDFParser(show_progress=False)
+        chunker = TextChunker(chunk_size=200, overlap=60)
+        chunks = list(parser.iter_chunks(path, chunker))
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual([chunk.index for chunk in chunks], list(range(len(chunks))))
+        self.assertTrue(all(len(chunk.text) <= 200 for chunk in chunks))
+        
+        # Абзацы не разрываются, все абзацы попадают во фрагменты
+        paragraphs = [line for chunk in chunks for line in chunk.text.split("\n")]
+        self.assertTrue(all(line.startswith("Абзац") for line in paragraphs))
+        self.assertEqual(len(set(paragraphs)), 18)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            # Перекрытие: последний абзац фрагмента начинает следующий
+            self.assertEqual(chunk.text.split("\n")[0], previous.text.split("\n")[-1])
+            self.assertLessEqual(previous.page_start, chunk.page_start)
+        
+        spanning = next(chunk for chunk in chunks if chunk.page_start != chunk.page_end)
+        self.assertEqual({anchor[0] for anchor in spanning.anchors},
+                         set(range(spanning.page_start, spanning.page_end + 1)))
+        first = chunks[0].anchors[0]
+        self.assertEqual(first[0], 1)
+        self.assertAlmostEqual(first[2], 60 - 10, delta=5)
+        self.assertEqual(json.loads(json.dumps(chunks[0].to_dict()))["page_start"], 1)
+        
+        # Бюджет в словах; абзац больше фрагмента делится по словам
+        words = list(parser.iter_chunks(path, TextChunker(4, 0, length=lambda text: len(text.split()))))
+        self.assertTrue(all(len(chunk.text.split()) <= 4 for chunk in words))
+        self.assertEqual(" ".join(chunk.text for chunk in words).split(),
+                         parser.extract_text(path).split())
+        
+        with self.assertRaises(ValueError):
+            TextChunker(chunk_size=100, overlap=100)
+    
+    def test_lazy_imports(self):
+        """Тест отложенной загрузки тяжелых зависимостей и времени холодного импорта."""
+        import sys
+        import subprocess
+        
+        def import_time(modules):
+            code = (f"import sys, time; t = time.perf_counter(); import {modules}; "
+                    "t = time.perf_counter() - t; "
+                    "print(t, *[m for m in ('fitz', 'pdfminer', 'tqdm', 'asyncio') if m in sys.modules])")
+            return subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  capture_output=True, text=True, check=True).stdout.split()
+        
+        output = import_time("pdf_parser, example")
+        self.assertEqual(output[1:], [])
+        # Лучшее из нескольких измерений, чтобы исключить случайные задержки
+        lazy = min([float(output[0])] + [float(import_time("pdf_parser, example")[0]) for _ in range(2)])
+        eager = min(float(import_time("fitz, pdfminer.high_level, tqdm, pdf_parser, example")[0])
+                    for _ in range(3))
+        self.assertLess(lazy, IMPORT_TIME_BUDGET)
+        self.assertLess(lazy, eager * IMPORT_TIME_RATIO)
+        
+        # Модуль загружается при первом обращении к атрибуту
+        self.assertEqual(pdf_parser.fitz.open, fitz.open)
+
+
+def create_tables_pdf(output_path):
+    """Утилита для создания PDF-файла с таблицей без рамок и таблицей с рамками."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 60), "Отчет о продажах за квартал", fontsize=14, fontname=TEST_FONT)
+    
+    rows = [["Товар", "Количество", "Цена"], ["Яблоки", "10", "100.5"],
+            ["Груши", "7", "80"], ["Сливы", "3", "120"]]
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            page.insert_text((60 + c * 150, 120 + r * 20), cell, fontsize=11, fontname=TEST_FONT)
+    
+    top = 300
+    for r in range(4):
+        page.draw_line((50, top + r * 40), (350, top + r * 40))
+    for x in (50, 200, 350):
+        page.draw_line((x, top), (x, top + 120))
+    cells = [["Код", "Описание"], ["A1", "Первая строка\nвторая строка"], ["B2", "Короткое"]]
+    for r, row in enumerate(cells):
+        for c, cell in enumerate(row):
+            page.insert_text((60 + c * 150, top + 15 + r * 40), cell, fontsize=10, fontname=TEST_FONT)
+    
+    page.insert_text((50, 600), "Обычный текст после таблиц.", fontsize=11, fontname=TEST_FONT)
+    doc.save(output_path)
+    doc.close()
 
 
 def create_test_pdf(output_path, num_pages=1, text_per_page="Test page"):
@@ -123,7 +1325,8 @@ def create_test_pdf(output_path, num_pages=1, text_per_page="Test page"):
         page.insert_text(
             text_rect.tl,
             f"{text_per_page} {i+1}",
-            fontsize=12
+            fontsize=12,
+            fontname=TEST_FONT
         )
     
     doc.save(output_path)